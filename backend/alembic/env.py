@@ -0,0 +1,76 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+
+from app.config import settings
+from app.database import Base
+import app.models  # noqa: F401  (registra todas las tablas en Base.metadata)
+
+config = context.config
+
+# La URL de la base de datos sale de la configuración de la aplicación (.env)
+config.set_main_option("sqlalchemy.url", settings.DATABASE_URL.replace("%", "%%"))
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Índices que solo existen en PostgreSQL (declarados con ddl_if en los modelos)
+POSTGRES_ONLY_INDEXES = {"ix_activities_search_vector", "ix_users_search_text_trgm"}
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """
+    Evita que autogenerate proponga índices exclusivos de PostgreSQL en otros motores
+    """
+    if type_ == "index" and name in POSTGRES_ONLY_INDEXES:
+        return context.get_bind().dialect.name == "postgresql"
+    return True
+
+
+def run_migrations_offline() -> None:
+    """
+    Genera el SQL de las migraciones sin conectarse a la base de datos
+    """
+    url = config.get_main_option("sqlalchemy.url")
+    context.configure(
+        url=url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=url.startswith("sqlite"),
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """
+    Aplica las migraciones sobre una conexión a la base de datos
+    """
+    connectable = engine_from_config(
+        config.get_section(config.config_ini_section, {}),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            # SQLite no soporta ALTER TABLE completo: usar el modo batch
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,136 @@
+"""baseline schema
+
+Esquema original de la aplicación (usuarios, actividades, créditos y chatbots).
+En bases de datos creadas antes con `create_all` no hace nada: las tablas ya existen.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import has_table
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+USER_ROLE = sa.Enum("ADMIN", "DOCENTE", "ESTUDIANTE", name="userrole")
+ACTIVITY_TYPE = sa.Enum(
+    "EXAM", "SUMMARY", "CLASS_ACTIVITY", "RUBRIC", "WRITING_CORRECTION", "SLIDES", "EMAIL",
+    "SURVEY", "CHATBOT", "STORY", "CROSSWORD", "WORD_SEARCH", name="activitytype"
+)
+AI_PROVIDER = sa.Enum("OLLAMA", "OPENAI", "GEMINI", name="aiprovider")
+TRANSACTION_TYPE = sa.Enum("INITIAL", "USAGE", "REFUND", "ADMIN_ADJUSTMENT", name="transactiontype")
+CHATBOT_TYPE = sa.Enum(
+    "MATH", "LANGUAGE", "SCIENCE", "LITERATURE", "PROGRAMMING", "WELLNESS", "CUSTOM", name="chatbottype"
+)
+
+
+def upgrade() -> None:
+    if has_table("users"):
+        return
+
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("full_name", sa.String()),
+        sa.Column("role", USER_ROLE, nullable=False),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("credits", sa.Integer()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+
+    op.create_table(
+        "activities",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("activity_type", ACTIVITY_TYPE, nullable=False),
+        sa.Column("content", sa.JSON()),
+        sa.Column("subject", sa.String()),
+        sa.Column("grade_level", sa.String()),
+        sa.Column("is_public", sa.Boolean()),
+        sa.Column("ai_provider", AI_PROVIDER),
+        sa.Column("model_used", sa.String()),
+        sa.Column("credits_used", sa.Integer()),
+        sa.Column("creator_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_activities_id", "activities", ["id"])
+
+    op.create_table(
+        "credit_transactions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("amount", sa.Integer(), nullable=False),
+        sa.Column("transaction_type", TRANSACTION_TYPE, nullable=False),
+        sa.Column("description", sa.String()),
+        sa.Column("activity_id", sa.Integer(), sa.ForeignKey("activities.id"), nullable=True),
+        sa.Column("balance_after", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_credit_transactions_id", "credit_transactions", ["id"])
+
+    op.create_table(
+        "chatbots",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("chatbot_type", CHATBOT_TYPE, nullable=False),
+        sa.Column("personality", sa.Text()),
+        sa.Column("knowledge_areas", sa.JSON()),
+        sa.Column("instruction_prompt", sa.Text()),
+        sa.Column("ai_provider", sa.String()),
+        sa.Column("model_name", sa.String()),
+        sa.Column("temperature", sa.Integer()),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("is_public", sa.Boolean()),
+        sa.Column("creator_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_chatbots_id", "chatbots", ["id"])
+
+    op.create_table(
+        "chat_conversations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String()),
+        sa.Column("chatbot_id", sa.Integer(), sa.ForeignKey("chatbots.id")),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_chat_conversations_id", "chat_conversations", ["id"])
+
+    op.create_table(
+        "chat_messages",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("role", sa.String(), nullable=False),
+        sa.Column("conversation_id", sa.Integer(), sa.ForeignKey("chat_conversations.id")),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_chat_messages_id", "chat_messages", ["id"])
+
+
+def downgrade() -> None:
+    for table in ("chat_messages", "chat_conversations", "chatbots", "credit_transactions", "activities", "users"):
+        op.drop_table(table)
+    bind = op.get_bind()
+    for enum in (CHATBOT_TYPE, TRANSACTION_TYPE, AI_PROVIDER, ACTIVITY_TYPE, USER_ROLE):
+        enum.drop(bind, checkfirst=True)
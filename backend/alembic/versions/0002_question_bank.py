@@ -0,0 +1,76 @@
+"""question bank and near-duplicate index
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 00:00:01
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import has_table, has_column
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_table("question_bank"):
+        op.create_table(
+            "question_bank",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("topic", sa.String(), nullable=False),
+            sa.Column("topic_key", sa.String(), nullable=False),
+            sa.Column("question_type", sa.String(), nullable=False),
+            sa.Column("grade_level", sa.String()),
+            sa.Column("question", sa.Text(), nullable=False),
+            sa.Column("options", sa.JSON()),
+            sa.Column("correct_answer", sa.Text()),
+            sa.Column("points", sa.Integer()),
+            sa.Column("text_hash", sa.String(64), nullable=False),
+            sa.Column("minhash", sa.JSON()),
+            sa.Column(
+                "duplicate_of_id", sa.Integer(),
+                sa.ForeignKey("question_bank.id", ondelete="SET NULL"), nullable=True
+            ),
+            sa.Column("activity_id", sa.Integer(), sa.ForeignKey("activities.id", ondelete="SET NULL"), nullable=True),
+            sa.Column("creator_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_question_bank_id", "question_bank", ["id"])
+        op.create_index("ix_question_bank_text_hash", "question_bank", ["text_hash"])
+        op.create_index(
+            "ix_question_bank_topic_type_grade", "question_bank", ["topic_key", "question_type", "grade_level"]
+        )
+    elif not has_column("question_bank", "minhash"):
+        # Banco creado antes de la detección de casi-duplicados
+        with op.batch_alter_table("question_bank") as batch:
+            batch.add_column(sa.Column("minhash", sa.JSON()))
+            batch.add_column(sa.Column("duplicate_of_id", sa.Integer(), nullable=True))
+            batch.create_foreign_key(
+                "fk_question_bank_duplicate_of_id", "question_bank", ["duplicate_of_id"], ["id"], ondelete="SET NULL"
+            )
+
+    if not has_table("question_lsh_buckets"):
+        op.create_table(
+            "question_lsh_buckets",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column(
+                "question_id", sa.Integer(),
+                sa.ForeignKey("question_bank.id", ondelete="CASCADE"), nullable=False
+            ),
+            sa.Column("band", sa.Integer(), nullable=False),
+            sa.Column("bucket", sa.String(16), nullable=False),
+        )
+        op.create_index("ix_question_lsh_buckets_question_id", "question_lsh_buckets", ["question_id"])
+        op.create_index("ix_question_lsh_buckets_band_bucket", "question_lsh_buckets", ["band", "bucket"])
+
+
+def downgrade() -> None:
+    op.drop_table("question_lsh_buckets")
+    op.drop_table("question_bank")
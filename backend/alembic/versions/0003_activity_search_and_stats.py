@@ -0,0 +1,56 @@
+"""activity search vector, item count and conversation updated_at
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 00:00:02
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.utils.migrations import has_column, create_index_if_missing, drop_index_if_exists, is_postgres
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("activities") as batch:
+        if not has_column("activities", "item_count"):
+            batch.add_column(sa.Column("item_count", sa.Integer()))
+        if not has_column("activities", "search_vector"):
+            batch.add_column(sa.Column(
+                "search_vector", sa.Text().with_variant(postgresql.TSVECTOR(), "postgresql")
+            ))
+
+    if is_postgres():
+        create_index_if_missing(
+            "ix_activities_search_vector", "activities", ["search_vector"], postgresql_using="gin"
+        )
+
+    # Las conversaciones sin respuesta quedaban con updated_at NULL: es la clave de su listado
+    op.execute(
+        "UPDATE chat_conversations SET updated_at = created_at WHERE updated_at IS NULL"
+    )
+    with op.batch_alter_table("chat_conversations") as batch:
+        batch.alter_column(
+            "updated_at", existing_type=sa.DateTime(timezone=True), server_default=sa.func.now()
+        )
+
+    # item_count y search_vector de las filas existentes:
+    #   python scripts/backfill_item_count.py && python scripts/reindex_search.py
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("chat_conversations") as batch:
+        batch.alter_column("updated_at", existing_type=sa.DateTime(timezone=True), server_default=None)
+    drop_index_if_exists("ix_activities_search_vector", "activities")
+    with op.batch_alter_table("activities") as batch:
+        batch.drop_column("search_vector")
+        batch.drop_column("item_count")
@@ -0,0 +1,41 @@
+"""composite indexes for hot query paths
+
+Listados paginados por (fecha, id) y filtros frecuentes de los routers.
+Verificar su uso con: python scripts/check_query_plans.py
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 00:00:03
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.utils.migrations import create_index_if_missing, drop_index_if_exists
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_users_created", "users", ["created_at", "id"]),
+    ("ix_activities_created", "activities", ["created_at", "id"]),
+    ("ix_activities_creator_created", "activities", ["creator_id", "created_at", "id"]),
+    ("ix_activities_public_created", "activities", ["is_public", "created_at", "id"]),
+    ("ix_credit_transactions_user_created", "credit_transactions", ["user_id", "created_at", "id"]),
+    ("ix_chat_conversations_user_chatbot_updated", "chat_conversations", ["user_id", "chatbot_id", "updated_at", "id"]),
+    ("ix_chat_messages_conversation_created", "chat_messages", ["conversation_id", "created_at"]),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        create_index_if_missing(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        drop_index_if_exists(name, table)
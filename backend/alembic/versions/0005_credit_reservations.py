@@ -0,0 +1,52 @@
+"""credit reservations and held credits
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 00:00:04
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import has_table, has_column
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RESERVATION_STATUS = sa.Enum("HELD", "SETTLED", "RELEASED", "EXPIRED", name="reservationstatus")
+
+
+def upgrade() -> None:
+    if not has_column("users", "held_credits"):
+        with op.batch_alter_table("users") as batch:
+            batch.add_column(sa.Column("held_credits", sa.Integer(), nullable=False, server_default="0"))
+
+    if not has_table("credit_reservations"):
+        op.create_table(
+            "credit_reservations",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("amount", sa.Integer(), nullable=False),
+            sa.Column("status", RESERVATION_STATUS, nullable=False),
+            sa.Column("description", sa.String()),
+            sa.Column("activity_id", sa.Integer(), sa.ForeignKey("activities.id"), nullable=True),
+            sa.Column("credits_charged", sa.Integer()),
+            sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("resolved_at", sa.DateTime(timezone=True)),
+        )
+        op.create_index("ix_credit_reservations_id", "credit_reservations", ["id"])
+        op.create_index("ix_credit_reservations_user_status", "credit_reservations", ["user_id", "status"])
+        op.create_index("ix_credit_reservations_status_expires", "credit_reservations", ["status", "expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("credit_reservations")
+    RESERVATION_STATUS.drop(op.get_bind(), checkfirst=True)
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("held_credits")
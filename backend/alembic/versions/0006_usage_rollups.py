@@ -0,0 +1,80 @@
+"""daily usage rollups
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 00:00:05
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.utils.migrations import has_table
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# El tipo ya existe (tabla activities): no se crea ni se elimina aquí
+ACTIVITY_TYPE = postgresql.ENUM(
+    "EXAM", "SUMMARY", "CLASS_ACTIVITY", "RUBRIC", "WRITING_CORRECTION", "SLIDES", "EMAIL",
+    "SURVEY", "CHATBOT", "STORY", "CROSSWORD", "WORD_SEARCH", name="activitytype", create_type=False
+)
+
+# Una fila por día x usuario x proveedor x tipo, con los créditos cobrados (USAGE)
+BACKFILL_USAGE_DAILY = """
+INSERT INTO usage_daily (day, user_id, ai_provider, activity_type, activities, credits_used, tokens_used, updated_at)
+SELECT
+    date(a.created_at),
+    a.creator_id,
+    COALESCE(lower(CAST(a.ai_provider AS VARCHAR)), 'none'),
+    a.activity_type,
+    COUNT(a.id),
+    COALESCE(SUM(c.credits), 0),
+    0,
+    CURRENT_TIMESTAMP
+FROM activities a
+LEFT JOIN (
+    SELECT activity_id, SUM(-amount) AS credits
+    FROM credit_transactions
+    WHERE transaction_type = 'USAGE' AND activity_id IS NOT NULL
+    GROUP BY activity_id
+) c ON c.activity_id = a.id
+WHERE a.creator_id IS NOT NULL
+GROUP BY date(a.created_at), a.creator_id, COALESCE(lower(CAST(a.ai_provider AS VARCHAR)), 'none'), a.activity_type
+"""
+
+
+def upgrade() -> None:
+    if not has_table("usage_daily"):
+        op.create_table(
+            "usage_daily",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("day", sa.Date(), nullable=False),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("ai_provider", sa.String(20), nullable=False),
+            sa.Column("activity_type", ACTIVITY_TYPE, nullable=False),
+            sa.Column("activities", sa.Integer(), nullable=False),
+            sa.Column("credits_used", sa.Integer(), nullable=False),
+            sa.Column("tokens_used", sa.Integer(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.UniqueConstraint("day", "user_id", "ai_provider", "activity_type", name="uq_usage_daily_bucket"),
+        )
+        op.create_index("ix_usage_daily_id", "usage_daily", ["id"])
+        op.create_index("ix_usage_daily_user_day", "usage_daily", ["user_id", "day"])
+
+    # Agregados del historial existente (misma agrupación que usage_service.rebuild;
+    # los tokens no se guardan por actividad). Solo si la tabla está vacía: si
+    # create_all ya la creó, el historial aún no se cargó. Para repararlos después:
+    #   python scripts/rebuild_usage_rollups.py
+    bind = op.get_bind()
+    if bind.execute(sa.text("SELECT 1 FROM usage_daily LIMIT 1")).first() is None:
+        bind.execute(sa.text(BACKFILL_USAGE_DAILY))
+
+
+def downgrade() -> None:
+    op.drop_table("usage_daily")
@@ -0,0 +1,36 @@
+"""shared stats snapshots
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 00:00:06
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import has_table
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_table("stats_snapshots"):
+        op.create_table(
+            "stats_snapshots",
+            sa.Column("name", sa.String(50), primary_key=True),
+            sa.Column("payload", sa.JSON()),
+            sa.Column("etag", sa.String(80)),
+            sa.Column("generated_at", sa.DateTime(timezone=True)),
+            sa.Column("lease_owner", sa.String(100)),
+            sa.Column("lease_expires_at", sa.DateTime(timezone=True)),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("stats_snapshots")
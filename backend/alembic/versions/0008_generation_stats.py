@@ -0,0 +1,52 @@
+"""bucketed model call analytics
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 00:00:07
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import has_table
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+
+
+def counter(name: str) -> sa.Column:
+    return sa.Column(name, sa.Integer(), nullable=False)
+
+
+def upgrade() -> None:
+    if not has_table("generation_stats"):
+        op.create_table(
+            "generation_stats",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("resolution", sa.String(6), nullable=False),
+            sa.Column("bucket_start", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("ai_provider", sa.String(20), nullable=False),
+            sa.Column("model", sa.String(100), nullable=False),
+            sa.Column("activity_type", sa.String(30), nullable=False),
+            *(counter(name) for name in (
+                "calls", "errors", "tokens_in", "tokens_out", "credits_used", "latency_ms_total"
+            )),
+            *(counter(f"latency_le_{bound}") for bound in LATENCY_BUCKETS_MS),
+            counter(f"latency_gt_{LATENCY_BUCKETS_MS[-1]}"),
+            sa.UniqueConstraint(
+                "resolution", "bucket_start", "ai_provider", "model", "activity_type",
+                name="uq_generation_stats_bucket"
+            ),
+        )
+        op.create_index("ix_generation_stats_id", "generation_stats", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("generation_stats")
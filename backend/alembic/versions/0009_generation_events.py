@@ -0,0 +1,62 @@
+"""per-call generation telemetry
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 00:00:08
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import has_table
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_table("generation_events"):
+        op.create_table(
+            "generation_events",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("event_id", sa.String(32), nullable=False, unique=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="SET NULL"), nullable=True),
+            sa.Column("activity_type", sa.String(30), nullable=False),
+            sa.Column("activity_id", sa.Integer(), sa.ForeignKey("activities.id", ondelete="SET NULL"), nullable=True),
+            sa.Column(
+                "chat_message_id", sa.Integer(), sa.ForeignKey("chat_messages.id", ondelete="SET NULL"), nullable=True
+            ),
+            sa.Column("ai_provider", sa.String(20), nullable=False),
+            sa.Column("model", sa.String(100), nullable=False),
+            sa.Column("success", sa.Boolean(), nullable=False),
+            sa.Column("error", sa.Text()),
+            sa.Column("cache_hit", sa.Boolean(), nullable=False),
+            sa.Column("json_ok", sa.Boolean()),
+            sa.Column("latency_ms", sa.Integer()),
+            sa.Column("queue_wait_ms", sa.Integer()),
+            sa.Column("total_duration_ms", sa.Float()),
+            sa.Column("load_duration_ms", sa.Float()),
+            sa.Column("prompt_eval_duration_ms", sa.Float()),
+            sa.Column("eval_duration_ms", sa.Float()),
+            sa.Column("tokens_in", sa.Integer()),
+            sa.Column("tokens_out", sa.Integer()),
+            sa.Column("credits_used", sa.Integer()),
+            sa.Column("usage", sa.JSON()),
+        )
+        op.create_index("ix_generation_events_id", "generation_events", ["id"])
+        op.create_index("ix_generation_events_activity_id", "generation_events", ["activity_id"])
+        op.create_index("ix_generation_events_chat_message_id", "generation_events", ["chat_message_id"])
+        op.create_index("ix_generation_events_created", "generation_events", ["created_at"])
+        op.create_index(
+            "ix_generation_events_provider_model_created", "generation_events", ["ai_provider", "model", "created_at"]
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("generation_events")
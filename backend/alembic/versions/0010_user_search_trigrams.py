@@ -0,0 +1,77 @@
+"""trigram-indexed admin user search
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 00:00:09
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import has_column, create_index_if_missing, drop_index_if_exists, is_postgres
+from app.utils.text import strip_accents
+from app.services.user_search_service import user_search_text
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Letras latinas con tilde o diéresis (Latin-1 y Latin Extended-A) y su versión
+# sin ellas, como las deja strip_accents
+ACCENTED = [
+    (c, strip_accents(c)) for c in map(chr, range(0xC0, 0x180))
+    if strip_accents(c) != c and strip_accents(c).isascii()
+]
+
+
+def normalized(column: str) -> str:
+    """
+    Expresión de PostgreSQL equivalente a user_search_service.normalize
+    """
+    source = "".join(accented for accented, _ in ACCENTED)
+    target = "".join(plain for _, plain in ACCENTED)
+    return f"lower(trim(translate({column}, '{source}', '{target}')))"
+
+
+# Mismo formato que user_search_text: correo, usuario y nombre (si lo hay)
+POSTGRES_BACKFILL = f"""
+UPDATE users SET search_text = concat_ws(' ', {normalized("email")}, {normalized("username")},
+    nullif({normalized("full_name")}, ''))
+WHERE search_text IS NULL
+"""
+
+# En SQLite se registra la propia función del servicio
+SQLITE_BACKFILL = "UPDATE users SET search_text = user_search_text(email, username, full_name) WHERE search_text IS NULL"
+
+
+def upgrade() -> None:
+    if not has_column("users", "search_text"):
+        with op.batch_alter_table("users") as batch:
+            batch.add_column(sa.Column("search_text", sa.Text()))
+
+    if is_postgres():
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        create_index_if_missing(
+            "ix_users_search_text_trgm", "users", ["search_text"],
+            postgresql_using="gin", postgresql_ops={"search_text": "gin_trgm_ops"}
+        )
+
+    # search_text de los usuarios existentes (para recalcularlo con la
+    # normalización de Python: python scripts/reindex_user_search.py --all)
+    if is_postgres():
+        op.execute(POSTGRES_BACKFILL)
+    else:
+        bind = op.get_bind()
+        if bind.dialect.name == "sqlite":
+            bind.connection.driver_connection.create_function("user_search_text", 3, user_search_text)
+            op.execute(SQLITE_BACKFILL)
+
+
+def downgrade() -> None:
+    drop_index_if_exists("ix_users_search_text_trgm", "users")
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("search_text")
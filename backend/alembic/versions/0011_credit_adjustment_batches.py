@@ -0,0 +1,50 @@
+"""bulk credit adjustments with idempotency keys
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 00:00:10
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.migrations import has_table, has_column
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_table("credit_adjustment_batches"):
+        op.create_table(
+            "credit_adjustment_batches",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("idempotency_key", sa.String(100), nullable=False, unique=True),
+            sa.Column("request_hash", sa.String(64), nullable=False),
+            sa.Column("admin_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("amount", sa.Integer(), nullable=False),
+            sa.Column("description", sa.String()),
+            sa.Column("summary", sa.JSON()),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_credit_adjustment_batches_id", "credit_adjustment_batches", ["id"])
+
+    if not has_column("credit_transactions", "adjustment_batch_id"):
+        with op.batch_alter_table("credit_transactions") as batch:
+            batch.add_column(sa.Column("adjustment_batch_id", sa.Integer(), nullable=True))
+            batch.create_foreign_key(
+                "fk_credit_transactions_adjustment_batch", "credit_adjustment_batches",
+                ["adjustment_batch_id"], ["id"]
+            )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("credit_transactions") as batch:
+        batch.drop_constraint("fk_credit_transactions_adjustment_batch", type_="foreignkey")
+        batch.drop_column("adjustment_batch_id")
+    op.drop_table("credit_adjustment_batches")
@@ -5,20 +5,69 @@ from typing import Optional
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str
+    # Crear tablas con create_all al iniciar (desarrollo). En producción usar `alembic upgrade head`
+    DB_AUTO_CREATE: bool = True
+    # Pool de conexiones (por proceso: el total es workers de uvicorn x (size + overflow))
+    DB_POOL_SIZE: int = 5  # Conexiones persistentes
+    DB_MAX_OVERFLOW: int = 10  # Conexiones extra temporales en picos
+    DB_POOL_TIMEOUT: float = 30.0  # Segundos de espera por una conexión libre
+    DB_POOL_RECYCLE: int = 1800  # Reciclar conexiones con más de N segundos (-1 = nunca)
+    DB_POOL_PRE_PING: bool = True  # Verificar la conexión antes de usarla
+    # Réplicas de lectura (opcional): URLs separadas por comas
+    DATABASE_REPLICA_URLS: str = ""
+    DB_REPLICA_HEALTH_INTERVAL: float = 30.0  # Segundos entre verificaciones de cada réplica
+    DB_REPLICA_HEALTH_TIMEOUT: float = 2.0  # Segundos máximos de la verificación
+    DB_READ_YOUR_WRITES_SECONDS: float = 5.0  # Lecturas al primario tras escribir (retraso de replicación)
 
     # Security
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60  # 1 hora
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7  # 7 días
+    # Hashes bcrypt de contraseñas (en un pool de hilos, fuera del event loop)
+    BCRYPT_ROUNDS: int = 12  # Costo; los hashes con otro costo se recalculan al iniciar sesión
+    PASSWORD_HASH_WORKERS: int = 0  # Hilos del pool (0 = número de CPUs)
+    # Caché de usuarios autenticados (sin consultar `users` en cada solicitud)
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30.0  # Demora máxima en ver cambios hechos desde otro worker
+    PRINCIPAL_CACHE_SIZE: int = 10000  # Usuarios en caché por proceso
 
     # AI Services
     OPENAI_API_KEY: Optional[str] = None
     GEMINI_API_KEY: Optional[str] = None
     OLLAMA_BASE_URL: str = "http://localhost:11434"
 
+    # Generación por fragmentos (resúmenes largos, corrección por párrafos)
+    SUMMARY_CHUNK_TOKENS: int = 1500  # Tokens estimados por fragmento
+    CHUNK_MAX_CONCURRENCY: int = 4  # Llamadas simultáneas al modelo por solicitud
+    GENERATION_CACHE_SIZE: int = 2048  # Entradas en la caché de fragmentos
+
+    # Banco de preguntas
+    QUESTION_DUPLICATE_THRESHOLD: float = 0.8  # Similitud de Jaccard para casi-duplicados
+
     # Credits
     INITIAL_CREDITS: int = 500
+    # Reservas antes de llamadas de pago: se retiene el costo estimado y se liquida al terminar
+    CREDIT_RESERVATION_TTL_SECONDS: int = 900  # Las reservas sin liquidar se devuelven al expirar
+    CREDIT_RESERVATION_PROMPT_TOKENS: int = 400  # Tokens estimados de la plantilla del prompt
+
+    # Importación masiva de usuarios (CSV)
+    USER_IMPORT_BATCH_SIZE: int = 1000  # Filas por lote (un INSERT multi-fila y un commit por lote)
+    USER_IMPORT_HASH_WORKERS: int = 0  # Procesos para los hashes bcrypt (0 = número de CPUs)
+    USER_IMPORT_MAX_ROWS: int = 50000  # Filas máximas por archivo
+
+    # Panel de administración: instantánea de estadísticas recalculada en segundo plano
+    STATS_SNAPSHOT_INTERVAL_SECONDS: float = 60.0  # Antigüedad máxima de la instantánea
+    STATS_SNAPSHOT_LEASE_SECONDS: float = 30.0  # Tiempo máximo de cálculo antes de que otro worker lo retome
+
+    # Analítica de llamadas al modelo (generation_stats)
+    ANALYTICS_FLUSH_SECONDS: float = 10.0  # Cada cuánto se vuelcan los contadores en memoria
+    ANALYTICS_MINUTE_RETENTION_HOURS: int = 48  # Retención de los intervalos de un minuto
+    ANALYTICS_HOUR_RETENTION_DAYS: int = 90  # Retención de los intervalos de una hora (los diarios no se borran)
+    # Telemetría por llamada (generation_events), escrita en lotes cada ANALYTICS_FLUSH_SECONDS
+    TELEMETRY_ENABLED: bool = True
+    TELEMETRY_BATCH_SIZE: int = 500  # Eventos en memoria que adelantan el volcado
+    TELEMETRY_MAX_BUFFERED: int = 20000  # Eventos retenidos si el volcado falla (se descartan los más antiguos)
+    TELEMETRY_RETENTION_DAYS: int = 30
 
     # Email Service (Resend)
     RESEND_API_KEY: Optional[str] = None
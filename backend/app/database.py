@@ -1,17 +1,230 @@
-from sqlalchemy import create_engine
+import asyncio
+import itertools
+import threading
+import time
+from typing import List, Optional
+from fastapi import Depends, Request
+from jose import JWTError, jwt
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 from .config import settings
+from .utils.pool_metrics import InstrumentedQueuePool, instrument_pool
 
-engine = create_engine(settings.DATABASE_URL)
+# Drivers asíncronos equivalentes a los síncronos de DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """
+    Convierte una URL síncrona (postgresql://, sqlite://) a su driver asíncrono
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if parsed.get_dialect().is_async or backend not in ASYNC_DRIVERS:
+        # Ya indica un driver asíncrono (p. ej. postgresql+asyncpg): se respeta
+        return url
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def engine_options(url: str, poolclass=None) -> dict:
+    """
+    Opciones de pool desde la configuración. El tamaño, overflow y timeout solo
+    aplican a los dialectos que usan un QueuePool (SQLite en memoria usa un pool
+    estático y conserva el suyo).
+    """
+    options = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    parsed = make_url(url)
+    if issubclass(parsed.get_dialect().get_pool_class(parsed), QueuePool):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+        if poolclass is not None:
+            options["poolclass"] = poolclass
+    return options
+
+
+# Motor síncrono: create_all, migraciones y scripts de mantenimiento
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Motor asíncrono: usado por la API para no bloquear el event loop
+ASYNC_DATABASE_URL = async_database_url(settings.DATABASE_URL)
+async_engine_config = engine_options(ASYNC_DATABASE_URL, poolclass=InstrumentedQueuePool)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **async_engine_config)
+instrument_pool(async_engine.pool, {
+    name: value for name, value in async_engine_config.items() if name != "poolclass"
+})
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    # Los objetos siguen siendo legibles después del commit sin recargar (no hay lazy load en async)
+    expire_on_commit=False,
+)
+
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
+class Replica:
+    """
+    Réplica de lectura con su motor y el resultado de la última verificación
+    """
+
+    def __init__(self, url: str):
+        self.url = async_database_url(url)
+        self.engine = create_async_engine(self.url, **engine_options(self.url))
+        self.healthy = True
+        self.checked_at = 0.0
+
+    async def check(self) -> bool:
+        try:
+            async with self.engine.connect() as connection:
+                await asyncio.wait_for(
+                    connection.execute(text("SELECT 1")), settings.DB_REPLICA_HEALTH_TIMEOUT
+                )
+            self.healthy = True
+        except (DBAPIError, OSError, asyncio.TimeoutError):
+            self.healthy = False
+        self.checked_at = time.monotonic()
+        return self.healthy
+
+    def mark_unhealthy(self) -> None:
+        self.healthy = False
+        self.checked_at = time.monotonic()
+
+
+class ReplicaRouter:
+    """
+    Reparte las lecturas entre las réplicas (round-robin) y excluye las que no
+    responden hasta la siguiente verificación. Preserva "leer lo propio": durante
+    unos segundos después de que un cliente escribe, sus lecturas van al primario
+    para no ver datos aún no replicados. Ese registro es por proceso.
+    """
+
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(url) for url in urls]
+        self._cycle = itertools.cycle(self.replicas) if self.replicas else None
+        self._recent_writes: dict = {}
+        self._lock = threading.Lock()
+
+    def mark_write(self, writer: Optional[str]) -> None:
+        if not writer:
+            return
+        now = time.monotonic()
+        window = settings.DB_READ_YOUR_WRITES_SECONDS
+        with self._lock:
+            self._recent_writes[writer] = now
+            if len(self._recent_writes) > 10000:
+                self._recent_writes = {
+                    key: at for key, at in self._recent_writes.items() if now - at < window
+                }
+
+    def wrote_recently(self, writer: Optional[str]) -> bool:
+        if not writer:
+            return False
+        with self._lock:
+            written_at = self._recent_writes.get(writer)
+        return written_at is not None and time.monotonic() - written_at < settings.DB_READ_YOUR_WRITES_SECONDS
+
+    async def choose(self, writer: Optional[str] = None) -> Optional[Replica]:
+        """
+        Réplica para una lectura, o None si debe ir al primario
+        """
+        if not self.replicas or self.wrote_recently(writer):
+            return None
+        for _ in range(len(self.replicas)):
+            replica = next(self._cycle)
+            if time.monotonic() - replica.checked_at > settings.DB_REPLICA_HEALTH_INTERVAL:
+                await replica.check()
+            if replica.healthy:
+                return replica
+        return None
+
+
+replica_router = ReplicaRouter([
+    url.strip() for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()
+])
+
+
+def request_writer(request: Request) -> Optional[str]:
+    """
+    Identifica al usuario por el id (o el email) de su access token, sin
+    consultar la base de datos. No depende del token en sí: uno renovado
+    conserva la misma clave.
+    """
+    scheme, _, token = (request.headers.get("authorization") or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
     try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    user = payload.get("uid") or payload.get("sub")
+    return f"user:{user}" if user is not None else None
+
+
+@event.listens_for(Session, "after_flush")
+def _flag_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _flag_bulk_write(orm_execute_state):
+    # UPDATE/DELETE/INSERT ejecutados como sentencias no pasan por el flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _record_write(session):
+    if session.info.pop("wrote", False):
+        replica_router.mark_write(session.info.get("writer"))
+
+
+async def get_db(request: Request):
+    async with AsyncSessionLocal() as db:
+        db.info["writer"] = request_writer(request)
+        yield db
+
+
+async def get_read_db(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Sesión para dependencias de solo lectura: usa una réplica sana si hay
+    réplicas configuradas y el cliente no escribió hace poco; si no, la misma
+    sesión del primario de la solicitud (sin ocupar una segunda conexión).
+    """
+    replica = await replica_router.choose(request_writer(request))
+    if replica is None:
         yield db
-    finally:
-        db.close()
+        return
+
+    async with AsyncSessionLocal(bind=replica.engine) as replica_db:
+        try:
+            yield replica_db
+        except DBAPIError:
+            # Réplica caída o con errores: se excluye hasta la próxima verificación
+            replica.mark_unhealthy()
+            raise
+
+
+async def release_connection(db: AsyncSession) -> None:
+    """
+    Cierra la transacción en curso para devolver la conexión al pool antes de una
+    espera larga (llamadas al modelo de IA). Los objetos cargados siguen siendo
+    legibles (expire_on_commit=False) y la sesión toma otra conexión al volver a
+    consultar. Cualquier cambio pendiente se confirma.
+    """
+    await db.commit()
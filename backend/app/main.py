@@ -1,15 +1,39 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from .config import settings
 from .database import engine, Base
-from .routers import auth_router, activities_router, content_router, export_router, admin_router, chatbot_router
+from .routers import auth_router, activities_router, content_router, export_router, admin_router, chatbot_router, question_bank_router
+from .services.analytics_service import generation_analytics
+from .services.telemetry_service import generation_telemetry
+from .services.stats_snapshot_service import stats_snapshot_service
+from .utils.auth import shutdown_password_pool
+
+# Crear tablas (en producción el esquema lo gestionan las migraciones de Alembic)
+if settings.DB_AUTO_CREATE:
+    Base.metadata.create_all(bind=engine)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Estadísticas del panel recalculadas en segundo plano (un worker a la vez)
+    stats_snapshot_service.start()
+    # Métricas de las llamadas al modelo, volcadas en lote
+    generation_analytics.start()
+    # Telemetría por llamada al modelo, escrita en lotes
+    generation_telemetry.start()
+    yield
+    await stats_snapshot_service.stop()
+    await generation_analytics.stop()
+    await generation_telemetry.stop()
+    shutdown_password_pool()
 
-# Crear tablas
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="Plataforma Educativa API",
     description="API para plataforma educativa con IA (Ollama, OpenAI, Gemini)",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configurar CORS - Permitir todas las origins en desarrollo
@@ -29,6 +53,7 @@ app.include_router(content_router)
 app.include_router(export_router)
 app.include_router(admin_router)
 app.include_router(chatbot_router)
+app.include_router(question_bank_router)
 
 
 @app.get("/")
@@ -1,6 +1,8 @@
 from .user import User, UserRole
 from .activity import Activity, ActivityType, AIProvider
-from .credit import CreditTransaction
+from .credit import CreditTransaction, CreditReservation, ReservationStatus, CreditAdjustmentBatch
 from .chatbot import Chatbot, ChatbotType, ChatConversation, ChatMessage
+from .question_bank import QuestionBankItem, QuestionLSHBucket
+from .usage import UsageDaily, StatsSnapshot, GenerationStats, GenerationEvent
 
-__all__ = ["User", "UserRole", "Activity", "ActivityType", "AIProvider", "CreditTransaction", "Chatbot", "ChatbotType", "ChatConversation", "ChatMessage"]
+__all__ = ["User", "UserRole", "Activity", "ActivityType", "AIProvider", "CreditTransaction", "CreditReservation", "ReservationStatus", "CreditAdjustmentBatch", "Chatbot", "ChatbotType", "ChatConversation", "ChatMessage", "QuestionBankItem", "QuestionLSHBucket", "UsageDaily", "StatsSnapshot", "GenerationStats", "GenerationEvent"]
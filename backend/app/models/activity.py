@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Enum, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Enum, JSON, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred, validates
 from sqlalchemy.sql import func
 import enum
+import json
 from ..database import Base
 
 
@@ -26,6 +28,35 @@ class AIProvider(str, enum.Enum):
     GEMINI = "gemini"
 
 
+# Listas del contenido que se cuentan como elementos de la actividad, por prioridad
+# (preguntas de examen/encuesta, diapositivas, palabras, criterios de rúbrica, ...)
+CONTENT_ITEM_KEYS = (
+    "questions", "slides", "words", "criteria", "steps", "errors",
+    "key_points", "discussion_questions",
+)
+
+
+def count_content_items(content) -> "int | None":
+    """
+    Número de elementos del contenido generado (p. ej. preguntas de un examen)
+    """
+    if isinstance(content, str):
+        try:
+            content = json.loads(content)
+        except (ValueError, TypeError):
+            return None
+    if not isinstance(content, dict):
+        return None
+
+    clues = content.get("clues")
+    if isinstance(clues, dict):
+        return sum(len(v) for v in clues.values() if isinstance(v, list))
+    for key in CONTENT_ITEM_KEYS:
+        if isinstance(content.get(key), list):
+            return len(content[key])
+    return None
+
+
 class Activity(Base):
     __tablename__ = "activities"
 
@@ -34,6 +65,7 @@ class Activity(Base):
     description = Column(Text)
     activity_type = Column(Enum(ActivityType), nullable=False)
     content = Column(JSON)  # Almacena el contenido generado en formato JSON
+    item_count = Column(Integer)  # Precalculado para los listados (ver count_content_items)
 
     # Metadata
     subject = Column(String)  # Área/materia
@@ -54,3 +86,19 @@ class Activity(Base):
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Búsqueda de texto completo (solo PostgreSQL; lo mantiene search_service)
+    search_vector = deferred(Column(Text().with_variant(TSVECTOR(), "postgresql")))
+
+    @validates("content")
+    def _update_item_count(self, key, value):
+        self.item_count = count_content_items(value)
+        return value
+
+    __table_args__ = (
+        # Listados paginados por (created_at, id): global, por autor y públicos
+        Index("ix_activities_created", "created_at", "id"),
+        Index("ix_activities_creator_created", "creator_id", "created_at", "id"),
+        Index("ix_activities_public_created", "is_public", "created_at", "id"),
+        Index("ix_activities_search_vector", "search_vector", postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Enum, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Enum, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -65,9 +65,13 @@ class ChatConversation(Base):
     # Messages
     messages = relationship("ChatMessage", back_populates="conversation", cascade="all, delete-orphan")
 
-    # Timestamps
+    # Timestamps (updated_at siempre tiene valor: es la clave del listado paginado)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_chat_conversations_user_chatbot_updated", "user_id", "chatbot_id", "updated_at", "id"),
+    )
 
 
 class ChatMessage(Base):
@@ -83,3 +87,7 @@ class ChatMessage(Base):
 
     # Timestamp
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_chat_messages_conversation_created", "conversation_id", "created_at"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Index, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -21,8 +21,64 @@ class CreditTransaction(Base):
     transaction_type = Column(Enum(TransactionType), nullable=False)
     description = Column(String)
     activity_id = Column(Integer, ForeignKey("activities.id"), nullable=True)
+    # Ajuste masivo que originó el movimiento (solo ADMIN_ADJUSTMENT en lote)
+    adjustment_batch_id = Column(Integer, ForeignKey("credit_adjustment_batches.id"), nullable=True)
     balance_after = Column(Integer, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
     user = relationship("User", back_populates="credit_transactions")
+
+    __table_args__ = (
+        Index("ix_credit_transactions_user_created", "user_id", "created_at", "id"),
+    )
+
+
+class ReservationStatus(str, enum.Enum):
+    HELD = "held"
+    SETTLED = "settled"
+    RELEASED = "released"
+    EXPIRED = "expired"
+
+
+class CreditReservation(Base):
+    """
+    Créditos retenidos antes de una llamada de pago al modelo. Se liquidan con el
+    consumo real al guardar la actividad, o se devuelven si la generación falla,
+    se cancela o la reserva expira.
+    """
+    __tablename__ = "credit_reservations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    amount = Column(Integer, nullable=False)  # Créditos retenidos (estimación)
+    status = Column(Enum(ReservationStatus), nullable=False, default=ReservationStatus.HELD)
+    description = Column(String)
+    activity_id = Column(Integer, ForeignKey("activities.id"), nullable=True)
+    credits_charged = Column(Integer)  # Consumo real al liquidar
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    resolved_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index("ix_credit_reservations_user_status", "user_id", "status"),
+        Index("ix_credit_reservations_status_expires", "status", "expires_at"),
+    )
+
+
+class CreditAdjustmentBatch(Base):
+    """
+    Ajuste de créditos aplicado a un grupo de usuarios. La clave de idempotencia
+    del cliente es única: reintentar la misma solicitud devuelve el resumen
+    guardado en lugar de volver a aplicar el ajuste.
+    """
+    __tablename__ = "credit_adjustment_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    idempotency_key = Column(String(100), nullable=False, unique=True)
+    request_hash = Column(String(64), nullable=False)  # Para rechazar la misma clave con otra solicitud
+    admin_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    amount = Column(Integer, nullable=False)
+    description = Column(String)
+    summary = Column(JSON)  # Respuesta devuelta al aplicar el ajuste
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,56 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from ..database import Base
+
+
+class QuestionBankItem(Base):
+    __tablename__ = "question_bank"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Clasificación
+    topic = Column(String, nullable=False)
+    topic_key = Column(String, nullable=False)  # Tema normalizado (minúsculas, sin tildes)
+    question_type = Column(String, nullable=False)  # multiple_choice, true_false, short_answer
+    grade_level = Column(String)
+
+    # Pregunta
+    question = Column(Text, nullable=False)
+    options = Column(JSON)  # Solo para multiple_choice
+    correct_answer = Column(Text)
+    points = Column(Integer, default=1)
+    text_hash = Column(String(64), nullable=False, index=True)
+
+    # Detección de casi-duplicados (MinHash/LSH)
+    minhash = Column(JSON)  # Firma MinHash del texto normalizado
+    duplicate_of_id = Column(Integer, ForeignKey("question_bank.id", ondelete="SET NULL"), nullable=True)
+
+    # Relations
+    activity_id = Column(Integer, ForeignKey("activities.id", ondelete="SET NULL"), nullable=True)
+    creator_id = Column(Integer, ForeignKey("users.id"))
+    activity = relationship("Activity")
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_question_bank_topic_type_grade", "topic_key", "question_type", "grade_level"),
+    )
+
+
+class QuestionLSHBucket(Base):
+    """
+    Cubetas LSH de cada pregunta: una fila por banda de la firma MinHash.
+    Las preguntas que comparten (band, bucket) son candidatas a casi-duplicado.
+    """
+    __tablename__ = "question_lsh_buckets"
+
+    id = Column(Integer, primary_key=True)
+    question_id = Column(Integer, ForeignKey("question_bank.id", ondelete="CASCADE"), nullable=False, index=True)
+    band = Column(Integer, nullable=False)
+    bucket = Column(String(16), nullable=False)
+
+    __table_args__ = (
+        Index("ix_question_lsh_buckets_band_bucket", "band", "bucket"),
+    )
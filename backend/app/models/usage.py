@@ -0,0 +1,147 @@
+from sqlalchemy import Column, Integer, String, Text, Boolean, Float, Date, DateTime, ForeignKey, Enum, Index, UniqueConstraint, JSON
+from sqlalchemy.sql import func
+from ..database import Base
+from .activity import ActivityType
+
+# Proveedor registrado para actividades que no llamaron al modelo (p. ej. variantes del banco)
+NO_PROVIDER = "none"
+
+
+class UsageDaily(Base):
+    """
+    Consumo agregado por día (UTC) x usuario x proveedor x tipo de actividad. Se
+    actualiza en la misma transacción que guarda cada actividad, así las
+    estadísticas del panel no recorren `activities` ni `credit_transactions`.
+    """
+    __tablename__ = "usage_daily"
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    ai_provider = Column(String(20), nullable=False)  # Valor de AIProvider o NO_PROVIDER
+    activity_type = Column(Enum(ActivityType), nullable=False)
+
+    activities = Column(Integer, nullable=False, default=0)  # Actividades generadas
+    credits_used = Column(Integer, nullable=False, default=0)  # Créditos cobrados
+    tokens_used = Column(Integer, nullable=False, default=0)  # Tokens reportados por el proveedor
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("day", "user_id", "ai_provider", "activity_type", name="uq_usage_daily_bucket"),
+        Index("ix_usage_daily_user_day", "user_id", "day"),
+    )
+
+
+class StatsSnapshot(Base):
+    """
+    Última instantánea calculada de unas estadísticas (p. ej. el panel de
+    administración), compartida por todos los workers. La fila también hace de
+    lease: solo el worker que la toma (`lease_owner` hasta `lease_expires_at`)
+    calcula la siguiente instantánea.
+    """
+    __tablename__ = "stats_snapshots"
+
+    name = Column(String(50), primary_key=True)
+    payload = Column(JSON)
+    etag = Column(String(80))
+    generated_at = Column(DateTime(timezone=True))
+
+    lease_owner = Column(String(100))
+    lease_expires_at = Column(DateTime(timezone=True))
+
+
+# Límites superiores (ms) del histograma de latencia de las llamadas al modelo
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+
+
+class GenerationStats(Base):
+    """
+    Llamadas al modelo agregadas por intervalo (minuto, hora y día) x proveedor x
+    modelo x tipo de actividad: cantidad, errores, tokens, créditos e histograma
+    de latencia (las columnas `latency_le_*` cuentan las llamadas exitosas que
+    tardaron hasta ese límite; `latency_gt_120000`, el resto). Los percentiles se
+    estiman a partir del histograma, que se puede sumar entre filas.
+    """
+    __tablename__ = "generation_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    resolution = Column(String(6), nullable=False)  # minute, hour, day
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    ai_provider = Column(String(20), nullable=False)
+    model = Column(String(100), nullable=False)
+    activity_type = Column(String(30), nullable=False)  # Valor de ActivityType, o "none" fuera de una generación
+
+    calls = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    tokens_in = Column(Integer, nullable=False, default=0)
+    tokens_out = Column(Integer, nullable=False, default=0)
+    credits_used = Column(Integer, nullable=False, default=0)
+    latency_ms_total = Column(Integer, nullable=False, default=0)  # Solo llamadas exitosas
+
+    latency_le_100 = Column(Integer, nullable=False, default=0)
+    latency_le_250 = Column(Integer, nullable=False, default=0)
+    latency_le_500 = Column(Integer, nullable=False, default=0)
+    latency_le_1000 = Column(Integer, nullable=False, default=0)
+    latency_le_2500 = Column(Integer, nullable=False, default=0)
+    latency_le_5000 = Column(Integer, nullable=False, default=0)
+    latency_le_10000 = Column(Integer, nullable=False, default=0)
+    latency_le_30000 = Column(Integer, nullable=False, default=0)
+    latency_le_60000 = Column(Integer, nullable=False, default=0)
+    latency_le_120000 = Column(Integer, nullable=False, default=0)
+    latency_gt_120000 = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "resolution", "bucket_start", "ai_provider", "model", "activity_type",
+            name="uq_generation_stats_bucket"
+        ),
+    )
+
+
+class GenerationEvent(Base):
+    """
+    Telemetría de cada llamada al modelo (o acierto de caché que la evitó), con
+    los tiempos y el consumo que reporta el proveedor. Se escribe en lotes
+    (ver telemetry_service) y se enlaza con la actividad o el mensaje de chat
+    que produjo la llamada una vez guardados.
+    """
+    __tablename__ = "generation_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(String(32), nullable=False, unique=True)  # Generado en el worker, para enlazar tras el volcado
+    created_at = Column(DateTime(timezone=True), nullable=False)  # Inicio de la llamada
+
+    # Origen
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    activity_type = Column(String(30), nullable=False)  # Valor de ActivityType, o "none" fuera de una generación
+    activity_id = Column(Integer, ForeignKey("activities.id", ondelete="SET NULL"), nullable=True, index=True)
+    chat_message_id = Column(Integer, ForeignKey("chat_messages.id", ondelete="SET NULL"), nullable=True, index=True)
+
+    # Llamada
+    ai_provider = Column(String(20), nullable=False)
+    model = Column(String(100), nullable=False)
+    success = Column(Boolean, nullable=False)
+    error = Column(Text)
+    cache_hit = Column(Boolean, nullable=False, default=False)  # Servida desde la caché, sin llamar al modelo
+    json_ok = Column(Boolean)  # El contenido se pudo interpretar como JSON (None si no aplica)
+
+    # Tiempos (ms). latency_ms es el tiempo de pared de la llamada; en Ollama la
+    # diferencia con total_duration_ms es la espera en su cola más la red
+    latency_ms = Column(Integer)
+    queue_wait_ms = Column(Integer)  # Espera por un turno de concurrencia antes de llamar
+    total_duration_ms = Column(Float)
+    load_duration_ms = Column(Float)
+    prompt_eval_duration_ms = Column(Float)
+    eval_duration_ms = Column(Float)
+
+    # Consumo
+    tokens_in = Column(Integer)
+    tokens_out = Column(Integer)
+    credits_used = Column(Integer)
+    usage = Column(JSON)  # Detalle de uso tal como lo reporta el proveedor
+
+    __table_args__ = (
+        Index("ix_generation_events_created", "created_at"),
+        Index("ix_generation_events_provider_model_created", "ai_provider", "model", "created_at"),
+    )
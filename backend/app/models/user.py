@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Enum, Index, DDL, event
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 import enum
 from ..database import Base
@@ -22,11 +22,34 @@ class User(Base):
     role = Column(Enum(UserRole), nullable=False, default=UserRole.ESTUDIANTE)
     is_active = Column(Boolean, default=True)
     credits = Column(Integer, default=500)
+    # Créditos retenidos por generaciones en curso (reservas sin liquidar)
+    held_credits = Column(Integer, nullable=False, default=0, server_default="0")
+    # Versión de los access tokens: al incrementarla se revocan los emitidos antes
+    # (cambio de contraseña, de rol o desactivación)
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # Correo, usuario y nombre en minúsculas y sin tildes (lo mantiene user_search_service)
+    search_text = deferred(Column(Text))
+
     # Relationships
     activities = relationship("Activity", back_populates="creator")
     credit_transactions = relationship("CreditTransaction", back_populates="user")
     chatbots = relationship("Chatbot", back_populates="creator")
     chat_conversations = relationship("ChatConversation", back_populates="user")
+
+    __table_args__ = (
+        Index("ix_users_created", "created_at", "id"),
+        Index(
+            "ix_users_search_text_trgm", "search_text",
+            postgresql_using="gin", postgresql_ops={"search_text": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
+# El índice de trigramas necesita pg_trgm también con `create_all` (DB_AUTO_CREATE)
+event.listen(
+    User.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
@@ -1,69 +1,100 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from ..database import get_db
-from ..models.user import User, UserRole
+from ..database import get_db, get_read_db
+from ..models.user import UserRole
 from ..models.activity import Activity, ActivityType
-from ..schemas.activity import ActivityResponse, ActivityUpdate
-from ..utils.auth import get_current_active_user, get_current_user_optional
+from ..schemas.activity import ActivityResponse, ActivitySummary, ActivityUpdate
+from ..services.search_service import search_service
+from ..utils.auth import Principal, get_current_active_principal, get_current_principal_optional
+from ..utils.pagination import paginate
 
 router = APIRouter(prefix="/api/activities", tags=["Activities"])
 
 
-@router.get("/", response_model=List[ActivityResponse])
+def visible_activities(stmt, current_user: Optional[Principal], is_public: Optional[bool] = None):
+    """
+    Restringe un select de actividades a las que el usuario puede ver
+    """
+    # Si no hay usuario autenticado, solo mostrar actividades públicas
+    if current_user is None:
+        return stmt.where(Activity.is_public == True)
+    # Admin puede ver todo
+    if current_user.role == UserRole.ADMIN:
+        return stmt
+
+    # Otros usuarios ven públicas + propias
+    if is_public is not None:
+        if is_public:
+            return stmt.where(Activity.is_public == True)
+        return stmt.where(Activity.creator_id == current_user.id)
+    return stmt.where(
+        (Activity.is_public == True) | (Activity.creator_id == current_user.id)
+    )
+
+
+@router.get("/", response_model=List[ActivitySummary])
 async def get_activities(
+    response: Response,
     activity_type: Optional[ActivityType] = None,
     is_public: Optional[bool] = None,
     skip: int = 0,
     limit: int = Query(default=20, le=100),
-    current_user: Optional[User] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: Optional[Principal] = Depends(get_current_principal_optional),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Obtiene lista de actividades (públicas + propias del usuario).
     Permite acceso anónimo para ver solo actividades públicas.
+    Admite paginación por cursor (`cursor`, cabecera X-Next-Cursor) o por `skip`.
     """
-    query = db.query(Activity)
+    stmt = visible_activities(select(*ActivitySummary.columns()), current_user, is_public)
 
     # Filtrar por tipo de actividad si se especifica
     if activity_type:
-        query = query.filter(Activity.activity_type == activity_type)
+        stmt = stmt.where(Activity.activity_type == activity_type)
 
-    # Si no hay usuario autenticado, solo mostrar actividades públicas
-    if current_user is None:
-        query = query.filter(Activity.is_public == True)
-    # Si hay usuario autenticado
-    elif current_user.role == UserRole.ADMIN:
-        # Admin puede ver todo
-        pass
-    else:
-        # Otros usuarios ven públicas + propias
-        if is_public is not None:
-            if is_public:
-                query = query.filter(Activity.is_public == True)
-            else:
-                query = query.filter(Activity.creator_id == current_user.id)
-        else:
-            query = query.filter(
-                (Activity.is_public == True) | (Activity.creator_id == current_user.id)
-            )
-
-    activities = query.order_by(Activity.created_at.desc()).offset(skip).limit(limit).all()
-
-    return [ActivityResponse.from_orm(activity) for activity in activities]
+    activities = await paginate(db, stmt, Activity.created_at, Activity.id, response, limit, cursor=cursor, skip=skip)
+
+    return [ActivitySummary.model_validate(activity) for activity in activities]
+
+
+@router.get("/search", response_model=List[ActivitySummary])
+async def search_activities(
+    q: str = Query(..., min_length=2, max_length=200),
+    activity_type: Optional[ActivityType] = None,
+    skip: int = Query(default=0, ge=0),
+    limit: int = Query(default=20, le=100),
+    current_user: Optional[Principal] = Depends(get_current_principal_optional),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Busca actividades por título, materia y contenido generado, ordenadas por relevancia.
+    Respeta las mismas reglas de visibilidad que el listado.
+    """
+    stmt = visible_activities(select(*ActivitySummary.columns()), current_user)
+
+    if activity_type:
+        stmt = stmt.where(Activity.activity_type == activity_type)
+
+    activities = await search_service.search(db, stmt, q, skip=skip, limit=limit)
+
+    return [ActivitySummary.model_validate(activity) for activity in activities]
 
 
 @router.get("/{activity_id}", response_model=ActivityResponse)
 async def get_activity(
     activity_id: int,
-    current_user: Optional[User] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db)
+    current_user: Optional[Principal] = Depends(get_current_principal_optional),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Obtiene una actividad específica.
     Permite acceso anónimo solo para actividades públicas.
     """
-    activity = db.query(Activity).filter(Activity.id == activity_id).first()
+    activity = await db.scalar(select(Activity).where(Activity.id == activity_id))
 
     if not activity:
         raise HTTPException(status_code=404, detail="Actividad no encontrada")
@@ -80,38 +111,40 @@ async def get_activity(
     return ActivityResponse.from_orm(activity)
 
 
-@router.get("/my/activities", response_model=List[ActivityResponse])
+@router.get("/my/activities", response_model=List[ActivitySummary])
 async def get_my_activities(
+    response: Response,
     activity_type: Optional[ActivityType] = None,
     skip: int = 0,
     limit: int = Query(default=20, le=100),
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_active_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Obtiene las actividades creadas por el usuario actual
     """
-    query = db.query(Activity).filter(Activity.creator_id == current_user.id)
+    stmt = select(*ActivitySummary.columns()).where(Activity.creator_id == current_user.id)
 
     if activity_type:
-        query = query.filter(Activity.activity_type == activity_type)
+        stmt = stmt.where(Activity.activity_type == activity_type)
 
-    activities = query.order_by(Activity.created_at.desc()).offset(skip).limit(limit).all()
+    activities = await paginate(db, stmt, Activity.created_at, Activity.id, response, limit, cursor=cursor, skip=skip)
 
-    return [ActivityResponse.from_orm(activity) for activity in activities]
+    return [ActivitySummary.model_validate(activity) for activity in activities]
 
 
 @router.patch("/{activity_id}", response_model=ActivityResponse)
 async def update_activity(
     activity_id: int,
     activity_update: ActivityUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Actualiza una actividad (solo el creador puede modificarla)
     """
-    activity = db.query(Activity).filter(Activity.id == activity_id).first()
+    activity = await db.scalar(select(Activity).where(Activity.id == activity_id))
 
     if not activity:
         raise HTTPException(status_code=404, detail="Actividad no encontrada")
@@ -127,8 +160,8 @@ async def update_activity(
     if activity_update.is_public is not None:
         activity.is_public = activity_update.is_public
 
-    db.commit()
-    db.refresh(activity)
+    await db.commit()
+    await db.refresh(activity)
 
     return ActivityResponse.from_orm(activity)
 
@@ -136,13 +169,13 @@ async def update_activity(
 @router.delete("/{activity_id}")
 async def delete_activity(
     activity_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Elimina una actividad (solo el creador puede eliminarla)
     """
-    activity = db.query(Activity).filter(Activity.id == activity_id).first()
+    activity = await db.scalar(select(Activity).where(Activity.id == activity_id))
 
     if not activity:
         raise HTTPException(status_code=404, detail="Actividad no encontrada")
@@ -150,7 +183,7 @@ async def delete_activity(
     if activity.creator_id != current_user.id and current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="No tienes permiso para eliminar esta actividad")
 
-    db.delete(activity)
-    db.commit()
+    await db.delete(activity)
+    await db.commit()
 
     return {"message": "Actividad eliminada correctamente"}
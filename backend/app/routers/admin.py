@@ -1,22 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
-from typing import List, Optional
-from datetime import datetime, timedelta
-from ..database import get_db
+import csv
+import io
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, UploadFile, File, Header
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, and_, select
+from typing import List, Literal, Optional, Union
+from datetime import date, datetime, timedelta, timezone
+from ..database import get_db, get_read_db
 from ..models.user import User, UserRole
 from ..models.activity import Activity, ActivityType
 from ..models.credit import CreditTransaction, TransactionType
 from ..schemas.user import UserResponse
-from ..schemas.activity import ActivityResponse
-from ..utils.auth import get_current_active_user
-from pydantic import BaseModel, EmailStr
+from ..schemas.activity import ActivitySummary
+from ..utils.auth import Principal, get_current_active_principal, invalidate_principal
+from ..utils.pagination import paginate
+from ..services.analytics_service import generation_analytics, RESOLUTIONS, MAX_POINTS
+from ..services.stats_snapshot_service import stats_snapshot_service
+from ..services.usage_service import usage_service
+from ..services.user_search_service import user_search_service
+from ..services.user_import_service import user_import_service
+from ..services.credit_service import credit_service
+from ..utils.pool_metrics import pool_metrics
+from pydantic import BaseModel, EmailStr, Field, model_validator
 
 router = APIRouter(prefix="/api/admin", tags=["Admin"])
 
 
 # Dependency to check if user is admin
-async def get_current_admin_user(current_user: User = Depends(get_current_active_user)) -> User:
+async def get_current_admin_user(current_user: Principal = Depends(get_current_active_principal)) -> Principal:
     """
     Verifica que el usuario actual sea administrador
     """
@@ -35,6 +45,17 @@ class DashboardStats(BaseModel):
     total_credits_used: int
     active_users_today: int
     activities_created_today: int
+    total_tokens_used: int = 0
+    generated_at: Optional[datetime] = None  # Momento en que se calcularon las cifras
+
+
+class UsagePoint(BaseModel):
+    day: date
+    key: Optional[Union[int, str]] = None  # Proveedor, tipo de actividad o usuario (según group_by)
+    activities: int
+    credits_used: int
+    tokens_used: int
+    active_users: int
 
 
 class UserListItem(BaseModel):
@@ -51,9 +72,23 @@ class UserListItem(BaseModel):
         from_attributes = True
 
 
+class UserImportError(BaseModel):
+    row: int  # Línea del archivo (la cabecera es la 1)
+    email: Optional[str] = None
+    error: str
+
+
+class UserImportResult(BaseModel):
+    total_rows: int
+    created: int
+    failed: int
+    dry_run: bool
+    errors: List[UserImportError]
+
+
 class UserDetailResponse(BaseModel):
     user: UserResponse
-    recent_activities: List[ActivityResponse]
+    recent_activities: List[ActivitySummary]
     recent_transactions: List[dict]
 
 
@@ -70,6 +105,42 @@ class CreditAdjustment(BaseModel):
     description: str
 
 
+class BulkCreditAdjustment(BaseModel):
+    """
+    Ajuste de créditos para una lista de usuarios o para los que cumplen los
+    filtros (rol, estado y fecha de alta, p. ej. los importados en un semestre)
+    """
+    amount: int
+    description: str = Field(min_length=1, max_length=200)
+    user_ids: Optional[List[int]] = Field(default=None, min_length=1, max_length=10000)
+    role: Optional[UserRole] = None
+    is_active: Optional[bool] = True
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def _check_target(self):
+        if self.amount == 0:
+            raise ValueError("El monto no puede ser 0")
+        has_filter = self.role is not None or self.created_from is not None or self.created_to is not None
+        if self.user_ids is None and not has_filter:
+            raise ValueError("Indica user_ids o al menos un filtro (role, created_from, created_to)")
+        if self.user_ids is not None and has_filter:
+            raise ValueError("Usa user_ids o filtros, no ambos")
+        return self
+
+
+class BulkCreditAdjustmentResult(BaseModel):
+    batch_id: int
+    amount: int
+    matched: int  # Usuarios seleccionados
+    updated: int  # Usuarios ajustados
+    skipped_insufficient: int  # Omitidos porque quedarían con saldo negativo
+    missing_user_ids: List[int] = []
+    total_amount: int
+    replayed: bool  # True si la clave ya se había usado y se devuelve el resumen guardado
+
+
 class ActivityListItem(BaseModel):
     id: int
     title: str
@@ -79,6 +150,7 @@ class ActivityListItem(BaseModel):
     grade_level: Optional[str]
     is_public: bool
     credits_used: int
+    item_count: Optional[int] = None
     creator_id: int
     created_at: datetime
 
@@ -86,72 +158,75 @@ class ActivityListItem(BaseModel):
         from_attributes = True
 
 
+class LatencySummary(BaseModel):
+    avg: Optional[float] = None
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+
+
+class GenerationPoint(BaseModel):
+    bucket_start: datetime
+    key: Optional[str] = None  # Proveedor, modelo o tipo de actividad (según group_by)
+    calls: int
+    errors: int
+    error_rate: float
+    tokens_in: int
+    tokens_out: int
+    credits_used: int
+    latency_ms: LatencySummary
+
+
 # Endpoint 1: GET /api/admin/stats - Dashboard statistics
 @router.get("/stats", response_model=DashboardStats)
 async def get_dashboard_stats(
-    current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    refresh: bool = False,
+    current_user: Principal = Depends(get_current_admin_user)
 ):
     """
-    Obtiene estadísticas del dashboard para administradores
+    Obtiene estadísticas del dashboard para administradores. Se sirven desde una
+    instantánea en memoria que se recalcula en segundo plano (ver `generated_at`);
+    `refresh=true` fuerza el recálculo. Responde 304 si el ETag enviado en
+    If-None-Match sigue vigente.
     """
-    # Total users
-    total_users = db.query(func.count(User.id)).scalar()
-
-    # Total activities
-    total_activities = db.query(func.count(Activity.id)).scalar()
-
-    # Total credits used (sum of all negative transactions)
-    total_credits_used = db.query(func.sum(CreditTransaction.amount))\
-        .filter(CreditTransaction.transaction_type == TransactionType.USAGE)\
-        .scalar() or 0
-    total_credits_used = abs(total_credits_used)
-
-    # Active users today (users who created activities or made transactions today)
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-
-    active_users_today = db.query(func.count(func.distinct(Activity.creator_id)))\
-        .filter(Activity.created_at >= today_start)\
-        .scalar()
-
-    # Activities created today
-    activities_created_today = db.query(func.count(Activity.id))\
-        .filter(Activity.created_at >= today_start)\
-        .scalar()
-
-    return DashboardStats(
-        total_users=total_users,
-        total_activities=total_activities,
-        total_credits_used=total_credits_used,
-        active_users_today=active_users_today,
-        activities_created_today=activities_created_today
-    )
+    snapshot = await stats_snapshot_service.get(force=refresh)
+    headers = {"ETag": snapshot.etag, "Cache-Control": "private, no-cache"}
+    if not refresh and snapshot.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return DashboardStats(**snapshot.data, generated_at=snapshot.generated_at)
 
 
 # Endpoint 2: GET /api/admin/users - List all users with pagination
 @router.get("/users", response_model=List[UserListItem])
 async def get_all_users(
+    response: Response,
     skip: int = Query(default=0, ge=0),
     limit: int = Query(default=20, le=100),
+    cursor: Optional[str] = None,
     search: Optional[str] = None,
-    current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Lista todos los usuarios con paginación y búsqueda opcional
+    Lista todos los usuarios con paginación y búsqueda opcional. La búsqueda
+    (correo, usuario o nombre, sin distinguir acentos y tolerante a errores de
+    tipeo) ordena por relevancia y se pagina con `skip`.
     """
-    query = db.query(User)
+    stmt = select(User)
 
-    # Apply search filter if provided
     if search:
-        search_filter = or_(
-            User.email.ilike(f"%{search}%"),
-            User.username.ilike(f"%{search}%"),
-            User.full_name.ilike(f"%{search}%")
-        )
-        query = query.filter(search_filter)
+        if cursor:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="La búsqueda se pagina con skip, no con cursor"
+            )
+        users = await user_search_service.search(db, stmt, search, skip=skip, limit=limit)
+        return [UserListItem.from_orm(user) for user in users]
 
-    users = query.order_by(User.created_at.desc()).offset(skip).limit(limit).all()
+    users = await paginate(db, stmt, User.created_at, User.id, response, limit, cursor=cursor, skip=skip)
 
     return [UserListItem.from_orm(user) for user in users]
 
@@ -160,13 +235,13 @@ async def get_all_users(
 @router.get("/users/{user_id}", response_model=UserDetailResponse)
 async def get_user_details(
     user_id: int,
-    current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Obtiene detalles completos de un usuario específico
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
 
     if not user:
         raise HTTPException(
@@ -175,18 +250,20 @@ async def get_user_details(
         )
 
     # Get recent activities (last 10)
-    recent_activities = db.query(Activity)\
-        .filter(Activity.creator_id == user_id)\
-        .order_by(Activity.created_at.desc())\
-        .limit(10)\
-        .all()
+    recent_activities = (await db.execute(
+        select(*ActivitySummary.columns())
+        .where(Activity.creator_id == user_id)
+        .order_by(Activity.created_at.desc())
+        .limit(10)
+    )).all()
 
     # Get recent credit transactions (last 20)
-    recent_transactions = db.query(CreditTransaction)\
-        .filter(CreditTransaction.user_id == user_id)\
-        .order_by(CreditTransaction.created_at.desc())\
-        .limit(20)\
-        .all()
+    recent_transactions = (await db.scalars(
+        select(CreditTransaction)
+        .where(CreditTransaction.user_id == user_id)
+        .order_by(CreditTransaction.created_at.desc())
+        .limit(20)
+    )).all()
 
     transaction_list = [
         {
@@ -202,7 +279,7 @@ async def get_user_details(
 
     return UserDetailResponse(
         user=UserResponse.from_orm(user),
-        recent_activities=[ActivityResponse.from_orm(activity) for activity in recent_activities],
+        recent_activities=[ActivitySummary.model_validate(activity) for activity in recent_activities],
         recent_transactions=transaction_list
     )
 
@@ -212,13 +289,13 @@ async def get_user_details(
 async def update_user(
     user_id: int,
     user_update: UserUpdate,
-    current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Actualiza información de un usuario
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
 
     if not user:
         raise HTTPException(
@@ -240,8 +317,9 @@ async def update_user(
             )
 
     # Check if email is already taken
-    if user_update.email is not None and user_update.email != user.email:
-        existing_user = db.query(User).filter(User.email == user_update.email).first()
+    email_changed = user_update.email is not None and user_update.email != user.email
+    if email_changed:
+        existing_user = await db.scalar(select(User).where(User.email == user_update.email))
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -249,6 +327,12 @@ async def update_user(
             )
         user.email = user_update.email
 
+    # Un cambio de rol o de estado revoca los access tokens emitidos antes
+    revoke_tokens = (
+        (user_update.role is not None and user_update.role != user.role)
+        or (user_update.is_active is not None and user_update.is_active != user.is_active)
+    )
+
     # Update fields
     if user_update.full_name is not None:
         user.full_name = user_update.full_name
@@ -256,6 +340,8 @@ async def update_user(
         user.role = user_update.role
     if user_update.is_active is not None:
         user.is_active = user_update.is_active
+    if revoke_tokens:
+        user.token_version += 1
     if user_update.credits is not None:
         # If credits changed, create an admin adjustment transaction
         if user_update.credits != user.credits:
@@ -271,8 +357,10 @@ async def update_user(
             )
             db.add(transaction)
 
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    if revoke_tokens or email_changed:
+        invalidate_principal(user.id)
+    await db.refresh(user)
 
     return UserResponse.from_orm(user)
 
@@ -281,13 +369,13 @@ async def update_user(
 @router.delete("/users/{user_id}")
 async def delete_user(
     user_id: int,
-    current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Elimina un usuario (soft delete - marca como inactivo)
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
 
     if not user:
         raise HTTPException(
@@ -302,8 +390,11 @@ async def delete_user(
             detail="No puedes eliminar tu propia cuenta"
         )
 
-    user.is_active = False
-    db.commit()
+    if user.is_active:
+        user.is_active = False
+        user.token_version += 1
+        await db.commit()
+        invalidate_principal(user.id)
 
     return {"message": "Usuario marcado como inactivo correctamente"}
 
@@ -313,13 +404,13 @@ async def delete_user(
 async def adjust_user_credits(
     user_id: int,
     credit_adjustment: CreditAdjustment,
-    current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Añade o remueve créditos de un usuario
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
 
     if not user:
         raise HTTPException(
@@ -348,8 +439,8 @@ async def adjust_user_credits(
     )
 
     db.add(transaction)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
     return {
         "message": "Créditos ajustados correctamente",
@@ -361,41 +452,44 @@ async def adjust_user_credits(
 # Endpoint 7: GET /api/admin/activities - List all activities with pagination
 @router.get("/activities", response_model=List[ActivityListItem])
 async def get_all_activities(
+    response: Response,
     skip: int = Query(default=0, ge=0),
     limit: int = Query(default=20, le=100),
+    cursor: Optional[str] = None,
     activity_type: Optional[ActivityType] = None,
     creator_id: Optional[int] = None,
-    current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Lista todas las actividades con paginación y filtros opcionales
     """
-    query = db.query(Activity)
+    # Solo las columnas del listado: el JSON de contenido no se carga
+    stmt = select(*[getattr(Activity, name) for name in ActivityListItem.model_fields])
 
     # Apply filters
     if activity_type:
-        query = query.filter(Activity.activity_type == activity_type)
+        stmt = stmt.where(Activity.activity_type == activity_type)
 
     if creator_id:
-        query = query.filter(Activity.creator_id == creator_id)
+        stmt = stmt.where(Activity.creator_id == creator_id)
 
-    activities = query.order_by(Activity.created_at.desc()).offset(skip).limit(limit).all()
+    activities = await paginate(db, stmt, Activity.created_at, Activity.id, response, limit, cursor=cursor, skip=skip)
 
-    return [ActivityListItem.from_orm(activity) for activity in activities]
+    return [ActivityListItem.model_validate(activity) for activity in activities]
 
 
 # Endpoint 8: DELETE /api/admin/activities/{activity_id} - Delete activity
 @router.delete("/activities/{activity_id}")
 async def delete_activity(
     activity_id: int,
-    current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Elimina una actividad (hard delete)
     """
-    activity = db.query(Activity).filter(Activity.id == activity_id).first()
+    activity = await db.scalar(select(Activity).where(Activity.id == activity_id))
 
     if not activity:
         raise HTTPException(
@@ -403,7 +497,143 @@ async def delete_activity(
             detail="Actividad no encontrada"
         )
 
-    db.delete(activity)
-    db.commit()
+    await db.delete(activity)
+    await db.commit()
 
     return {"message": "Actividad eliminada correctamente"}
+
+
+# Endpoint 9: GET /api/admin/metrics/pool - Connection pool metrics
+@router.get("/metrics/pool")
+async def get_pool_metrics(
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    """
+    Métricas del pool de conexiones del worker que atiende la solicitud:
+    configuración, conexiones en uso y utilización, tiempo de checkout, esperas,
+    uso del overflow y tiempo de vida de las conexiones
+    """
+    return pool_metrics.snapshot()
+
+
+# Endpoint 10: GET /api/admin/usage/daily - Daily usage time series
+@router.get("/usage/daily", response_model=List[UsagePoint])
+async def get_daily_usage(
+    days: int = Query(default=30, ge=1, le=366),
+    end: Optional[date] = None,
+    group_by: Optional[Literal["provider", "activity_type", "user"]] = None,
+    user_id: Optional[int] = None,
+    current_user: Principal = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Serie diaria de actividades generadas, créditos cobrados, tokens y usuarios
+    activos de los últimos `days` días hasta `end` (hoy por defecto, UTC).
+    Opcionalmente desglosada por proveedor, tipo de actividad o usuario, o
+    filtrada por un usuario
+    """
+    end = end or datetime.now(timezone.utc).date()
+    start = end - timedelta(days=days - 1)
+    return await usage_service.daily_series(db, start, end, group_by=group_by, user_id=user_id)
+
+
+# Endpoint 11: GET /api/admin/analytics/generations - Model call time series
+@router.get("/analytics/generations", response_model=List[GenerationPoint])
+async def get_generation_analytics(
+    resolution: Literal["minute", "hour", "day"] = "hour",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    group_by: Optional[Literal["provider", "model", "activity_type"]] = None,
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+    activity_type: Optional[ActivityType] = None,
+    current_user: Principal = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Serie por minuto, hora o día de las llamadas al modelo: cantidad, tasa de
+    errores, tokens de entrada y salida, créditos y latencia (promedio, p50 y p95
+    estimados del histograma), total o desglosada por proveedor, modelo o tipo de
+    actividad. Por defecto cubre los últimos 60 intervalos hasta ahora (UTC). Las
+    llamadas atendidas por otros workers aparecen tras su siguiente volcado
+    (ANALYTICS_FLUSH_SECONDS).
+    """
+    step = RESOLUTIONS[resolution]
+    end = end or datetime.now(timezone.utc)
+    start = start or end - step * 59
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if start > end:
+        raise HTTPException(status_code=400, detail="El inicio del rango debe ser anterior al final")
+    if (end - start) / step > MAX_POINTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El rango es demasiado amplio para la resolución '{resolution}' (máximo {MAX_POINTS} intervalos)"
+        )
+
+    # Contadores pendientes de este worker
+    await generation_analytics.flush()
+    return await generation_analytics.series(
+        db, resolution, start, end, group_by=group_by,
+        filters={
+            "provider": provider,
+            "model": model,
+            "activity_type": activity_type.value if activity_type else None,
+        }
+    )
+
+
+# Endpoint 12: POST /api/admin/users/import - Bulk user import from CSV
+@router.post("/users/import", response_model=UserImportResult)
+async def import_users(
+    file: UploadFile = File(...),
+    dry_run: bool = False,
+    current_user: Principal = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Crea usuarios en lote desde un CSV en UTF-8 con columnas email, username,
+    password y, opcionales, full_name y role (estudiante o docente). Las filas
+    inválidas o duplicadas se reportan sin detener la importación. Con
+    `dry_run` solo se valida el archivo.
+    """
+    lines = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        report = await user_import_service.import_csv(db, lines, dry_run=dry_run)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El archivo debe estar codificado en UTF-8")
+    except csv.Error as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"CSV inválido: {e}")
+    finally:
+        lines.detach()
+    print(f"Importación de usuarios por {current_user.email}: {report['created']} creados, {report['failed']} con errores")
+    return report
+
+
+# Endpoint 13: POST /api/admin/credits/bulk - Add/remove credits for a group of users
+@router.post("/credits/bulk", response_model=BulkCreditAdjustmentResult)
+async def bulk_adjust_credits(
+    adjustment: BulkCreditAdjustment,
+    idempotency_key: str = Header(..., alias="Idempotency-Key", min_length=8, max_length=100),
+    current_user: Principal = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Añade o remueve créditos a un grupo de usuarios en una sola transacción. Los
+    usuarios que quedarían con saldo negativo se omiten. Reintentar con la misma
+    cabecera Idempotency-Key devuelve el resultado del ajuste ya aplicado.
+    """
+    return await credit_service.bulk_adjust(
+        db, current_user, idempotency_key,
+        amount=adjustment.amount,
+        description=adjustment.description,
+        user_ids=adjustment.user_ids,
+        filters={
+            "role": adjustment.role,
+            "is_active": adjustment.is_active if adjustment.user_ids is None else None,
+            "created_from": adjustment.created_from,
+            "created_to": adjustment.created_to,
+        }
+    )
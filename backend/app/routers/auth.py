@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response, Cookie
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Cookie, Query
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from typing import Optional
 from ..database import get_db
 from ..models.user import User
-from ..models.credit import TransactionType
+from ..models.credit import CreditTransaction, TransactionType
 from ..schemas.user import (
     UserCreate,
     UserLogin,
@@ -16,13 +17,20 @@ from ..schemas.user import (
     ResetPasswordRequest
 )
 from ..utils.auth import (
-    verify_password,
-    get_password_hash,
+    verify_password_async,
+    get_password_hash_async,
+    password_needs_rehash,
+    access_token_claims,
+    refresh_token_claims,
+    invalidate_principal,
     create_access_token,
     create_refresh_token,
     verify_refresh_token,
-    get_current_active_user
+    get_current_active_user,
+    get_current_active_principal,
+    Principal
 )
+from ..utils.pagination import paginate
 from ..services.credit_service import credit_service
 from ..services.email_service import email_service
 from ..config import settings
@@ -31,19 +39,19 @@ router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
 
 @router.post("/register", response_model=Token)
-async def register(user_data: UserCreate, response: Response, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, response: Response, db: AsyncSession = Depends(get_db)):
     """
     Registra un nuevo usuario
     """
     # Verificar si el email ya existe
-    if db.query(User).filter(User.email == user_data.email).first():
+    if await db.scalar(select(User).where(User.email == user_data.email)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El email ya está registrado"
         )
 
     # Verificar si el username ya existe
-    if db.query(User).filter(User.username == user_data.username).first():
+    if await db.scalar(select(User).where(User.username == user_data.username)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El nombre de usuario ya está en uso"
@@ -54,17 +62,17 @@ async def register(user_data: UserCreate, response: Response, db: Session = Depe
         email=user_data.email,
         username=user_data.username,
         full_name=user_data.full_name,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await get_password_hash_async(user_data.password),
         role=user_data.role,
         credits=settings.INITIAL_CREDITS
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     # Registrar créditos iniciales
-    credit_service.add_credits(
+    await credit_service.add_credits(
         db=db,
         user=new_user,
         amount=settings.INITIAL_CREDITS,
@@ -73,8 +81,8 @@ async def register(user_data: UserCreate, response: Response, db: Session = Depe
     )
 
     # Crear tokens
-    access_token = create_access_token(data={"sub": new_user.email})
-    refresh_token = create_refresh_token(data={"sub": new_user.email})
+    access_token = create_access_token(data=access_token_claims(new_user))
+    refresh_token = create_refresh_token(data=refresh_token_claims(new_user))
 
     # Establecer refresh token en cookie httpOnly
     response.set_cookie(
@@ -97,14 +105,14 @@ async def register(user_data: UserCreate, response: Response, db: Session = Depe
 async def login(
     response: Response,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Inicia sesión con email y contraseña
     """
-    user = db.query(User).filter(User.email == form_data.username).first()
+    user = await db.scalar(select(User).where(User.email == form_data.username))
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email o contraseña incorrectos",
@@ -117,9 +125,14 @@ async def login(
             detail="Usuario inactivo"
         )
 
+    # Recalcular el hash si se generó con otro costo (BCRYPT_ROUNDS cambió)
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = await get_password_hash_async(form_data.password)
+        await db.commit()
+
     # Crear tokens
-    access_token = create_access_token(data={"sub": user.email})
-    refresh_token = create_refresh_token(data={"sub": user.email})
+    access_token = create_access_token(data=access_token_claims(user))
+    refresh_token = create_refresh_token(data=refresh_token_claims(user))
 
     # Establecer refresh token en cookie httpOnly
     response.set_cookie(
@@ -147,14 +160,20 @@ async def get_current_user_info(current_user: User = Depends(get_current_active_
 
 
 @router.get("/credits")
-async def get_credits(current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
+async def get_credits(current_user: User = Depends(get_current_active_user), db: AsyncSession = Depends(get_db)):
     """
-    Obtiene el balance de créditos y transacciones recientes
+    Obtiene el balance de créditos disponible, los créditos retenidos por
+    generaciones en curso y las transacciones recientes
     """
-    transactions = credit_service.get_user_transactions(db, current_user.id, limit=10)
+    # Devolver primero lo retenido por reservas vencidas
+    if await credit_service.expire_reservations(db, user_id=current_user.id):
+        await db.commit()
+        await db.refresh(current_user)
+    transactions = await credit_service.get_user_transactions(db, current_user.id, limit=10)
 
     return {
         "current_balance": current_user.credits,
+        "held_credits": current_user.held_credits,
         "recent_transactions": [
             {
                 "id": t.id,
@@ -169,11 +188,42 @@ async def get_credits(current_user: User = Depends(get_current_active_user), db:
     }
 
 
+@router.get("/credits/transactions")
+async def get_credit_transactions(
+    response: Response,
+    skip: int = Query(default=0, ge=0),
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_active_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Historial completo de transacciones de créditos del usuario.
+    Admite paginación por cursor (`cursor`, cabecera X-Next-Cursor) o por `skip`.
+    """
+    stmt = select(CreditTransaction).where(CreditTransaction.user_id == current_user.id)
+    transactions = await paginate(
+        db, stmt, CreditTransaction.created_at, CreditTransaction.id, response, limit, cursor=cursor, skip=skip
+    )
+
+    return [
+        {
+            "id": t.id,
+            "amount": t.amount,
+            "type": t.transaction_type,
+            "description": t.description,
+            "balance_after": t.balance_after,
+            "created_at": t.created_at
+        }
+        for t in transactions
+    ]
+
+
 @router.post("/refresh", response_model=Token)
 async def refresh_token(
     response: Response,
     refresh_token: Optional[str] = Cookie(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Refresca el access token usando el refresh token de la cookie
@@ -185,24 +235,31 @@ async def refresh_token(
         )
 
     # Verificar el refresh token
-    email = verify_refresh_token(refresh_token)
-    if not email:
+    claims = verify_refresh_token(refresh_token)
+    if not claims:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Refresh token inválido o expirado"
         )
 
     # Buscar usuario
-    user = db.query(User).filter(User.email == email).first()
+    user = await db.get(User, claims["uid"])
     if not user or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuario no encontrado o inactivo"
         )
 
+    # Revocado por un cambio de contraseña, de rol o una desactivación
+    if claims["ver"] != user.token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token inválido o expirado"
+        )
+
     # Crear nuevo access token y refresh token
-    new_access_token = create_access_token(data={"sub": user.email})
-    new_refresh_token = create_refresh_token(data={"sub": user.email})
+    new_access_token = create_access_token(data=access_token_claims(user))
+    new_refresh_token = create_refresh_token(data=refresh_token_claims(user))
 
     # Actualizar la cookie con el nuevo refresh token
     response.set_cookie(
@@ -232,22 +289,23 @@ async def logout(response: Response):
 
 @router.post("/change-password")
 async def change_password(
+    response: Response,
     password_data: ChangePasswordRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Cambia la contraseña del usuario actual
     """
     # Verificar que la contraseña actual sea correcta
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    if not await verify_password_async(password_data.current_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="La contraseña actual es incorrecta"
         )
 
     # Validar que la nueva contraseña sea diferente
-    if verify_password(password_data.new_password, current_user.hashed_password):
+    if await verify_password_async(password_data.new_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="La nueva contraseña debe ser diferente a la actual"
@@ -260,23 +318,38 @@ async def change_password(
             detail="La contraseña debe tener al menos 6 caracteres"
         )
 
-    # Actualizar contraseña
-    current_user.hashed_password = get_password_hash(password_data.new_password)
-    db.commit()
+    # Actualizar contraseña y revocar los access tokens emitidos antes (otras sesiones)
+    current_user.hashed_password = await get_password_hash_async(password_data.new_password)
+    current_user.token_version += 1
+    await db.commit()
+    invalidate_principal(current_user.id)
 
-    return {"message": "Contraseña actualizada exitosamente"}
+    # Nuevos tokens para que esta sesión continúe
+    response.set_cookie(
+        key="refresh_token",
+        value=create_refresh_token(data=refresh_token_claims(current_user)),
+        httponly=True,
+        secure=False,  # Cambiar a True en producción con HTTPS
+        samesite="lax",
+        max_age=settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
+    )
+    return {
+        "message": "Contraseña actualizada exitosamente",
+        "access_token": create_access_token(data=access_token_claims(current_user)),
+        "token_type": "bearer"
+    }
 
 
 @router.post("/forgot-password")
 async def forgot_password(
     request_data: ForgotPasswordRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Solicita recuperación de contraseña enviando un email con un token
     """
     # Buscar usuario por email
-    user = db.query(User).filter(User.email == request_data.email).first()
+    user = await db.scalar(select(User).where(User.email == request_data.email))
 
     # Por seguridad, siempre devolver el mismo mensaje aunque el email no exista
     # Esto previene que se pueda verificar qué emails están registrados
@@ -305,7 +378,7 @@ async def forgot_password(
 @router.post("/reset-password")
 async def reset_password(
     reset_data: ResetPasswordRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Resetea la contraseña usando el token de recuperación
@@ -336,7 +409,7 @@ async def reset_password(
         )
 
     # Buscar usuario
-    user = db.query(User).filter(User.email == email).first()
+    user = await db.scalar(select(User).where(User.email == email))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -350,8 +423,10 @@ async def reset_password(
             detail="La contraseña debe tener al menos 6 caracteres"
         )
 
-    # Actualizar contraseña
-    user.hashed_password = get_password_hash(reset_data.new_password)
-    db.commit()
+    # Actualizar contraseña y revocar los access tokens emitidos antes
+    user.hashed_password = await get_password_hash_async(reset_data.new_password)
+    user.token_version += 1
+    await db.commit()
+    invalidate_principal(user.id)
 
     return {"message": "Contraseña restablecida exitosamente"}
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List, Optional
-from ..database import get_db
-from ..models import User, Chatbot, ChatConversation, ChatMessage, ChatbotType
+from ..database import get_db, get_read_db, release_connection
+from ..models import Chatbot, ChatConversation, ChatMessage, ChatbotType, ActivityType
 from ..schemas.chatbot import (
     ChatbotCreate,
     ChatbotUpdate,
@@ -12,8 +14,11 @@ from ..schemas.chatbot import (
     ChatResponse,
     ChatMessageResponse
 )
-from ..utils.auth import get_current_user
+from ..utils.auth import Principal, get_current_principal
+from ..utils.pagination import paginate
 from ..services.ai_service import AIService
+from ..services.analytics_service import begin_generation
+from ..services.telemetry_service import generation_telemetry
 from datetime import datetime
 
 router = APIRouter(prefix="/api/chatbots", tags=["chatbots"])
@@ -69,8 +74,8 @@ CHATBOT_TEMPLATES = {
 @router.post("/", response_model=ChatbotResponse)
 async def create_chatbot(
     chatbot: ChatbotCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Crear un nuevo chatbot"""
     # Si es un tipo template, usar configuración predefinida
@@ -89,20 +94,22 @@ async def create_chatbot(
         creator_id=current_user.id
     )
     db.add(db_chatbot)
-    db.commit()
-    db.refresh(db_chatbot)
+    await db.commit()
+    await db.refresh(db_chatbot)
     return db_chatbot
 
 
 @router.get("/", response_model=List[ChatbotResponse])
 async def get_my_chatbots(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Obtener todos los chatbots del usuario actual"""
-    chatbots = db.query(Chatbot).filter(
-        Chatbot.creator_id == current_user.id
-    ).order_by(Chatbot.created_at.desc()).all()
+    chatbots = (await db.scalars(
+        select(Chatbot)
+        .where(Chatbot.creator_id == current_user.id)
+        .order_by(Chatbot.created_at.desc())
+    )).all()
     return chatbots
 
 
@@ -115,11 +122,11 @@ async def get_chatbot_templates():
 @router.get("/{chatbot_id}", response_model=ChatbotResponse)
 async def get_chatbot(
     chatbot_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Obtener un chatbot específico"""
-    chatbot = db.query(Chatbot).filter(Chatbot.id == chatbot_id).first()
+    chatbot = await db.scalar(select(Chatbot).where(Chatbot.id == chatbot_id))
     if not chatbot:
         raise HTTPException(status_code=404, detail="Chatbot no encontrado")
 
@@ -134,11 +141,11 @@ async def get_chatbot(
 async def update_chatbot(
     chatbot_id: int,
     chatbot_update: ChatbotUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Actualizar un chatbot"""
-    chatbot = db.query(Chatbot).filter(Chatbot.id == chatbot_id).first()
+    chatbot = await db.scalar(select(Chatbot).where(Chatbot.id == chatbot_id))
     if not chatbot:
         raise HTTPException(status_code=404, detail="Chatbot no encontrado")
 
@@ -149,27 +156,27 @@ async def update_chatbot(
     for field, value in update_data.items():
         setattr(chatbot, field, value)
 
-    db.commit()
-    db.refresh(chatbot)
+    await db.commit()
+    await db.refresh(chatbot)
     return chatbot
 
 
 @router.delete("/{chatbot_id}")
 async def delete_chatbot(
     chatbot_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Eliminar un chatbot"""
-    chatbot = db.query(Chatbot).filter(Chatbot.id == chatbot_id).first()
+    chatbot = await db.scalar(select(Chatbot).where(Chatbot.id == chatbot_id))
     if not chatbot:
         raise HTTPException(status_code=404, detail="Chatbot no encontrado")
 
     if chatbot.creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="No tienes permisos para eliminar este chatbot")
 
-    db.delete(chatbot)
-    db.commit()
+    await db.delete(chatbot)
+    await db.commit()
     return {"message": "Chatbot eliminado correctamente"}
 
 
@@ -177,12 +184,12 @@ async def delete_chatbot(
 async def chat_with_bot(
     chatbot_id: int,
     chat_request: ChatRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Enviar un mensaje al chatbot"""
     # Obtener chatbot
-    chatbot = db.query(Chatbot).filter(Chatbot.id == chatbot_id).first()
+    chatbot = await db.scalar(select(Chatbot).where(Chatbot.id == chatbot_id))
     if not chatbot:
         raise HTTPException(status_code=404, detail="Chatbot no encontrado")
 
@@ -195,10 +202,10 @@ async def chat_with_bot(
 
     # Obtener o crear conversación
     if chat_request.conversation_id:
-        conversation = db.query(ChatConversation).filter(
+        conversation = await db.scalar(select(ChatConversation).where(
             ChatConversation.id == chat_request.conversation_id,
             ChatConversation.user_id == current_user.id
-        ).first()
+        ))
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversación no encontrada")
     else:
@@ -208,8 +215,8 @@ async def chat_with_bot(
             title=f"Chat con {chatbot.name}"
         )
         db.add(conversation)
-        db.commit()
-        db.refresh(conversation)
+        await db.commit()
+        await db.refresh(conversation)
 
     # Guardar mensaje del usuario
     user_message = ChatMessage(
@@ -218,12 +225,14 @@ async def chat_with_bot(
         role="user"
     )
     db.add(user_message)
-    db.commit()
+    await db.commit()
 
     # Obtener historial de mensajes para contexto
-    messages = db.query(ChatMessage).filter(
-        ChatMessage.conversation_id == conversation.id
-    ).order_by(ChatMessage.created_at).all()
+    messages = (await db.scalars(
+        select(ChatMessage)
+        .where(ChatMessage.conversation_id == conversation.id)
+        .order_by(ChatMessage.created_at)
+    )).all()
 
     # Preparar contexto para la IA
     context_messages = []
@@ -233,6 +242,10 @@ async def chat_with_bot(
             "content": msg.content
         })
 
+    # Devolver la conexión al pool mientras se espera la respuesta del modelo
+    await release_connection(db)
+    begin_generation(ActivityType.CHATBOT, current_user.id)
+
     # Generar respuesta con IA
     try:
         ai_service = AIService(
@@ -265,7 +278,8 @@ async def chat_with_bot(
         # Actualizar timestamp de conversación
         conversation.updated_at = datetime.now()
 
-        db.commit()
+        await db.commit()
+        generation_telemetry.link(chat_message_id=bot_message.id)
 
         return ChatResponse(
             message=response,
@@ -280,28 +294,43 @@ async def chat_with_bot(
 @router.get("/{chatbot_id}/conversations", response_model=List[ChatConversationResponse])
 async def get_chatbot_conversations(
     chatbot_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    response: Response,
+    limit: Optional[int] = Query(default=None, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
-    """Obtener todas las conversaciones del chatbot"""
-    conversations = db.query(ChatConversation).filter(
+    """
+    Obtener las conversaciones del chatbot, de la más reciente a la más antigua.
+    Con `limit` (y `cursor`) pagina por clave; sin él retorna todas.
+    """
+    # Los mensajes se cargan por adelantado: en la sesión asíncrona no hay carga perezosa
+    stmt = select(ChatConversation).where(
         ChatConversation.chatbot_id == chatbot_id,
         ChatConversation.user_id == current_user.id
-    ).order_by(ChatConversation.updated_at.desc()).all()
-    return conversations
+    ).options(selectinload(ChatConversation.messages))
+    if limit is None and cursor is None:
+        return (await db.scalars(
+            stmt.order_by(ChatConversation.updated_at.desc(), ChatConversation.id.desc())
+        )).all()
+
+    return await paginate(
+        db, stmt, ChatConversation.updated_at, ChatConversation.id, response, limit or 20, cursor=cursor
+    )
 
 
 @router.get("/conversations/{conversation_id}", response_model=ChatConversationResponse)
 async def get_conversation(
     conversation_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Obtener una conversación específica con todos sus mensajes"""
-    conversation = db.query(ChatConversation).filter(
-        ChatConversation.id == conversation_id,
-        ChatConversation.user_id == current_user.id
-    ).first()
+    conversation = await db.scalar(
+        select(ChatConversation)
+        .where(ChatConversation.id == conversation_id, ChatConversation.user_id == current_user.id)
+        .options(selectinload(ChatConversation.messages))
+    )
 
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversación no encontrada")
@@ -312,18 +341,18 @@ async def get_conversation(
 @router.delete("/conversations/{conversation_id}")
 async def delete_conversation(
     conversation_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Eliminar una conversación"""
-    conversation = db.query(ChatConversation).filter(
+    conversation = await db.scalar(select(ChatConversation).where(
         ChatConversation.id == conversation_id,
         ChatConversation.user_id == current_user.id
-    ).first()
+    ))
 
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversación no encontrada")
 
-    db.delete(conversation)
-    db.commit()
+    await db.delete(conversation)
+    await db.commit()
     return {"message": "Conversación eliminada correctamente"}
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 import json
-from ..database import get_db
+from ..database import get_db, release_connection
 from ..models.user import User
 from ..models.activity import Activity, ActivityType
+from ..models.credit import CreditReservation
 from ..schemas.activity import (
     ActivityResponse,
     ExamRequest,
@@ -20,20 +23,53 @@ from ..schemas.activity import (
 )
 from ..services.content_generator import content_generator
 from ..services.credit_service import credit_service
+from ..services.analytics_service import begin_generation
+from ..services.telemetry_service import generation_telemetry
+from ..services.question_bank_service import question_bank_service
+from ..services.usage_service import usage_service
 from ..utils.auth import get_current_active_user
 
 router = APIRouter(prefix="/api/content", tags=["Content Generation"])
 
 
+async def start_generation(
+    db: AsyncSession,
+    user: User,
+    request: BaseModel,
+    activity_type: ActivityType,
+    calls: int = 1
+) -> Optional[CreditReservation]:
+    """
+    Fase previa a la llamada al modelo: retiene el costo máximo estimado de la
+    generación (proveedores de pago) y devuelve la conexión al pool. La llamada
+    puede tardar minutos y no debe retener una conexión que necesitan las demás
+    solicitudes. La reserva se liquida al guardar la actividad y se libera en el
+    `finally` del endpoint si la generación falla o se cancela. Las llamadas al
+    modelo de la solicitud se registran en la analítica con `activity_type`.
+    """
+    begin_generation(activity_type, user.id)
+    amount = credit_service.estimate_credits(request.ai_provider, request.model_dump_json(), calls)
+    reservation = await credit_service.reserve_credits(
+        db, user, amount, description=f"Reserva para {type(request).__name__}"
+    )
+    await release_connection(db)
+    return reservation
+
+
 async def save_activity_with_credits(
-    db: Session,
+    db: AsyncSession,
     user: User,
     activity_type: ActivityType,
     request_data: dict,
-    generated_content: dict
+    generated_content: dict,
+    reservation: Optional[CreditReservation] = None
 ):
     """
-    Función auxiliar para guardar actividad y gestionar créditos
+    Función auxiliar para guardar actividad y gestionar créditos (fase posterior a
+    la llamada al modelo). La actividad, sus preguntas en el banco, el descuento
+    condicional del saldo y el movimiento de créditos se guardan en una sola
+    transacción, junto con los agregados diarios de consumo: si el saldo no
+    alcanza no se guarda nada.
     """
     # Crear actividad
     activity = Activity(
@@ -52,20 +88,51 @@ async def save_activity_with_credits(
         creator_id=user.id
     )
 
-    db.add(activity)
-    db.commit()
-    db.refresh(activity)
-
-    # Deducir créditos si aplica
-    if generated_content.get("credits_used", 0) > 0:
-        credit_service.deduct_credits(
-            db=db,
-            user=user,
-            amount=generated_content["credits_used"],
-            activity_id=activity.id,
-            description=f"Generación de {activity_type.value}"
+    try:
+        db.add(activity)
+        await db.flush()
+
+        # Indexar las preguntas de los exámenes en el banco de preguntas
+        if activity_type == ActivityType.EXAM:
+            await question_bank_service.index_activity(db, activity)
+
+        # Liquidar la reserva con el consumo real, o deducir créditos si aplica
+        transaction = None
+        if reservation is not None:
+            transaction = await credit_service.settle_reservation(
+                db=db,
+                reservation=reservation,
+                user=user,
+                credits_used=generated_content.get("credits_used", 0),
+                activity_id=activity.id,
+                description=f"Generación de {activity_type.value}"
+            )
+        elif generated_content.get("credits_used", 0) > 0:
+            transaction = await credit_service.deduct_credits(
+                db=db,
+                user=user,
+                amount=generated_content["credits_used"],
+                activity_id=activity.id,
+                description=f"Generación de {activity_type.value}"
+            )
+
+        await usage_service.record(
+            db,
+            user_id=user.id,
+            activity_type=activity_type,
+            provider=activity.ai_provider,
+            credits_used=-transaction.amount if transaction is not None else 0,
+            tokens_used=generated_content.get("tokens_used", 0)
         )
 
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    credit_service.mark_settled(reservation)
+    generation_telemetry.link(activity_id=activity.id)
+
+    await db.refresh(activity)
     return activity
 
 
@@ -73,11 +140,13 @@ async def save_activity_with_credits(
 async def generate_exam(
     request: ExamRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Genera un examen con IA
     """
+    reservation = await start_generation(db, current_user, request, ActivityType.EXAM)
+
     try:
         result = await content_generator.generate_exam(
             topic=request.topic,
@@ -98,24 +167,31 @@ async def generate_exam(
                 "grade_level": request.grade_level,
                 "ai_provider": request.ai_provider
             },
-            generated_content=result
+            generated_content=result,
+            reservation=reservation
         )
 
         return ActivityResponse.from_orm(activity)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await credit_service.release_reservation(db, reservation)
 
 
 @router.post("/summary", response_model=ActivityResponse)
 async def generate_summary(
     request: SummaryRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Genera un resumen de un texto
     """
+    reservation = await start_generation(db, current_user, request, ActivityType.SUMMARY, calls=content_generator.summary_calls(request.text))
+
     try:
         result = await content_generator.generate_summary(
             text=request.text,
@@ -132,24 +208,31 @@ async def generate_summary(
                 "title": "Resumen generado",
                 "ai_provider": request.ai_provider
             },
-            generated_content=result
+            generated_content=result,
+            reservation=reservation
         )
 
         return ActivityResponse.from_orm(activity)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await credit_service.release_reservation(db, reservation)
 
 
 @router.post("/class-activity", response_model=ActivityResponse)
 async def generate_class_activity(
     request: ClassActivityRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Genera una actividad de clase
     """
+    reservation = await start_generation(db, current_user, request, ActivityType.CLASS_ACTIVITY)
+
     try:
         result = await content_generator.generate_class_activity(
             topic=request.topic,
@@ -170,24 +253,31 @@ async def generate_class_activity(
                 "grade_level": request.grade_level,
                 "ai_provider": request.ai_provider
             },
-            generated_content=result
+            generated_content=result,
+            reservation=reservation
         )
 
         return ActivityResponse.from_orm(activity)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await credit_service.release_reservation(db, reservation)
 
 
 @router.post("/rubric", response_model=ActivityResponse)
 async def generate_rubric(
     request: RubricRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Genera una rúbrica de evaluación
     """
+    reservation = await start_generation(db, current_user, request, ActivityType.RUBRIC)
+
     try:
         result = await content_generator.generate_rubric(
             topic=request.topic,
@@ -209,24 +299,31 @@ async def generate_rubric(
                 "grade_level": request.semester,
                 "ai_provider": request.ai_provider
             },
-            generated_content=result
+            generated_content=result,
+            reservation=reservation
         )
 
         return ActivityResponse.from_orm(activity)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await credit_service.release_reservation(db, reservation)
 
 
 @router.post("/writing-correction", response_model=ActivityResponse)
 async def correct_writing(
     request: WritingCorrectionRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Corrige un texto
     """
+    reservation = await start_generation(db, current_user, request, ActivityType.WRITING_CORRECTION, calls=content_generator.correction_calls(request.text))
+
     try:
         result = await content_generator.correct_writing(
             text=request.text,
@@ -242,24 +339,31 @@ async def correct_writing(
                 "title": "Corrección de escritura",
                 "ai_provider": request.ai_provider
             },
-            generated_content=result
+            generated_content=result,
+            reservation=reservation
         )
 
         return ActivityResponse.from_orm(activity)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await credit_service.release_reservation(db, reservation)
 
 
 @router.post("/slides", response_model=ActivityResponse)
 async def generate_slides(
     request: SlidesRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Genera contenido para diapositivas
     """
+    reservation = await start_generation(db, current_user, request, ActivityType.SLIDES)
+
     try:
         result = await content_generator.generate_slides(
             topic=request.topic,
@@ -279,24 +383,31 @@ async def generate_slides(
                 "grade_level": request.grade_level,
                 "ai_provider": request.ai_provider
             },
-            generated_content=result
+            generated_content=result,
+            reservation=reservation
         )
 
         return ActivityResponse.from_orm(activity)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await credit_service.release_reservation(db, reservation)
 
 
 @router.post("/email", response_model=ActivityResponse)
 async def generate_email(
     request: EmailRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Genera texto para un correo electrónico
     """
+    reservation = await start_generation(db, current_user, request, ActivityType.EMAIL)
+
     try:
         result = await content_generator.generate_email(
             purpose=request.purpose,
@@ -314,24 +425,31 @@ async def generate_email(
                 "title": f"Email: {request.purpose}",
                 "ai_provider": request.ai_provider
             },
-            generated_content=result
+            generated_content=result,
+            reservation=reservation
         )
 
         return ActivityResponse.from_orm(activity)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await credit_service.release_reservation(db, reservation)
 
 
 @router.post("/survey", response_model=ActivityResponse)
 async def generate_survey(
     request: SurveyRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Genera una encuesta
     """
+    reservation = await start_generation(db, current_user, request, ActivityType.SURVEY)
+
     try:
         result = await content_generator.generate_survey(
             topic=request.topic,
@@ -350,24 +468,31 @@ async def generate_survey(
                 "subject": request.topic,
                 "ai_provider": request.ai_provider
             },
-            generated_content=result
+            generated_content=result,
+            reservation=reservation
         )
 
         return ActivityResponse.from_orm(activity)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await credit_service.release_reservation(db, reservation)
 
 
 @router.post("/story", response_model=ActivityResponse)
 async def generate_story(
     request: StoryRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Genera un cuento, fábula o aventura
     """
+    reservation = await start_generation(db, current_user, request, ActivityType.STORY)
+
     try:
         result = await content_generator.generate_story(
             theme=request.theme,
@@ -387,31 +512,40 @@ async def generate_story(
                 "subject": request.theme,
                 "ai_provider": request.ai_provider
             },
-            generated_content=result
+            generated_content=result,
+            reservation=reservation
         )
 
         return ActivityResponse.from_orm(activity)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await credit_service.release_reservation(db, reservation)
 
 
 @router.post("/crossword", response_model=ActivityResponse)
 async def generate_crossword(
     request: CrosswordRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Genera un crucigrama
     """
+    reservation = await start_generation(db, current_user, request, ActivityType.CROSSWORD)
+
     try:
         result = await content_generator.generate_crossword(
             topic=request.topic,
             num_words=request.num_words,
             difficulty=request.difficulty,
             provider=request.ai_provider,
-            model_name=request.model_name
+            model_name=request.model_name,
+            max_grid_size=request.max_grid_size,
+            seed=request.seed
         )
 
         activity = await save_activity_with_credits(
@@ -423,31 +557,41 @@ async def generate_crossword(
                 "subject": request.topic,
                 "ai_provider": request.ai_provider
             },
-            generated_content=result
+            generated_content=result,
+            reservation=reservation
         )
 
         return ActivityResponse.from_orm(activity)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await credit_service.release_reservation(db, reservation)
 
 
 @router.post("/word-search", response_model=ActivityResponse)
 async def generate_word_search(
     request: WordSearchRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Genera una sopa de letras
     """
+    reservation = await start_generation(db, current_user, request, ActivityType.WORD_SEARCH)
+
     try:
         result = await content_generator.generate_word_search(
             topic=request.topic,
             num_words=request.num_words,
             grid_size=request.grid_size,
             provider=request.ai_provider,
-            model_name=request.model_name
+            model_name=request.model_name,
+            directions=request.directions,
+            prefer_overlap=request.prefer_overlap,
+            seed=request.seed
         )
 
         activity = await save_activity_with_credits(
@@ -459,10 +603,15 @@ async def generate_word_search(
                 "subject": request.topic,
                 "ai_provider": request.ai_provider
             },
-            generated_content=result
+            generated_content=result,
+            reservation=reservation
         )
 
         return ActivityResponse.from_orm(activity)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await credit_service.release_reservation(db, reservation)
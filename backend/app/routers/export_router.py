@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..database import get_db
-from ..models.user import User, UserRole
+from ..models.user import UserRole
 from ..models.activity import Activity
 from ..services.export_service import export_service
-from ..utils.auth import get_current_active_user
+from ..utils.auth import Principal, get_current_active_principal
 
 router = APIRouter(prefix="/api/export", tags=["Export"])
 
@@ -13,13 +14,13 @@ router = APIRouter(prefix="/api/export", tags=["Export"])
 @router.get("/{activity_id}/word")
 async def export_activity_to_word(
     activity_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Exporta una actividad a formato Word
     """
-    activity = db.query(Activity).filter(Activity.id == activity_id).first()
+    activity = await db.scalar(select(Activity).where(Activity.id == activity_id))
 
     if not activity:
         raise HTTPException(status_code=404, detail="Actividad no encontrada")
@@ -55,13 +56,13 @@ async def export_activity_to_word(
 @router.get("/{activity_id}/pptx")
 async def export_activity_to_pptx(
     activity_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Exporta una actividad tipo 'slides' a PowerPoint (.pptx)
     """
-    activity = db.query(Activity).filter(Activity.id == activity_id).first()
+    activity = await db.scalar(select(Activity).where(Activity.id == activity_id))
 
     if not activity:
         raise HTTPException(status_code=404, detail="Actividad no encontrada")
@@ -98,13 +99,13 @@ async def export_activity_to_pptx(
 @router.get("/{activity_id}/excel")
 async def export_activity_to_excel(
     activity_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_active_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Exporta una actividad a formato Excel
     """
-    activity = db.query(Activity).filter(Activity.id == activity_id).first()
+    activity = await db.scalar(select(Activity).where(Activity.id == activity_id))
 
     if not activity:
         raise HTTPException(status_code=404, detail="Actividad no encontrada")
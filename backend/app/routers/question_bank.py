@@ -0,0 +1,187 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import random
+from ..database import get_db
+from ..models.user import User
+from ..models.activity import Activity, ActivityType
+from ..models.question_bank import QuestionBankItem
+from ..schemas.activity import ActivityResponse
+from ..schemas.question_bank import QuestionBankItemResponse, ExamAssemblyRequest, DuplicateQuestionResponse
+from ..services.content_generator import content_generator
+from ..services.credit_service import credit_service
+from ..services.question_bank_service import question_bank_service
+from ..services.usage_service import usage_service
+from ..utils.auth import Principal, get_current_active_principal, get_current_active_user
+from .content import save_activity_with_credits, start_generation
+
+router = APIRouter(prefix="/api/question-bank", tags=["Question Bank"])
+
+
+@router.get("/", response_model=List[QuestionBankItemResponse])
+async def get_questions(
+    topic: Optional[str] = None,
+    question_type: Optional[str] = None,
+    grade_level: Optional[str] = None,
+    skip: int = Query(default=0, ge=0),
+    limit: int = Query(default=50, le=200),
+    current_user: Principal = Depends(get_current_active_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Lista las preguntas del banco visibles para el usuario
+    """
+    stmt = question_bank_service.visible_questions(
+        current_user,
+        topic=topic,
+        question_types=[question_type] if question_type else None,
+        grade_level=grade_level
+    )
+    questions = (await db.scalars(
+        stmt.order_by(QuestionBankItem.created_at.desc()).offset(skip).limit(limit)
+    )).all()
+
+    return [QuestionBankItemResponse.from_orm(q) for q in questions]
+
+
+@router.get("/duplicates", response_model=List[DuplicateQuestionResponse])
+async def find_duplicate_questions(
+    text: str,
+    threshold: Optional[float] = Query(default=None, ge=0, le=1),
+    current_user: Principal = Depends(get_current_active_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Busca preguntas del banco casi iguales a un texto (MinHash/LSH)
+    """
+    matches = await question_bank_service.find_near_duplicates(db, current_user, text, threshold)
+
+    return [
+        DuplicateQuestionResponse(question=QuestionBankItemResponse.from_orm(q), similarity=similarity)
+        for q, similarity in matches
+    ]
+
+
+@router.get("/{question_id}/duplicates", response_model=List[DuplicateQuestionResponse])
+async def find_question_duplicates(
+    question_id: int,
+    threshold: Optional[float] = Query(default=None, ge=0, le=1),
+    current_user: Principal = Depends(get_current_active_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Busca preguntas del banco casi iguales a una pregunta existente
+    """
+    question = await db.scalar(
+        question_bank_service.visible_questions(current_user).where(QuestionBankItem.id == question_id)
+    )
+
+    if not question:
+        raise HTTPException(status_code=404, detail="Pregunta no encontrada")
+
+    matches = await question_bank_service.find_near_duplicates(
+        db, current_user, question.question, threshold, exclude_id=question.id
+    )
+
+    return [
+        DuplicateQuestionResponse(question=QuestionBankItemResponse.from_orm(q), similarity=similarity)
+        for q, similarity in matches
+    ]
+
+
+@router.post("/assemble", response_model=List[ActivityResponse])
+async def assemble_exam(
+    request: ExamAssemblyRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Arma un examen (o varias variantes barajadas) con preguntas del banco.
+    Solo se llama al modelo de IA si el banco no tiene suficientes preguntas.
+    """
+    async def available_questions():
+        questions = (await db.scalars(question_bank_service.visible_questions(
+            current_user,
+            topic=request.topic,
+            question_types=request.question_types,
+            grade_level=request.grade_level
+        ))).all()
+        if request.dedupe:
+            questions = question_bank_service.dedupe_questions(questions)
+        return questions
+
+    questions = await available_questions()
+
+    # Completar el banco con un examen nuevo si faltan preguntas
+    missing = request.num_questions - len(questions)
+    if missing > 0:
+        reservation = await start_generation(db, current_user, request, ActivityType.EXAM)
+
+        try:
+            result = await content_generator.generate_exam(
+                topic=request.topic,
+                num_questions=missing,
+                question_types=request.question_types,
+                grade_level=request.grade_level or "General",
+                provider=request.ai_provider,
+                model_name=request.model_name
+            )
+
+            await save_activity_with_credits(
+                db=db,
+                user=current_user,
+                activity_type=ActivityType.EXAM,
+                request_data={
+                    "title": f"Examen: {request.topic}",
+                    "subject": request.topic,
+                    "grade_level": request.grade_level,
+                    "ai_provider": request.ai_provider
+                },
+                generated_content=result,
+                reservation=reservation
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            await credit_service.release_reservation(db, reservation)
+
+        questions = await available_questions()
+
+    if not questions:
+        raise HTTPException(status_code=404, detail="No hay preguntas disponibles para este tema")
+
+    rng = random.Random(request.seed)
+    selected = question_bank_service.select_questions(questions, request.num_questions, rng)
+    variants = question_bank_service.build_variants(
+        selected,
+        request.num_variants,
+        rng,
+        title=f"Examen: {request.topic}"
+    )
+
+    activities = []
+    for variant in variants:
+        activity = Activity(
+            title=variant["title"],
+            activity_type=ActivityType.EXAM,
+            content=variant,
+            subject=request.topic,
+            grade_level=request.grade_level,
+            is_public=False,
+            model_used="question_bank",
+            credits_used=0,
+            creator_id=current_user.id
+        )
+        db.add(activity)
+        activities.append(activity)
+    await usage_service.record(
+        db, user_id=current_user.id, activity_type=ActivityType.EXAM, activities=len(activities)
+    )
+
+    await db.commit()
+    for activity in activities:
+        await db.refresh(activity)
+
+    return [ActivityResponse.from_orm(activity) for activity in activities]
@@ -1,7 +1,7 @@
-from pydantic import BaseModel, field_validator
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, Field, field_validator
+from typing import Literal, Optional, Dict, Any
 from datetime import datetime
-from ..models.activity import ActivityType, AIProvider
+from ..models.activity import Activity, ActivityType, AIProvider
 
 
 class ActivityBase(BaseModel):
@@ -25,6 +25,31 @@ class ActivityUpdate(BaseModel):
     is_public: Optional[bool] = None
 
 
+class ActivitySummary(ActivityBase):
+    """
+    Vista ligera para listados: sin el JSON de contenido, con estadísticas precalculadas.
+    El contenido completo se obtiene en GET /api/activities/{id}.
+    """
+    id: int
+    ai_provider: Optional[AIProvider] = None
+    model_used: Optional[str] = None
+    credits_used: int = 0
+    item_count: Optional[int] = None
+    creator_id: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+    @classmethod
+    def columns(cls):
+        """
+        Columnas de Activity necesarias para construir el resumen (consulta sin `content`)
+        """
+        return [getattr(Activity, name) for name in cls.model_fields]
+
+
 class ActivityResponse(ActivityBase):
     id: int
     content: Dict[str, Any]
@@ -137,13 +162,27 @@ class CrosswordRequest(BaseModel):
     topic: str
     num_words: int = 15
     difficulty: str = "medium"
+    max_grid_size: int = Field(default=15, ge=5, le=30)  # Lado máximo de la cuadrícula
+    seed: Optional[int] = None  # Semilla para reproducir la misma disposición
     ai_provider: AIProvider = AIProvider.OLLAMA
     model_name: Optional[str] = None
 
 
+# Direcciones de la sopa de letras (las de word_search_engine.DIRECTIONS)
+WordSearchDirection = Literal[
+    "horizontal", "vertical", "diagonal", "diagonal_up",
+    "horizontal_reverse", "vertical_reverse", "diagonal_reverse", "diagonal_up_reverse",
+]
+
+
 class WordSearchRequest(BaseModel):
     topic: str
     num_words: int = 15
-    grid_size: int = 15
+    grid_size: int = Field(default=15, ge=5, le=30)
+    # Direcciones permitidas: horizontal, vertical, diagonal, diagonal_up y sus
+    # variantes *_reverse. Por defecto solo las cuatro direcciones de lectura natural.
+    directions: Optional[list[WordSearchDirection]] = None
+    prefer_overlap: bool = True  # Priorizar posiciones que comparten letras
+    seed: Optional[int] = None  # Semilla para reproducir la misma cuadrícula
     ai_provider: AIProvider = AIProvider.OLLAMA
     model_name: Optional[str] = None
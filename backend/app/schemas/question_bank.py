@@ -0,0 +1,40 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Any
+from datetime import datetime
+from ..models.activity import AIProvider
+
+
+class QuestionBankItemResponse(BaseModel):
+    id: int
+    topic: str
+    question_type: str
+    grade_level: Optional[str] = None
+    question: str
+    options: Optional[List[Any]] = None
+    correct_answer: Optional[Any] = None
+    points: Optional[int] = None
+    activity_id: Optional[int] = None
+    creator_id: Optional[int] = None
+    duplicate_of_id: Optional[int] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ExamAssemblyRequest(BaseModel):
+    topic: str
+    num_questions: int = Field(default=10, ge=1, le=100)
+    question_types: list[str] = ["multiple_choice", "true_false", "short_answer"]
+    grade_level: Optional[str] = None
+    num_variants: int = Field(default=1, ge=1, le=26)
+    seed: Optional[int] = None  # Semilla para reproducir la selección y el orden
+    dedupe: bool = False  # Excluir preguntas casi duplicadas entre sí
+    # Proveedor usado solo si el banco no tiene suficientes preguntas
+    ai_provider: AIProvider = AIProvider.OLLAMA
+    model_name: Optional[str] = None
+
+
+class DuplicateQuestionResponse(BaseModel):
+    question: QuestionBankItemResponse
+    similarity: float
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional
 from datetime import datetime
 from ..models.user import UserRole
@@ -53,3 +53,14 @@ class ForgotPasswordRequest(BaseModel):
 class ResetPasswordRequest(BaseModel):
     token: str
     new_password: str
+
+
+class UserImportRow(BaseModel):
+    """
+    Fila del CSV de importación masiva de usuarios
+    """
+    email: EmailStr
+    username: str = Field(min_length=1, max_length=100)
+    password: str = Field(min_length=6)
+    full_name: Optional[str] = None
+    role: UserRole = UserRole.ESTUDIANTE
@@ -1,7 +1,10 @@
+import time
 import httpx
 from typing import Optional, Dict, Any
 from ..config import settings
 from ..models.activity import AIProvider
+from .analytics_service import generation_analytics
+from .telemetry_service import generation_telemetry, parses_as_json
 
 # Importaciones opcionales
 try:
@@ -18,6 +21,45 @@ except ImportError:
     GEMINI_AVAILABLE = False
 
 
+# Tarifas de créditos: 1 crédito por cada 100 tokens en OpenAI, costo fijo por llamada en Gemini
+TOKENS_PER_CREDIT = 100
+GEMINI_CREDITS_PER_CALL = 5
+# Presupuesto de salida por defecto de cada llamada
+DEFAULT_MAX_TOKENS = 2000
+# Modelo de cada proveedor cuando la solicitud no indica uno
+DEFAULT_MODELS = {
+    AIProvider.OLLAMA: "qwen2.5vl:latest",
+    AIProvider.OPENAI: "gpt-3.5-turbo",
+    AIProvider.GEMINI: "gemini-pro",
+}
+
+# Campos de consumo y tiempos (ns) que devuelve Ollama, guardados en la telemetría
+OLLAMA_USAGE_FIELDS = (
+    "total_duration", "load_duration", "prompt_eval_count", "prompt_eval_duration",
+    "eval_count", "eval_duration", "done_reason",
+)
+GEMINI_USAGE_FIELDS = ("prompt_token_count", "candidates_token_count", "total_token_count", "cached_content_token_count")
+
+
+def openai_usage(response) -> Optional[Dict[str, Any]]:
+    """
+    Detalle de uso de una respuesta de OpenAI (incluye los desgloses de tokens
+    en caché y de razonamiento cuando el modelo los reporta)
+    """
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump(exclude_none=True)
+    return {key: getattr(usage, key, None) for key in ("prompt_tokens", "completion_tokens", "total_tokens")}
+
+
+def gemini_usage(usage) -> Optional[Dict[str, Any]]:
+    if usage is None:
+        return None
+    return {key: getattr(usage, key) for key in GEMINI_USAGE_FIELDS if getattr(usage, key, None) is not None}
+
+
 class AIService:
     def __init__(self, provider: str = None, model_name: str = None):
         self.ollama_base_url = settings.OLLAMA_BASE_URL
@@ -35,19 +77,46 @@ class AIService:
         provider: AIProvider,
         model_name: Optional[str] = None,
         temperature: float = 0.7,
-        max_tokens: int = 2000
+        max_tokens: int = DEFAULT_MAX_TOKENS
     ) -> Dict[str, Any]:
         """
-        Genera contenido usando el proveedor de AI especificado
+        Genera contenido usando el proveedor de AI especificado. Cada llamada
+        queda registrada en la analítica de generación (latencia, tokens, errores)
+        y en la telemetría por llamada.
         """
-        if provider == AIProvider.OLLAMA:
-            return await self._generate_ollama(prompt, model_name or "qwen2.5vl:latest", temperature)
-        elif provider == AIProvider.OPENAI:
-            return await self._generate_openai(prompt, model_name or "gpt-3.5-turbo", temperature, max_tokens)
-        elif provider == AIProvider.GEMINI:
-            return await self._generate_gemini(prompt, model_name or "gemini-pro", temperature, max_tokens)
-        else:
-            raise ValueError(f"Proveedor de AI no soportado: {provider}")
+        model = model_name or DEFAULT_MODELS.get(provider)
+        started = time.perf_counter()
+        try:
+            if provider == AIProvider.OLLAMA:
+                result = await self._generate_ollama(prompt, model, temperature)
+            elif provider == AIProvider.OPENAI:
+                result = await self._generate_openai(prompt, model, temperature, max_tokens)
+            elif provider == AIProvider.GEMINI:
+                result = await self._generate_gemini(prompt, model, temperature, max_tokens)
+            else:
+                raise ValueError(f"Proveedor de AI no soportado: {provider}")
+        except Exception as e:
+            self._record_error(provider, model, started, e)
+            raise
+        self._record(provider, model, started, result, json_ok=parses_as_json(result.get("content")))
+        return result
+
+    @staticmethod
+    def _record(provider, model: str, started: float, result: Dict[str, Any], json_ok: Optional[bool] = None) -> None:
+        latency = time.perf_counter() - started
+        generation_analytics.record(
+            provider, model, latency,
+            tokens_in=result.get("tokens_in", 0),
+            tokens_out=result.get("tokens_out", 0),
+            credits_used=result.get("credits_used", 0)
+        )
+        generation_telemetry.record(provider, model, latency, result=result, json_ok=json_ok)
+
+    @staticmethod
+    def _record_error(provider, model: str, started: float, error: Exception) -> None:
+        latency = time.perf_counter() - started
+        generation_analytics.record(provider, model, latency, error=True)
+        generation_telemetry.record(provider, model, latency, error=error)
 
     async def _generate_ollama(self, prompt: str, model: str, temperature: float) -> Dict[str, Any]:
         """
@@ -73,7 +142,11 @@ class AIService:
                 return {
                     "content": result.get("response", ""),
                     "model": model,
-                    "credits_used": 0  # Ollama es gratis
+                    "credits_used": 0,  # Ollama es gratis
+                    "tokens_used": result.get("prompt_eval_count", 0) + result.get("eval_count", 0),
+                    "tokens_in": result.get("prompt_eval_count", 0),
+                    "tokens_out": result.get("eval_count", 0),
+                    "usage": {key: result.get(key) for key in OLLAMA_USAGE_FIELDS if key in result}
                 }
             except httpx.ConnectError as e:
                 raise Exception(f"Error al comunicarse con Ollama: No se puede conectar a {self.ollama_base_url}. Asegúrate de que Ollama esté corriendo. Error: {str(e)}")
@@ -113,12 +186,16 @@ class AIService:
 
             # Calcular créditos basados en tokens (ejemplo: 1 crédito por cada 100 tokens)
             total_tokens = response.usage.total_tokens
-            credits_used = max(1, total_tokens // 100)
+            credits_used = max(1, total_tokens // TOKENS_PER_CREDIT)
 
             return {
                 "content": response.choices[0].message.content,
                 "model": model,
-                "credits_used": credits_used
+                "credits_used": credits_used,
+                "tokens_used": total_tokens,
+                "tokens_in": response.usage.prompt_tokens,
+                "tokens_out": response.usage.completion_tokens,
+                "usage": openai_usage(response)
             }
         except Exception as e:
             raise Exception(f"Error al comunicarse con OpenAI: {str(e)}")
@@ -148,12 +225,17 @@ class AIService:
 
             # Calcular créditos (similar a OpenAI)
             # Esto es una estimación, ajustar según necesidad
-            credits_used = 5
+            credits_used = GEMINI_CREDITS_PER_CALL
+            usage = getattr(response, "usage_metadata", None)
 
             return {
                 "content": response.text,
                 "model": model,
-                "credits_used": credits_used
+                "credits_used": credits_used,
+                "tokens_used": getattr(usage, "total_token_count", 0) or 0,
+                "tokens_in": getattr(usage, "prompt_token_count", 0) or 0,
+                "tokens_out": getattr(usage, "candidates_token_count", 0) or 0,
+                "usage": gemini_usage(usage)
             }
         except Exception as e:
             raise Exception(f"Error al comunicarse con Gemini: {str(e)}")
@@ -168,6 +250,24 @@ class AIService:
         """
         Genera una respuesta de chat considerando el historial de conversación
         """
+        provider = self.provider
+        model = self.model_name or DEFAULT_MODELS.get(provider)
+        started = time.perf_counter()
+        try:
+            result = await self._chat_response(message, system_prompt, conversation_history, temperature)
+        except Exception as e:
+            self._record_error(provider, model, started, e)
+            raise
+        self._record(provider, model, started, result)
+        return result["content"]
+
+    async def _chat_response(
+        self,
+        message: str,
+        system_prompt: str,
+        conversation_history: Optional[list],
+        temperature: float
+    ) -> Dict[str, Any]:
         conversation_history = conversation_history or []
 
         # Para Ollama, construir el prompt incluyendo el sistema y el historial
@@ -186,10 +286,10 @@ class AIService:
 
             result = await self._generate_ollama(
                 prompt=full_prompt,
-                model=self.model_name or "qwen2.5vl:latest",
+                model=self.model_name or DEFAULT_MODELS[AIProvider.OLLAMA],
                 temperature=temperature
             )
-            return result["content"]
+            return result
 
         # Para OpenAI, usar el formato de mensajes
         elif self.provider == "openai":
@@ -211,12 +311,17 @@ class AIService:
 
             try:
                 response = await self.openai_client.chat.completions.create(
-                    model=self.model_name or "gpt-3.5-turbo",
+                    model=self.model_name or DEFAULT_MODELS[AIProvider.OPENAI],
                     messages=messages,
                     temperature=temperature,
-                    max_tokens=2000
+                    max_tokens=DEFAULT_MAX_TOKENS
                 )
-                return response.choices[0].message.content
+                return {
+                    "content": response.choices[0].message.content,
+                    "tokens_in": response.usage.prompt_tokens,
+                    "tokens_out": response.usage.completion_tokens,
+                    "usage": openai_usage(response)
+                }
             except Exception as e:
                 raise Exception(f"Error al comunicarse con OpenAI: {str(e)}")
 
@@ -236,15 +341,21 @@ class AIService:
             full_prompt += f"Usuario: {message}\nAsistente:"
 
             try:
-                model_instance = genai.GenerativeModel(self.model_name or "gemini-pro")
+                model_instance = genai.GenerativeModel(self.model_name or DEFAULT_MODELS[AIProvider.GEMINI])
                 response = await model_instance.generate_content_async(
                     full_prompt,
                     generation_config={
                         "temperature": temperature,
-                        "max_output_tokens": 2000
+                        "max_output_tokens": DEFAULT_MAX_TOKENS
                     }
                 )
-                return response.text
+                usage = getattr(response, "usage_metadata", None)
+                return {
+                    "content": response.text,
+                    "tokens_in": getattr(usage, "prompt_token_count", 0) or 0,
+                    "tokens_out": getattr(usage, "candidates_token_count", 0) or 0,
+                    "usage": gemini_usage(usage)
+                }
             except Exception as e:
                 raise Exception(f"Error al comunicarse con Gemini: {str(e)}")
 
@@ -0,0 +1,295 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models.activity import ActivityType
+from ..models.usage import GenerationStats, LATENCY_BUCKETS_MS
+from ..utils.upsert import add_counters
+
+NO_ACTIVITY = "none"
+
+RESOLUTIONS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+# Máximo de intervalos por serie en una consulta
+MAX_POINTS = 1500
+
+LATENCY_COLUMNS = [f"latency_le_{bound}" for bound in LATENCY_BUCKETS_MS] + [f"latency_gt_{LATENCY_BUCKETS_MS[-1]}"]
+COUNTER_COLUMNS = ["calls", "errors", "tokens_in", "tokens_out", "credits_used", "latency_ms_total"] + LATENCY_COLUMNS
+
+# Columnas por las que se puede desglosar una serie
+GROUP_COLUMNS = {
+    "provider": GenerationStats.ai_provider,
+    "model": GenerationStats.model,
+    "activity_type": GenerationStats.activity_type,
+}
+
+
+class GenerationContext:
+    """
+    Generación en curso en la solicitud: tipo de actividad, usuario y eventos de
+    telemetría de sus llamadas al modelo (para enlazarlos luego con la actividad
+    o el mensaje guardado)
+    """
+
+    def __init__(self, activity_type: Optional[ActivityType] = None, user_id: Optional[int] = None):
+        self.activity_type = activity_type
+        self.user_id = user_id
+        self.events: List[Dict[str, Any]] = []
+
+
+# Lo fija el endpoint antes de llamar al modelo. Las tareas hijas (asyncio.gather)
+# heredan el mismo objeto
+current_generation: ContextVar[Optional[GenerationContext]] = ContextVar("current_generation", default=None)
+
+
+def begin_generation(activity_type: ActivityType, user_id: Optional[int] = None) -> GenerationContext:
+    context = GenerationContext(activity_type, user_id)
+    current_generation.set(context)
+    return context
+
+
+def activity_type_key(context: Optional[GenerationContext]) -> str:
+    if context is None or context.activity_type is None:
+        return NO_ACTIVITY
+    return context.activity_type.value
+
+
+def truncate(moment: datetime, resolution: str) -> datetime:
+    """
+    Inicio del intervalo de `resolution` que contiene `moment`
+    """
+    if resolution == "minute":
+        return moment.replace(second=0, microsecond=0)
+    if resolution == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def latency_percentile(histogram: List[int], fraction: float) -> Optional[float]:
+    """
+    Percentil (0-1) estimado del histograma de latencia, interpolando dentro del
+    intervalo que lo contiene. Las llamadas por encima del último límite se
+    reportan en ese límite.
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    target = fraction * total
+    cumulative = 0
+    lower = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS, histogram):
+        if count and cumulative + count >= target:
+            return round(lower + (bound - lower) * (target - cumulative) / count, 1)
+        cumulative += count
+        lower = bound
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+class GenerationAnalytics:
+    """
+    Métricas de las llamadas al modelo (latencia, tokens, créditos y errores),
+    agregadas en memoria por minuto, hora y día y volcadas en lote a
+    `generation_stats` cada ANALYTICS_FLUSH_SECONDS. Cada worker suma sus
+    contadores a las mismas filas, así que las series cubren todos los procesos.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Tuple, Dict[str, int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._pruned_at = 0.0
+
+    def record(
+        self,
+        provider,
+        model: str,
+        latency_seconds: float,
+        error: bool = False,
+        tokens_in: int = 0,
+        tokens_out: int = 0,
+        credits_used: int = 0
+    ) -> None:
+        """
+        Registra una llamada al modelo (solo en memoria, sin E/S)
+        """
+        dimensions = (
+            getattr(provider, "value", provider) or "",
+            model or "",
+            activity_type_key(current_generation.get()),
+        )
+        latency_ms = int(latency_seconds * 1000)
+        counters = {"calls": 1}
+        if error:
+            counters["errors"] = 1
+        else:
+            counters.update(
+                tokens_in=tokens_in or 0,
+                tokens_out=tokens_out or 0,
+                credits_used=credits_used or 0,
+                latency_ms_total=latency_ms,
+            )
+            bucket = next(
+                (f"latency_le_{bound}" for bound in LATENCY_BUCKETS_MS if latency_ms <= bound),
+                LATENCY_COLUMNS[-1]
+            )
+            counters[bucket] = 1
+
+        now = datetime.now(timezone.utc)
+        for resolution in RESOLUTIONS:
+            key = (resolution, truncate(now, resolution)) + dimensions
+            pending = self._pending.setdefault(key, {})
+            for column, value in counters.items():
+                pending[column] = pending.get(column, 0) + value
+
+    async def flush(self) -> int:
+        """
+        Vuelca los contadores pendientes (un upsert por fila agregada) y
+        periódicamente elimina las filas vencidas. Retorna las filas escritas.
+        """
+        pending, self._pending = self._pending, {}
+        if pending:
+            try:
+                async with AsyncSessionLocal() as db:
+                    for (resolution, bucket_start, provider, model, activity_type), counters in pending.items():
+                        await add_counters(db, GenerationStats, {
+                            "resolution": resolution,
+                            "bucket_start": bucket_start,
+                            "ai_provider": provider,
+                            "model": model,
+                            "activity_type": activity_type,
+                        }, counters)
+                    await db.commit()
+            except Exception:
+                # Se conservan para el siguiente intento
+                for key, counters in pending.items():
+                    merged = self._pending.setdefault(key, {})
+                    for column, value in counters.items():
+                        merged[column] = merged.get(column, 0) + value
+                raise
+
+        if time.monotonic() - self._pruned_at > 600:
+            self._pruned_at = time.monotonic()
+            await self.prune()
+        return len(pending)
+
+    @staticmethod
+    async def prune() -> None:
+        """
+        Elimina los intervalos de minuto y de hora más antiguos que su retención
+        """
+        now = datetime.now(timezone.utc)
+        async with AsyncSessionLocal() as db:
+            for resolution, retention in (
+                ("minute", timedelta(hours=settings.ANALYTICS_MINUTE_RETENTION_HOURS)),
+                ("hour", timedelta(days=settings.ANALYTICS_HOUR_RETENTION_DAYS)),
+            ):
+                await db.execute(
+                    delete(GenerationStats)
+                    .where(GenerationStats.resolution == resolution, GenerationStats.bucket_start < now - retention)
+                )
+            await db.commit()
+
+    async def series(
+        self,
+        db: AsyncSession,
+        resolution: str,
+        start: datetime,
+        end: datetime,
+        group_by: Optional[str] = None,
+        filters: Optional[Dict[str, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Serie por intervalos de `resolution` entre `start` y `end`, total o
+        desglosada por proveedor, modelo o tipo de actividad. La serie total
+        incluye los intervalos sin llamadas.
+        """
+        start, end = truncate(start, resolution), truncate(end, resolution)
+        columns = [GenerationStats.bucket_start]
+        if group_by:
+            columns.append(GROUP_COLUMNS[group_by].label("key"))
+        stmt = select(
+            *columns,
+            *(func.sum(getattr(GenerationStats, column)).label(column) for column in COUNTER_COLUMNS)
+        ).where(
+            GenerationStats.resolution == resolution,
+            GenerationStats.bucket_start >= start,
+            GenerationStats.bucket_start <= end
+        )
+        for name, value in (filters or {}).items():
+            if value is not None:
+                stmt = stmt.where(GROUP_COLUMNS[name] == value)
+        stmt = stmt.group_by(*columns).order_by(*columns)
+
+        points = [self._point(row._mapping) for row in await db.execute(stmt)]
+        if group_by:
+            return points
+
+        by_bucket = {point["bucket_start"]: point for point in points}
+        step = RESOLUTIONS[resolution]
+        filled = []
+        bucket_start = start
+        while bucket_start <= end:
+            filled.append(by_bucket.get(bucket_start) or self._point({"bucket_start": bucket_start}))
+            bucket_start += step
+        return filled
+
+    @staticmethod
+    def _point(row) -> Dict[str, Any]:
+        values = {column: row.get(column) or 0 for column in COUNTER_COLUMNS}
+        histogram = [values[column] for column in LATENCY_COLUMNS]
+        succeeded = values["calls"] - values["errors"]
+        bucket_start = row["bucket_start"]
+        point = {
+            # SQLite devuelve las fechas sin zona horaria: se guardan en UTC
+            "bucket_start": bucket_start.replace(tzinfo=timezone.utc) if bucket_start.tzinfo is None else bucket_start,
+            "calls": values["calls"],
+            "errors": values["errors"],
+            "error_rate": round(values["errors"] / values["calls"], 4) if values["calls"] else 0.0,
+            "tokens_in": values["tokens_in"],
+            "tokens_out": values["tokens_out"],
+            "credits_used": values["credits_used"],
+            "latency_ms": {
+                "avg": round(values["latency_ms_total"] / succeeded, 1) if succeeded else None,
+                "p50": latency_percentile(histogram, 0.5),
+                "p95": latency_percentile(histogram, 0.95),
+            },
+        }
+        if "key" in row:
+            point["key"] = row["key"]
+        return point
+
+    async def run(self) -> None:
+        """
+        Bucle de fondo: vuelca los contadores cada ANALYTICS_FLUSH_SECONDS
+        """
+        while True:
+            await asyncio.sleep(settings.ANALYTICS_FLUSH_SECONDS)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error al guardar las métricas de generación: {e}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+generation_analytics = GenerationAnalytics()
@@ -1,7 +1,15 @@
 from typing import Dict, Any, List
-from .ai_service import ai_service
+from .ai_service import ai_service, DEFAULT_MODELS
+from .telemetry_service import generation_telemetry, queued
+from .word_search_engine import word_search_engine, normalize_word
+from .crossword_engine import crossword_engine
+from ..config import settings
 from ..models.activity import AIProvider
+from ..utils.cache import LRUCache
+from ..utils.text import chunk_text, estimate_tokens, paragraph_spans, text_hash
+import asyncio
 import json
+import random
 
 
 class ContentGenerator:
@@ -9,6 +17,12 @@ class ContentGenerator:
     Servicio para generar diferentes tipos de contenido educativo
     """
 
+    def __init__(self):
+        # Resúmenes parciales por hash de fragmento (map-reduce de resúmenes)
+        self._chunk_summary_cache = LRUCache(maxsize=settings.GENERATION_CACHE_SIZE)
+        # Correcciones por hash de párrafo (corrección incremental de escritura)
+        self._paragraph_correction_cache = LRUCache(maxsize=settings.GENERATION_CACHE_SIZE)
+
     async def generate_exam(
         self,
         topic: str,
@@ -55,6 +69,12 @@ IMPORTANTE: Responde SOLO con el JSON, sin texto adicional.
 
         return self._normalize_result(result)
 
+    SUMMARY_LENGTH_INSTRUCTIONS = {
+        "short": "un resumen breve de 2-3 párrafos",
+        "medium": "un resumen moderado de 4-5 párrafos",
+        "long": "un resumen detallado de 6-8 párrafos"
+    }
+
     async def generate_summary(
         self,
         text: str,
@@ -63,16 +83,85 @@ IMPORTANTE: Responde SOLO con el JSON, sin texto adicional.
         model_name: str = None
     ) -> Dict[str, Any]:
         """
-        Genera un resumen de un texto
+        Genera un resumen de un texto.
+
+        Los textos que no caben en un fragmento se resumen en dos fases (map-reduce):
+        cada fragmento se resume de forma concurrente y los resúmenes parciales se
+        combinan, por niveles si hace falta, en el resumen final.
         """
-        length_instructions = {
-            "short": "un resumen breve de 2-3 párrafos",
-            "medium": "un resumen moderado de 4-5 párrafos",
-            "long": "un resumen detallado de 6-8 párrafos"
-        }
+        length_instruction = self.SUMMARY_LENGTH_INSTRUCTIONS.get(
+            length, self.SUMMARY_LENGTH_INSTRUCTIONS["medium"]
+        )
+        chunk_tokens = settings.SUMMARY_CHUNK_TOKENS
+        chunks = chunk_text(text, chunk_tokens)
+
+        if len(chunks) <= 1:
+            result = await ai_service.generate_content(
+                prompt=self._final_summary_prompt(text, length_instruction),
+                provider=provider,
+                model_name=model_name
+            )
+            return self._finalize_summary(self._normalize_result(result))
+
+        # Map: resumir cada fragmento (reutilizando la caché)
+        partials, usage = await self._summarize_chunks(chunks, provider, model_name)
+
+        # Reduce jerárquico: agrupar resúmenes parciales hasta que quepan en un prompt
+        while len(partials) > 1 and estimate_tokens("\n\n".join(partials)) > chunk_tokens:
+            groups = chunk_text("\n\n".join(partials), chunk_tokens)
+            if len(groups) >= len(partials):
+                break
+            partials, level_usage = await self._summarize_chunks(groups, provider, model_name)
+            usage = self._merge_usage(usage, level_usage)
 
-        prompt = f"""
-Por favor, crea {length_instructions.get(length, length_instructions['medium'])} del siguiente texto:
+        result = await ai_service.generate_content(
+            prompt=self._reduce_summary_prompt(partials, length_instruction),
+            provider=provider,
+            model_name=model_name
+        )
+        result = self._finalize_summary(self._normalize_result(result))
+        return self._merge_usage(result, usage)
+
+    @staticmethod
+    def summary_calls(text: str) -> int:
+        """
+        Llamadas al modelo que hará un resumen: una por fragmento más la combinación
+        """
+        chunks = len(chunk_text(text, settings.SUMMARY_CHUNK_TOKENS))
+        return 1 if chunks <= 1 else chunks + 1
+
+    @classmethod
+    def correction_calls(cls, text: str) -> int:
+        """
+        Llamadas al modelo que hará una corrección: como máximo una por grupo de
+        párrafos (si ninguno está en la caché)
+        """
+        paragraphs = [text[start:end] for start, end in paragraph_spans(text)]
+        return max(1, len(cls._correction_batches(paragraphs)))
+
+    @staticmethod
+    def _correction_batches(paragraphs: List[str]) -> List[List[int]]:
+        """
+        Agrupa párrafos consecutivos (sus índices) en lotes de a lo sumo
+        SUMMARY_CHUNK_TOKENS tokens estimados; un párrafo más largo va solo
+        """
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        for index, paragraph in enumerate(paragraphs):
+            tokens = estimate_tokens(paragraph)
+            if current and current_tokens + tokens > settings.SUMMARY_CHUNK_TOKENS:
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _final_summary_prompt(self, text: str, length_instruction: str) -> str:
+        return f"""
+Por favor, crea {length_instruction} del siguiente texto:
 
 {text}
 
@@ -86,13 +175,119 @@ Presenta el resumen en formato JSON:
 IMPORTANTE: Responde SOLO con el JSON.
 """
 
-        result = await ai_service.generate_content(
-            prompt=prompt,
-            provider=provider,
-            model_name=model_name
+    def _chunk_summary_prompt(self, chunk: str) -> str:
+        return f"""
+Resume de forma fiel y concisa el siguiente fragmento de un documento más largo.
+Conserva los datos, nombres y conceptos importantes.
+
+{chunk}
+
+Formato JSON:
+{{
+    "summary": "Resumen del fragmento",
+    "key_points": ["Punto clave 1", "Punto clave 2"]
+}}
+
+IMPORTANTE: Responde SOLO con el JSON.
+"""
+
+    def _reduce_summary_prompt(self, partials: List[str], length_instruction: str) -> str:
+        sections = "\n\n".join(
+            f"Sección {i}:\n{partial}" for i, partial in enumerate(partials, start=1)
         )
+        return f"""
+A continuación tienes los resúmenes parciales, en orden, de las secciones de un documento.
+Combínalos en {length_instruction} del documento completo, sin repetir información.
 
-        return self._normalize_result(result)
+{sections}
+
+Presenta el resumen en formato JSON:
+{{
+    "summary": "El texto del resumen aquí",
+    "key_points": ["Punto clave 1", "Punto clave 2", "Punto clave 3"],
+    "word_count": número de palabras del resumen
+}}
+
+IMPORTANTE: Responde SOLO con el JSON.
+"""
+
+    async def _summarize_chunks(
+        self,
+        chunks: List[str],
+        provider: AIProvider,
+        model_name: str = None
+    ) -> tuple[List[str], Dict[str, Any]]:
+        """
+        Resume varios fragmentos de forma concurrente. Los fragmentos ya resumidos
+        con el mismo proveedor y modelo se sirven desde la caché sin coste.
+        """
+        semaphore = asyncio.Semaphore(settings.CHUNK_MAX_CONCURRENCY)
+
+        async def summarize(chunk: str) -> tuple[str, Dict[str, int]]:
+            cache_key = (getattr(provider, "value", provider), model_name, text_hash(chunk))
+            cached = self._chunk_summary_cache.get(cache_key)
+            if cached is not None:
+                self._record_cache_hit(provider, model_name)
+                return cached, {}
+
+            async with queued(semaphore):
+                result = await ai_service.generate_content(
+                    prompt=self._chunk_summary_prompt(chunk),
+                    provider=provider,
+                    model_name=model_name
+                )
+            content = self._normalize_result(result)["content"]
+            if isinstance(content, dict):
+                partial = content.get("summary", "")
+                key_points = content.get("key_points") or []
+                if key_points:
+                    partial += "\nPuntos clave: " + "; ".join(str(p) for p in key_points)
+                self._chunk_summary_cache.set(cache_key, partial)
+            else:
+                # Respuesta sin JSON: se usa tal cual pero no se guarda en la caché
+                partial = str(content)
+
+            return partial, self._usage(result)
+
+        results = await asyncio.gather(*(summarize(chunk) for chunk in chunks))
+        partials = [partial for partial, _ in results]
+        usage = self._usage({})
+        for _, chunk_usage in results:
+            usage = self._merge_usage(usage, chunk_usage)
+        return partials, usage
+
+    @staticmethod
+    def _record_cache_hit(provider: AIProvider, model_name: str = None) -> None:
+        """
+        Registra en la telemetría una llamada evitada por la caché
+        """
+        generation_telemetry.record(provider, model_name or DEFAULT_MODELS.get(provider), cache_hit=True)
+
+    USAGE_KEYS = ("credits_used", "tokens_used")
+
+    @classmethod
+    def _usage(cls, result: Dict[str, Any]) -> Dict[str, int]:
+        """
+        Consumo (créditos y tokens) de una llamada al modelo
+        """
+        return {key: result.get(key, 0) for key in cls.USAGE_KEYS}
+
+    @classmethod
+    def _merge_usage(cls, a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Suma el consumo de `b` al de `a` (conservando el resto de claves de `a`)
+        """
+        return {**a, **{key: a.get(key, 0) + b.get(key, 0) for key in cls.USAGE_KEYS}}
+
+    @staticmethod
+    def _finalize_summary(result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Calcula `word_count` a partir del resumen en lugar de confiar en el modelo
+        """
+        content = result.get("content")
+        if isinstance(content, dict) and isinstance(content.get("summary"), str):
+            content["word_count"] = len(content["summary"].split())
+        return result
 
     async def generate_class_activity(
         self,
@@ -213,38 +408,179 @@ IMPORTANTE: Responde SOLO con el JSON.
         model_name: str = None
     ) -> Dict[str, Any]:
         """
-        Corrige un texto (ortografía, gramática, sintaxis)
+        Corrige un texto (ortografía, gramática, sintaxis).
+
+        El texto se corrige párrafo a párrafo: los párrafos sin cambios respecto a
+        envíos anteriores se sirven desde la caché y los modificados se envían al
+        modelo agrupados en lotes de hasta SUMMARY_CHUNK_TOKENS tokens (una llamada
+        por lote, de forma concurrente), así dividir el texto no multiplica el
+        costo. Los errores incluyen `paragraph`, `start` y `end` con la posición
+        del fragmento erróneo dentro del texto original.
         """
-        prompt = f"""
-Analiza y corrige el siguiente texto, identificando errores de ortografía, gramática, sintaxis y estilo:
+        spans = paragraph_spans(text)
+        paragraphs = [text[start:end] for start, end in spans]
+        semaphore = asyncio.Semaphore(settings.CHUNK_MAX_CONCURRENCY)
+        model_used = model_name
+        provider_key = getattr(provider, "value", provider)
+
+        corrections: List[Dict[str, Any]] = [None] * len(paragraphs)
+        pending: List[int] = []
+        for index, paragraph in enumerate(paragraphs):
+            cached = self._paragraph_correction_cache.get((provider_key, model_name, text_hash(paragraph)))
+            if cached is not None:
+                self._record_cache_hit(provider, model_name)
+                corrections[index] = cached
+            else:
+                pending.append(index)
+
+        async def correct(batch: List[int]) -> Dict[str, int]:
+            nonlocal model_used
+            async with queued(semaphore):
+                result = await ai_service.generate_content(
+                    prompt=self._correction_prompt([paragraphs[index] for index in batch]),
+                    provider=provider,
+                    model_name=model_name
+                )
+            model_used = result.get("model", model_used)
+            replies = self._split_batch_correction(self._normalize_result(result)["content"], len(batch))
+            for index, reply in zip(batch, replies):
+                corrections[index] = self._parse_paragraph_correction(paragraphs[index], reply)
+                # Un párrafo sin respuesta válida no se guarda: no se marca como corregido
+                if isinstance(reply, dict):
+                    self._paragraph_correction_cache.set(
+                        (provider_key, model_name, text_hash(paragraphs[index])), corrections[index]
+                    )
+            return self._usage(result)
+
+        batches = [
+            [pending[position] for position in batch]
+            for batch in self._correction_batches([paragraphs[index] for index in pending])
+        ]
+        batch_usages = await asyncio.gather(*(correct(batch) for batch in batches))
+
+        # Reconstruir el texto corregido conservando los separadores originales
+        corrected_parts: List[str] = []
+        errors: List[Dict[str, Any]] = []
+        suggestions: List[str] = []
+        position = 0
+        for index, ((start, end), correction) in enumerate(zip(spans, corrections)):
+            corrected_parts.append(text[position:start])
+            corrected_parts.append(correction["corrected_text"])
+            position = end
+
+            for error in correction["errors"]:
+                offset = error.get("offset")
+                errors.append({
+                    **{k: v for k, v in error.items() if k != "offset"},
+                    "paragraph": index,
+                    "start": start + offset if offset is not None else None,
+                    "end": start + offset + len(error.get("original", "")) if offset is not None else None
+                })
+            for suggestion in correction["suggestions"]:
+                if suggestion not in suggestions:
+                    suggestions.append(suggestion)
+        corrected_parts.append(text[position:])
+
+        usage = self._usage({})
+        for batch_usage in batch_usages:
+            usage = self._merge_usage(usage, batch_usage)
+
+        return {
+            "content": {
+                "original_text": text,
+                "corrected_text": "".join(corrected_parts),
+                "errors": errors,
+                "suggestions": suggestions
+            },
+            "model": model_used,
+            **usage
+        }
 
-{text}
+    def _correction_prompt(self, paragraphs: List[str]) -> str:
+        sections = "\n\n".join(
+            f"[Párrafo {i}]\n{paragraph}" for i, paragraph in enumerate(paragraphs, start=1)
+        )
+        return f"""
+Analiza y corrige cada uno de los siguientes párrafos, identificando errores de ortografía, gramática, sintaxis y estilo.
+Corrige cada párrafo por separado, sin unirlos ni dividirlos:
+
+{sections}
 
-Proporciona la corrección en formato JSON:
+Proporciona la corrección en formato JSON, con un elemento por párrafo y en el mismo orden:
 {{
-    "original_text": "El texto original",
-    "corrected_text": "El texto corregido",
-    "errors": [
+    "paragraphs": [
         {{
-            "type": "ortografía" o "gramática" o "sintaxis" o "estilo",
-            "original": "texto con error",
-            "correction": "texto corregido",
-            "explanation": "Explicación del error"
+            "index": 1,
+            "corrected_text": "El párrafo corregido",
+            "errors": [
+                {{
+                    "type": "ortografía" o "gramática" o "sintaxis" o "estilo",
+                    "original": "texto con error",
+                    "correction": "texto corregido",
+                    "explanation": "Explicación del error"
+                }}
+            ],
+            "suggestions": ["Sugerencia de mejora 1", "Sugerencia 2"]
         }}
-    ],
-    "suggestions": ["Sugerencia de mejora 1", "Sugerencia 2"]
+    ]
 }}
 
 IMPORTANTE: Responde SOLO con el JSON.
 """
 
-        result = await ai_service.generate_content(
-            prompt=prompt,
-            provider=provider,
-            model_name=model_name
-        )
-
-        return self._normalize_result(result)
+    @staticmethod
+    def _split_batch_correction(content: Any, count: int) -> List[Any]:
+        """
+        Respuesta de cada párrafo de un lote (None si falta o no es válida). Se
+        ubica por `index` y, si no lo trae, por su posición en la lista.
+        """
+        if isinstance(content, dict) and isinstance(content.get("paragraphs"), list):
+            entries = content["paragraphs"]
+        elif isinstance(content, list):
+            entries = content
+        elif isinstance(content, dict) and count == 1:
+            # Un solo párrafo respondido sin la lista
+            return [content]
+        else:
+            return [None] * count
+
+        replies: List[Any] = [None] * count
+        for position, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                continue
+            index = entry.get("index")
+            slot = index - 1 if isinstance(index, int) and not isinstance(index, bool) else position
+            if 0 <= slot < count and replies[slot] is None:
+                replies[slot] = entry
+        return replies
+
+    @staticmethod
+    def _parse_paragraph_correction(paragraph: str, content: Any) -> Dict[str, Any]:
+        """
+        Normaliza la corrección de un párrafo y calcula el desplazamiento de cada
+        error dentro del párrafo (`offset`), buscando en orden de aparición.
+        """
+        if not isinstance(content, dict):
+            return {"corrected_text": paragraph, "errors": [], "suggestions": []}
+
+        errors = []
+        search_from = 0
+        for error in content.get("errors") or []:
+            if not isinstance(error, dict):
+                continue
+            original = error.get("original") or ""
+            offset = paragraph.find(original, search_from) if original else -1
+            if offset == -1 and original:
+                offset = paragraph.find(original)
+            if offset != -1 and original:
+                search_from = offset + len(original)
+            errors.append({**error, "offset": offset if offset != -1 and original else None})
+
+        return {
+            "corrected_text": content.get("corrected_text") or paragraph,
+            "errors": errors,
+            "suggestions": [str(s) for s in content.get("suggestions") or []]
+        }
 
     async def generate_slides(
         self,
@@ -401,44 +737,48 @@ IMPORTANTE: Responde SOLO con el JSON.
 
         return self._normalize_result(result)
 
+    @staticmethod
+    def _crossword_entry(entry: Any) -> bool:
+        """
+        Entrada del crucigrama utilizable: un diccionario con `answer` de texto
+        (se descartan p. ej. "answer": null)
+        """
+        return isinstance(entry, dict) and isinstance(entry.get("answer"), str) and bool(entry["answer"].strip())
+
     async def generate_crossword(
         self,
         topic: str,
         num_words: int,
         difficulty: str,
         provider: AIProvider,
-        model_name: str = None
+        model_name: str = None,
+        max_grid_size: int = 15,
+        seed: int = None
     ) -> Dict[str, Any]:
         """
-        Genera un crucigrama
+        Genera un crucigrama.
+
+        El modelo solo propone respuestas y pistas; la disposición en la cuadrícula,
+        la numeración y el tamaño se calculan localmente con `crossword_engine`.
         """
+        # Pedir algunas palabras de más por si alguna no encaja en la cuadrícula
+        requested_words = num_words + max(3, num_words // 3)
+
         prompt = f"""
-Crea un crucigrama sobre: {topic}
-Número de palabras: {num_words}
+Crea las palabras y pistas para un crucigrama sobre: {topic}
+Número de palabras: {requested_words}
 Dificultad: {difficulty}
+Cada respuesta debe ser una sola palabra, sin espacios, de máximo {max_grid_size} letras.
 
 Formato JSON:
 {{
     "title": "Título del crucigrama",
-    "clues": {{
-        "across": [
-            {{
-                "number": 1,
-                "clue": "Pista horizontal",
-                "answer": "RESPUESTA",
-                "position": {{"row": 0, "col": 0}}
-            }}
-        ],
-        "down": [
-            {{
-                "number": 2,
-                "clue": "Pista vertical",
-                "answer": "RESPUESTA",
-                "position": {{"row": 0, "col": 0}}
-            }}
-        ]
-    }},
-    "grid_size": {{"rows": 15, "cols": 15}}
+    "words": [
+        {{
+            "answer": "RESPUESTA",
+            "clue": "Pista para la respuesta"
+        }}
+    ]
 }}
 
 IMPORTANTE: Responde SOLO con el JSON.
@@ -449,8 +789,36 @@ IMPORTANTE: Responde SOLO con el JSON.
             provider=provider,
             model_name=model_name
         )
+        result = self._normalize_result(result)
 
-        return self._normalize_result(result)
+        content = result.get("content")
+        entries = []
+        if isinstance(content, dict):
+            entries = [w for w in content.get("words") or [] if self._crossword_entry(w)]
+            # Compatibilidad: algunos modelos siguen devolviendo el formato de pistas
+            clues = content.get("clues") or {}
+            if not entries and isinstance(clues, dict):
+                entries = [
+                    c for c in (clues.get("across") or []) + (clues.get("down") or []) if self._crossword_entry(c)
+                ]
+        if not entries:
+            raise ValueError("El modelo no devolvió una lista de palabras válida para el crucigrama")
+
+        # Búsqueda de la disposición (CPU, hasta ~1 s) en un hilo: no bloquea el event loop
+        layout = await asyncio.to_thread(
+            crossword_engine.build,
+            entries=entries,
+            max_size=max_grid_size,
+            max_words=num_words,
+            seed=seed
+        )
+
+        result["content"] = {
+            "title": content.get("title", f"Crucigrama: {topic}"),
+            "clues": layout["clues"],
+            "grid_size": layout["grid_size"]
+        }
+        return result
 
     def _normalize_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
         """If the provider returned content as a JSON string, parse it into a dict.
@@ -473,15 +841,24 @@ IMPORTANTE: Responde SOLO con el JSON.
         num_words: int,
         grid_size: int,
         provider: AIProvider,
-        model_name: str = None
+        model_name: str = None,
+        directions: List[str] = None,
+        prefer_overlap: bool = True,
+        seed: int = None
     ) -> Dict[str, Any]:
         """
-        Genera una sopa de letras
+        Genera una sopa de letras.
+
+        El modelo solo propone las palabras y sus pistas; la cuadrícula se construye
+        localmente con `word_search_engine`, que además devuelve las soluciones.
         """
+        # Pedir algunas palabras de más por si alguna no cabe en la cuadrícula
+        requested_words = num_words + max(2, num_words // 5)
+
         prompt = f"""
-Crea una sopa de letras sobre: {topic}
-Número de palabras a incluir: {num_words}
-Tamaño de la cuadrícula: {grid_size}x{grid_size}
+Crea una lista de palabras para una sopa de letras sobre: {topic}
+Número de palabras: {requested_words}
+Cada palabra debe ser una sola palabra, sin espacios, de máximo {grid_size} letras.
 
 Formato JSON:
 {{
@@ -491,11 +868,6 @@ Formato JSON:
             "word": "PALABRA",
             "hint": "Pista para encontrar la palabra"
         }}
-    ],
-    "grid": [
-        ["A", "B", "C", ...],
-        ["D", "E", "F", ...],
-        ...
     ]
 }}
 
@@ -507,7 +879,46 @@ IMPORTANTE: Responde SOLO con el JSON.
             provider=provider,
             model_name=model_name
         )
+        result = self._normalize_result(result)
+
+        content = result.get("content")
+        if not isinstance(content, dict) or not content.get("words"):
+            raise ValueError("El modelo no devolvió una lista de palabras válida para la sopa de letras")
+
+        hints = {}
+        for item in content["words"]:
+            word = item.get("word") if isinstance(item, dict) else item
+            # Se omiten las entradas sin palabra (p. ej. "word": null)
+            if not isinstance(word, str) or not word.strip():
+                continue
+            hint = item.get("hint") if isinstance(item, dict) else None
+            hints.setdefault(normalize_word(word), (word, hint if isinstance(hint, str) else ""))
+        if not hints:
+            raise ValueError("El modelo no devolvió una lista de palabras válida para la sopa de letras")
+
+        if seed is None:
+            seed = random.randrange(2 ** 31)
+
+        board = word_search_engine.build(
+            words=[word for word, _ in hints.values()],
+            size=grid_size,
+            directions=directions,
+            prefer_overlap=prefer_overlap,
+            seed=seed,
+            max_words=num_words
+        )
 
+        result["content"] = {
+            "title": content.get("title", f"Sopa de letras: {topic}"),
+            "words": [
+                {"word": placement["word"], "hint": hints[placement["word"]][1]}
+                for placement in board["solutions"]
+            ],
+            "grid": board["grid"],
+            "grid_size": grid_size,
+            "solutions": board["solutions"],
+            "seed": seed
+        }
         return result
 
 
@@ -1,28 +1,53 @@
-from sqlalchemy.orm import Session
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import settings
+from ..models.activity import AIProvider
 from ..models.user import User
-from ..models.credit import CreditTransaction, TransactionType
+from ..models.credit import (
+    CreditTransaction, TransactionType, CreditReservation, ReservationStatus, CreditAdjustmentBatch
+)
+from .ai_service import TOKENS_PER_CREDIT, GEMINI_CREDITS_PER_CALL, DEFAULT_MAX_TOKENS
+from ..utils.text import estimate_tokens
 from fastapi import HTTPException
 
 
 class CreditService:
     @staticmethod
-    def deduct_credits(
-        db: Session,
+    async def deduct_credits(
+        db: AsyncSession,
         user: User,
         amount: int,
         activity_id: int = None,
         description: str = ""
     ) -> CreditTransaction:
         """
-        Deduce créditos del usuario
+        Deduce créditos del usuario con un UPDATE condicional (credits >= amount) y
+        registra el movimiento. Es atómico frente a generaciones en paralelo del
+        mismo usuario. No hace commit: se confirma junto con el resto de la
+        transacción del llamador.
         """
-        if user.credits < amount:
+        balance = await db.scalar(
+            update(User)
+            .where(User.id == user.id, User.credits >= amount)
+            .values(credits=User.credits - amount)
+            .returning(User.credits)
+            .execution_options(synchronize_session=False)
+        )
+        if balance is None:
+            current = await db.scalar(select(User.credits).where(User.id == user.id))
             raise HTTPException(
                 status_code=400,
-                detail=f"Créditos insuficientes. Tienes {user.credits} créditos, necesitas {amount}."
+                detail=f"Créditos insuficientes. Tienes {current} créditos, necesitas {amount}."
             )
 
-        user.credits -= amount
+        # Saldo ya guardado: se actualiza el objeto sin marcarlo como modificado
+        set_committed_value(user, "credits", balance)
 
         transaction = CreditTransaction(
             user_id=user.id,
@@ -30,18 +55,16 @@ class CreditService:
             transaction_type=TransactionType.USAGE,
             description=description,
             activity_id=activity_id,
-            balance_after=user.credits
+            balance_after=balance
         )
-
         db.add(transaction)
-        db.commit()
-        db.refresh(transaction)
+        await db.flush()
 
         return transaction
 
     @staticmethod
-    def add_credits(
-        db: Session,
+    async def add_credits(
+        db: AsyncSession,
         user: User,
         amount: int,
         transaction_type: TransactionType,
@@ -61,22 +84,324 @@ class CreditService:
         )
 
         db.add(transaction)
-        db.commit()
-        db.refresh(transaction)
+        await db.commit()
+        await db.refresh(transaction)
+
+        return transaction
+
+    @staticmethod
+    def estimate_credits(provider: AIProvider, input_text: str, calls: int = 1) -> int:
+        """
+        Costo máximo estimado de una generación: tokens de la entrada y de la
+        plantilla del prompt más el presupuesto de salida de cada llamada al modelo
+        """
+        if provider == AIProvider.OLLAMA:
+            return 0
+        if provider == AIProvider.GEMINI:
+            return GEMINI_CREDITS_PER_CALL * calls
+        tokens = estimate_tokens(input_text) + calls * (
+            settings.CREDIT_RESERVATION_PROMPT_TOKENS + DEFAULT_MAX_TOKENS
+        )
+        return max(1, tokens // TOKENS_PER_CREDIT)
+
+    async def reserve_credits(
+        self,
+        db: AsyncSession,
+        user: User,
+        amount: int,
+        description: str = ""
+    ) -> Optional[CreditReservation]:
+        """
+        Retiene `amount` créditos antes de una llamada de pago: pasan del saldo
+        disponible a `held_credits` con un UPDATE condicional, así las generaciones
+        en paralelo no pueden comprometer más créditos de los que hay. Hace commit.
+        """
+        if amount <= 0:
+            return None
+
+        await self.expire_reservations(db, user_id=user.id)
+        row = (await db.execute(
+            update(User)
+            .where(User.id == user.id, User.credits >= amount)
+            .values(credits=User.credits - amount, held_credits=User.held_credits + amount)
+            .returning(User.credits, User.held_credits)
+            .execution_options(synchronize_session=False)
+        )).first()
+        if row is None:
+            current = await db.scalar(select(User.credits).where(User.id == user.id))
+            await db.commit()
+            raise HTTPException(
+                status_code=400,
+                detail=f"Créditos insuficientes. Tienes {current} créditos disponibles, "
+                       f"esta generación puede costar hasta {amount}."
+            )
+        set_committed_value(user, "credits", row.credits)
+        set_committed_value(user, "held_credits", row.held_credits)
+
+        reservation = CreditReservation(
+            user_id=user.id,
+            amount=amount,
+            status=ReservationStatus.HELD,
+            description=description,
+            expires_at=datetime.now(timezone.utc) + timedelta(seconds=settings.CREDIT_RESERVATION_TTL_SECONDS)
+        )
+        db.add(reservation)
+        await db.commit()
+        # Desligada de la sesión: un rollback posterior no la expira y sigue legible
+        db.expunge(reservation)
+        return reservation
 
+    async def settle_reservation(
+        self,
+        db: AsyncSession,
+        reservation: CreditReservation,
+        user: User,
+        credits_used: int,
+        activity_id: int = None,
+        description: str = ""
+    ) -> Optional[CreditTransaction]:
+        """
+        Liquida una reserva con el consumo real: libera lo retenido, cobra lo usado
+        y registra el movimiento. Si el consumo supera lo retenido, el excedente se
+        cobra hasta donde alcance el saldo. Si la reserva ya expiró o se liberó, se
+        cobra como un descuento normal. No hace commit: después del commit el
+        llamador marca la reserva con `mark_settled`.
+        """
+        claimed = await db.scalar(
+            update(CreditReservation)
+            .where(CreditReservation.id == reservation.id, CreditReservation.status == ReservationStatus.HELD)
+            .values(status=ReservationStatus.SETTLED, resolved_at=datetime.now(timezone.utc),
+                    activity_id=activity_id, credits_charged=credits_used)
+            .returning(CreditReservation.amount)
+            .execution_options(synchronize_session=False)
+        )
+        if claimed is None:
+            if credits_used <= 0:
+                return None
+            return await self.deduct_credits(db, user, credits_used, activity_id, description)
+
+        covered = min(credits_used, claimed)
+        row = (await db.execute(
+            update(User)
+            .where(User.id == user.id)
+            .values(credits=User.credits + claimed - covered, held_credits=User.held_credits - claimed)
+            .returning(User.credits, User.held_credits)
+            .execution_options(synchronize_session=False)
+        )).first()
+        balance, charged = row.credits, covered
+
+        # Consumo mayor a lo estimado: el resto se cobra sin dejar el saldo negativo
+        extra = min(credits_used - covered, balance)
+        if extra > 0:
+            balance = await db.scalar(
+                update(User)
+                .where(User.id == user.id)
+                .values(credits=User.credits - extra)
+                .returning(User.credits)
+                .execution_options(synchronize_session=False)
+            )
+            charged += extra
+        set_committed_value(user, "credits", balance)
+        set_committed_value(user, "held_credits", row.held_credits)
+
+        if charged <= 0:
+            return None
+        transaction = CreditTransaction(
+            user_id=user.id,
+            amount=-charged,
+            transaction_type=TransactionType.USAGE,
+            description=description,
+            activity_id=activity_id,
+            balance_after=balance
+        )
+        db.add(transaction)
+        await db.flush()
         return transaction
 
     @staticmethod
-    def get_user_transactions(db: Session, user_id: int, skip: int = 0, limit: int = 100):
+    def mark_settled(reservation: Optional[CreditReservation]) -> None:
+        if reservation is not None:
+            set_committed_value(reservation, "status", ReservationStatus.SETTLED)
+
+    @staticmethod
+    async def _return_held(db: AsyncSession, user_id: int, amount: int) -> None:
+        await db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(credits=User.credits + amount, held_credits=User.held_credits - amount)
+            .execution_options(synchronize_session=False)
+        )
+
+    async def release_reservation(self, db: AsyncSession, reservation: Optional[CreditReservation]) -> None:
+        """
+        Devuelve los créditos de una reserva sin liquidar (generación fallida o
+        cancelada). Es idempotente y no hace nada si la reserva ya se liquidó. Hace commit.
+        """
+        if reservation is None or reservation.status != ReservationStatus.HELD:
+            return
+        # Descartar lo pendiente de la transacción fallida o cancelada
+        await db.rollback()
+        amount = await db.scalar(
+            update(CreditReservation)
+            .where(CreditReservation.id == reservation.id, CreditReservation.status == ReservationStatus.HELD)
+            .values(status=ReservationStatus.RELEASED, resolved_at=datetime.now(timezone.utc))
+            .returning(CreditReservation.amount)
+            .execution_options(synchronize_session=False)
+        )
+        if amount is not None:
+            await self._return_held(db, reservation.user_id, amount)
+        set_committed_value(reservation, "status", ReservationStatus.RELEASED)
+        await db.commit()
+
+    async def expire_reservations(self, db: AsyncSession, user_id: int = None) -> int:
+        """
+        Devuelve los créditos de las reservas vencidas (de un usuario o de todos).
+        No hace commit. Retorna el número de reservas expiradas.
+        """
+        stmt = update(CreditReservation)\
+            .where(
+                CreditReservation.status == ReservationStatus.HELD,
+                CreditReservation.expires_at < datetime.now(timezone.utc)
+            )\
+            .values(status=ReservationStatus.EXPIRED, resolved_at=datetime.now(timezone.utc))\
+            .returning(CreditReservation.user_id, CreditReservation.amount)\
+            .execution_options(synchronize_session=False)
+        if user_id is not None:
+            stmt = stmt.where(CreditReservation.user_id == user_id)
+
+        expired = (await db.execute(stmt)).all()
+        totals = {}
+        for row in expired:
+            totals[row.user_id] = totals.get(row.user_id, 0) + row.amount
+        for expired_user_id, amount in totals.items():
+            await self._return_held(db, expired_user_id, amount)
+        return len(expired)
+
+    async def bulk_adjust(
+        self,
+        db: AsyncSession,
+        admin: User,
+        idempotency_key: str,
+        amount: int,
+        description: str,
+        user_ids: Optional[List[int]] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Suma `amount` (negativo para descontar) a los usuarios de `user_ids` o a
+        los que cumplen `filters` (role, is_active, created_from, created_to) con
+        un único UPDATE ... RETURNING y un INSERT multi-fila en el historial, en
+        una transacción. Los usuarios que quedarían en negativo se omiten. Con la
+        misma `idempotency_key` devuelve el resumen del ajuste ya aplicado. Hace commit.
+        """
+        filters = {name: value for name, value in (filters or {}).items() if value is not None}
+        request_hash = hashlib.sha256(json.dumps(
+            {"amount": amount, "description": description, "user_ids": sorted(set(user_ids or [])), "filters": filters},
+            sort_keys=True, default=str
+        ).encode()).hexdigest()
+
+        existing = await self._adjustment_batch(db, idempotency_key)
+        if existing is not None:
+            return self._replay(existing, request_hash)
+
+        batch = CreditAdjustmentBatch(
+            idempotency_key=idempotency_key, request_hash=request_hash,
+            admin_id=admin.id, amount=amount, description=description
+        )
+        db.add(batch)
+        try:
+            # Reclama la clave: una solicitud simultánea con la misma espera aquí o falla
+            await db.flush()
+        except IntegrityError:
+            await db.rollback()
+            return self._replay(await self._adjustment_batch(db, idempotency_key), request_hash)
+
+        conditions = []
+        if user_ids is not None:
+            conditions.append(User.id.in_(set(user_ids)))
+        if "role" in filters:
+            conditions.append(User.role == filters["role"])
+        if "is_active" in filters:
+            conditions.append(User.is_active == filters["is_active"])
+        if "created_from" in filters:
+            conditions.append(User.created_at >= filters["created_from"])
+        if "created_to" in filters:
+            conditions.append(User.created_at < filters["created_to"])
+
+        missing_user_ids: List[int] = []
+        if user_ids is not None:
+            found = set(await db.scalars(select(User.id).where(*conditions)))
+            missing_user_ids = sorted(set(user_ids) - found)
+            matched = len(found)
+        else:
+            matched = await db.scalar(select(func.count(User.id)).where(*conditions))
+
+        updated = (await db.execute(
+            update(User)
+            .where(*conditions, User.credits + amount >= 0)
+            .values(credits=User.credits + amount)
+            .returning(User.id, User.credits)
+            .execution_options(synchronize_session=False)
+        )).all()
+        if updated:
+            await db.execute(insert(CreditTransaction), [
+                {
+                    "user_id": user_id,
+                    "amount": amount,
+                    "transaction_type": TransactionType.ADMIN_ADJUSTMENT,
+                    "description": f"{description} (por {admin.email})",
+                    "adjustment_batch_id": batch.id,
+                    "balance_after": balance,
+                }
+                for user_id, balance in updated
+            ])
+
+        batch.summary = {
+            "batch_id": batch.id,
+            "amount": amount,
+            "matched": matched,
+            "updated": len(updated),
+            "skipped_insufficient": matched - len(updated),
+            "missing_user_ids": missing_user_ids,
+            "total_amount": amount * len(updated),
+        }
+        await db.commit()
+        return {**batch.summary, "replayed": False}
+
+    @staticmethod
+    async def _adjustment_batch(db: AsyncSession, idempotency_key: str) -> Optional[CreditAdjustmentBatch]:
+        return await db.scalar(
+            select(CreditAdjustmentBatch).where(CreditAdjustmentBatch.idempotency_key == idempotency_key)
+        )
+
+    @staticmethod
+    def _replay(batch: Optional[CreditAdjustmentBatch], request_hash: str) -> Dict[str, Any]:
+        if batch is None:
+            # La solicitud que tenía la clave falló y se deshizo
+            raise HTTPException(
+                status_code=409,
+                detail="Otra solicitud con la misma clave de idempotencia no se completó. Reintenta."
+            )
+        if batch.request_hash != request_hash:
+            raise HTTPException(
+                status_code=409,
+                detail="La clave de idempotencia ya se usó con otra solicitud"
+            )
+        return {**batch.summary, "replayed": True}
+
+    @staticmethod
+    async def get_user_transactions(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100):
         """
         Obtiene el historial de transacciones de un usuario
         """
-        return db.query(CreditTransaction)\
-            .filter(CreditTransaction.user_id == user_id)\
-            .order_by(CreditTransaction.created_at.desc())\
-            .offset(skip)\
-            .limit(limit)\
-            .all()
+        result = await db.scalars(
+            select(CreditTransaction)
+            .where(CreditTransaction.user_id == user_id)
+            .order_by(CreditTransaction.created_at.desc())
+            .offset(skip)
+            .limit(limit)
+        )
+        return result.all()
 
 
 credit_service = CreditService()
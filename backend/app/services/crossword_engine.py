@@ -0,0 +1,287 @@
+import random
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from .word_search_engine import normalize_word
+
+ACROSS = "across"
+DOWN = "down"
+
+
+class _Board:
+    """
+    Tablero de trabajo con ocupación en bitsets.
+
+    `rows[r]` y `cols[c]` son máscaras de bits con las celdas ocupadas de cada fila
+    y columna; `across_rows[r]` y `down_cols[c]` marcan qué celdas pertenecen a una
+    palabra horizontal o vertical, respectivamente. Las letras se guardan aparte.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.rows = [0] * size
+        self.cols = [0] * size
+        self.across_rows = [0] * size
+        self.down_cols = [0] * size
+        self.letters: Dict[Tuple[int, int], str] = {}
+        self.by_letter: Dict[str, List[Tuple[int, int]]] = {}
+        self.bounds: Optional[Tuple[int, int, int, int]] = None  # min_r, min_c, max_r, max_c
+
+    def fits(self, word: str, row: int, col: int, direction: str, max_size: int) -> Optional[int]:
+        """
+        Comprueba si la palabra puede colocarse. Retorna el número de cruces o None.
+        """
+        length = len(word)
+        size = self.size
+        if direction == ACROSS:
+            if row < 0 or row >= size or col < 0 or col + length > size:
+                return None
+            line, same_dir, before, after = self.rows[row], self.across_rows[row], col - 1, col + length
+            start = col
+        else:
+            if col < 0 or col >= size or row < 0 or row + length > size:
+                return None
+            line, same_dir, before, after = self.cols[col], self.down_cols[col], row - 1, row + length
+            start = row
+
+        mask = ((1 << length) - 1) << start
+        # Las celdas ocupadas solo pueden cruzarse con palabras perpendiculares
+        if same_dir & mask:
+            return None
+        # Las celdas anterior y posterior a la palabra deben estar libres
+        if before >= 0 and line >> before & 1:
+            return None
+        if after < size and line >> after & 1:
+            return None
+
+        crossings = line & mask
+        new_cells = mask & ~crossings
+        # Las celdas nuevas no pueden tener vecinos paralelos (formarían palabras no deseadas)
+        index = row if direction == ACROSS else col
+        neighbours = self.rows if direction == ACROSS else self.cols
+        if index > 0 and neighbours[index - 1] & new_cells:
+            return None
+        if index < size - 1 and neighbours[index + 1] & new_cells:
+            return None
+
+        count = 0
+        bits = crossings >> start
+        position = 0
+        while bits:
+            if bits & 1:
+                cell = (row, col + position) if direction == ACROSS else (row + position, col)
+                if self.letters[cell] != word[position]:
+                    return None
+                count += 1
+            bits >>= 1
+            position += 1
+
+        # El tablero final no puede superar el tamaño máximo
+        end_row = row if direction == ACROSS else row + length - 1
+        end_col = col + length - 1 if direction == ACROSS else col
+        if self.bounds is not None:
+            min_r, min_c, max_r, max_c = self.bounds
+            if max(max_r, end_row) - min(min_r, row) >= max_size:
+                return None
+            if max(max_c, end_col) - min(min_c, col) >= max_size:
+                return None
+        return count
+
+    def place(self, word: str, row: int, col: int, direction: str) -> tuple:
+        """
+        Coloca la palabra y retorna la información necesaria para deshacerlo
+        """
+        snapshot = (
+            list(self.rows), list(self.cols), list(self.across_rows),
+            list(self.down_cols), self.bounds
+        )
+        added = []
+        for i, letter in enumerate(word):
+            r, c = (row, col + i) if direction == ACROSS else (row + i, col)
+            if (r, c) not in self.letters:
+                self.letters[(r, c)] = letter
+                self.by_letter.setdefault(letter, []).append((r, c))
+                added.append((r, c))
+            self.rows[r] |= 1 << c
+            self.cols[c] |= 1 << r
+            if direction == ACROSS:
+                self.across_rows[r] |= 1 << c
+            else:
+                self.down_cols[c] |= 1 << r
+
+        end_row = row if direction == ACROSS else row + len(word) - 1
+        end_col = col + len(word) - 1 if direction == ACROSS else col
+        if self.bounds is None:
+            self.bounds = (row, col, end_row, end_col)
+        else:
+            min_r, min_c, max_r, max_c = self.bounds
+            self.bounds = (min(min_r, row), min(min_c, col), max(max_r, end_row), max(max_c, end_col))
+        return snapshot, added
+
+    def undo(self, undo_info: tuple) -> None:
+        snapshot, added = undo_info
+        self.rows, self.cols, self.across_rows, self.down_cols, self.bounds = snapshot
+        for cell in added:
+            letter = self.letters.pop(cell)
+            self.by_letter[letter].remove(cell)
+
+    def area(self) -> int:
+        if self.bounds is None:
+            return 0
+        min_r, min_c, max_r, max_c = self.bounds
+        return (max_r - min_r + 1) * (max_c - min_c + 1)
+
+
+class CrosswordEngine:
+    """
+    Construye crucigramas válidos a partir de una lista de respuestas y pistas.
+
+    Usa búsqueda con retroceso (backtracking) sobre los cruces de letras: cada
+    palabra se intenta colocar perpendicular a una letra coincidente ya presente en
+    el tablero. Se exploran las mejores alternativas de cada nivel dentro de un
+    presupuesto de tiempo y se conserva la disposición con más palabras y mayor
+    densidad. Finalmente se recorta el tablero y se numeran las pistas.
+    """
+
+    def __init__(self, branching: int = 3):
+        self.branching = branching
+
+    def build(
+        self,
+        entries: List[Dict[str, str]],
+        max_size: int = 15,
+        max_words: Optional[int] = None,
+        time_budget: float = 1.0,
+        seed: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        `entries` es una lista de diccionarios con `answer` y `clue`.
+        Retorna `clues` (across/down con número y posición), `grid_size` y `unplaced`.
+        """
+        rng = random.Random(seed)
+        words: List[Tuple[str, str, str]] = []  # (respuesta normalizada, pista, original)
+        seen = set()
+        for entry in entries:
+            answer = normalize_word(entry.get("answer", ""))
+            if 2 <= len(answer) <= max_size and answer not in seen:
+                seen.add(answer)
+                words.append((answer, entry.get("clue") or "", entry.get("answer", "")))
+
+        # Las palabras largas primero; desempate aleatorio reproducible
+        rng.shuffle(words)
+        words.sort(key=lambda w: len(w[0]), reverse=True)
+
+        board = _Board(max_size * 3)
+        deadline = time.monotonic() + time_budget
+        best: Dict[str, Any] = {"placed": [], "score": (-1, 0.0), "total": min(len(words), max_words or len(words))}
+
+        if words:
+            first, rest = words[0], words[1:]
+            center = board.size // 2
+            start_col = center - len(first[0]) // 2
+            board.place(first[0], center, start_col, ACROSS)
+            placed = [(first, center, start_col, ACROSS)]
+            self._search(board, rest, placed, 0, max_size, deadline, best)
+
+        placed_answers = {p[0][0] for p in best["placed"]}
+        layout = self._number(best["placed"])
+        layout["unplaced"] = [w[2] for w in words if w[0] not in placed_answers]
+        return layout
+
+    def _search(self, board, words, placed, crossings, max_size, deadline, best) -> None:
+        score = (len(placed), crossings / max(1, board.area()))
+        if score > best["score"]:
+            best["placed"] = list(placed)
+            best["score"] = score
+
+        if not words or len(placed) >= best["total"] or time.monotonic() > deadline:
+            return
+        # Se alcanzó el número de palabras pedido: no hace falta seguir buscando
+        if best["score"][0] == best["total"]:
+            return
+        # Poda: ni colocando todas las restantes se supera la mejor solución
+        if min(len(placed) + len(words), best["total"]) < best["score"][0]:
+            return
+
+        word_entry, remaining = words[0], words[1:]
+        candidates = self._candidates(board, word_entry[0], max_size)
+
+        if not candidates:
+            self._search(board, remaining, placed, crossings, max_size, deadline, best)
+            return
+
+        for count, row, col, direction in candidates[:self.branching]:
+            undo_info = board.place(word_entry[0], row, col, direction)
+            placed.append((word_entry, row, col, direction))
+            self._search(board, remaining, placed, crossings + count, max_size, deadline, best)
+            placed.pop()
+            board.undo(undo_info)
+            if time.monotonic() > deadline:
+                return
+
+    @staticmethod
+    def _candidates(board: _Board, word: str, max_size: int) -> List[Tuple[int, int, int, str]]:
+        """
+        Posiciones válidas que cruzan alguna letra existente, ordenadas por número
+        de cruces (desc) y área resultante (asc).
+        """
+        options = {}
+        for i, letter in enumerate(word):
+            for r, c in board.by_letter.get(letter, []):
+                # Si la celda pertenece a una palabra horizontal, la nueva va vertical
+                if board.across_rows[r] >> c & 1 and not board.down_cols[c] >> r & 1:
+                    placement = (r - i, c, DOWN)
+                elif board.down_cols[c] >> r & 1 and not board.across_rows[r] >> c & 1:
+                    placement = (r, c - i, ACROSS)
+                else:
+                    continue
+                if placement in options:
+                    continue
+                count = board.fits(word, *placement, max_size)
+                if count:
+                    options[placement] = count
+
+        def resulting_area(placement):
+            row, col, direction = placement
+            min_r, min_c, max_r, max_c = board.bounds
+            end_row = row if direction == ACROSS else row + len(word) - 1
+            end_col = col + len(word) - 1 if direction == ACROSS else col
+            return (max(max_r, end_row) - min(min_r, row) + 1) * (max(max_c, end_col) - min(min_c, col) + 1)
+
+        ranked = sorted(options.items(), key=lambda item: (-item[1], resulting_area(item[0])))
+        return [(count, row, col, direction) for (row, col, direction), count in ranked]
+
+    @staticmethod
+    def _number(placed: List[tuple]) -> Dict[str, Any]:
+        """
+        Recorta el tablero al área usada y numera las palabras en orden de lectura
+        """
+        if not placed:
+            return {"clues": {ACROSS: [], DOWN: []}, "grid_size": {"rows": 0, "cols": 0}}
+
+        min_row = min(row for _, row, _, _ in placed)
+        min_col = min(col for _, _, col, _ in placed)
+        max_row = max(row + (len(entry[0]) - 1 if direction == DOWN else 0) for entry, row, _, direction in placed)
+        max_col = max(col + (len(entry[0]) - 1 if direction == ACROSS else 0) for entry, _, col, direction in placed)
+
+        starts = sorted({(row - min_row, col - min_col) for _, row, col, _ in placed})
+        numbers = {cell: number for number, cell in enumerate(starts, start=1)}
+
+        clues = {ACROSS: [], DOWN: []}
+        for (answer, clue, _), row, col, direction in placed:
+            position = (row - min_row, col - min_col)
+            clues[direction].append({
+                "number": numbers[position],
+                "clue": clue,
+                "answer": answer,
+                "position": {"row": position[0], "col": position[1]}
+            })
+        for direction in clues:
+            clues[direction].sort(key=lambda c: c["number"])
+
+        return {
+            "clues": clues,
+            "grid_size": {"rows": max_row - min_row + 1, "cols": max_col - min_col + 1}
+        }
+
+
+crossword_engine = CrosswordEngine()
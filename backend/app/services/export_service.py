@@ -637,8 +637,10 @@ class ExportService:
             answer = clue.get("answer", "")
             number = clue.get("number", "")
 
+            if not 0 <= row < rows:
+                continue
             for i, letter in enumerate(answer):
-                if col + i < cols:
+                if 0 <= col + i < cols:
                     if grid[row][col + i] is None:
                         grid[row][col + i] = {"letter": "", "number": ""}
                     if i == 0:  # Primera celda lleva el número
@@ -652,8 +654,10 @@ class ExportService:
             answer = clue.get("answer", "")
             number = clue.get("number", "")
 
+            if not 0 <= col < cols:
+                continue
             for i, letter in enumerate(answer):
-                if row + i < rows:
+                if 0 <= row + i < rows:
                     if grid[row + i][col] is None:
                         grid[row + i][col] = {"letter": "", "number": ""}
                     if i == 0:  # Primera celda lleva el número
@@ -888,8 +892,10 @@ class ExportService:
             answer = clue.get("answer", "")
             number = clue.get("number", "")
 
+            if not 0 <= r < rows_count:
+                continue
             for i, letter in enumerate(answer):
-                if c + i < cols_count:
+                if 0 <= c + i < cols_count:
                     if grid[r][c + i] is None:
                         grid[r][c + i] = {"letter": "", "number": ""}
                     if i == 0:
@@ -903,8 +909,10 @@ class ExportService:
             answer = clue.get("answer", "")
             number = clue.get("number", "")
 
+            if not 0 <= c < cols_count:
+                continue
             for i, letter in enumerate(answer):
-                if r + i < rows_count:
+                if 0 <= r + i < rows_count:
                     if grid[r + i][c] is None:
                         grid[r + i][c] = {"letter": "", "number": ""}
                     if i == 0:
@@ -0,0 +1,100 @@
+import hashlib
+from typing import Dict, Iterable, List, Sequence, Set
+import numpy as np
+
+# Primo de Mersenne 2^31 - 1: los productos a * h caben en uint64 sin desbordar
+_PRIME = (1 << 31) - 1
+
+
+def shingles(text: str, k: int = 3) -> Set[str]:
+    """
+    Conjunto de k-gramas de palabras de un texto ya normalizado.
+    Los textos con menos de k palabras usan sus palabras sueltas.
+    """
+    words = text.split()
+    if len(words) < k:
+        return set(words)
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def _hash32(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=4).digest(), "little") % _PRIME
+
+
+class MinHasher:
+    """
+    Firmas MinHash con `num_perm` permutaciones universales (a * x + b) mod p.
+    Dos firmas coinciden posición a posición con probabilidad igual a la similitud
+    de Jaccard de los conjuntos de shingles originales.
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, tokens: Iterable[str]) -> List[int]:
+        hashes = np.array([_hash32(t) for t in tokens], dtype=np.uint64)
+        if hashes.size == 0:
+            return [_PRIME] * self.num_perm
+        values = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME
+        return values.min(axis=1).astype(np.int64).tolist()
+
+    @staticmethod
+    def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+        """
+        Estimación de la similitud de Jaccard a partir de dos firmas
+        """
+        if not a or not b or len(a) != len(b):
+            return 0.0
+        return float(np.mean(np.asarray(a) == np.asarray(b)))
+
+
+class LSHBands:
+    """
+    Locality-Sensitive Hashing por bandas: la firma se divide en `bands` bandas de
+    `rows` valores y cada banda se resume en una clave de cubeta. Dos firmas con
+    similitud s comparten al menos una cubeta con probabilidad 1 - (1 - s^rows)^bands.
+    """
+
+    def __init__(self, bands: int = 16, rows: int = 4):
+        self.bands = bands
+        self.rows = rows
+
+    def buckets(self, signature: Sequence[int]) -> List[str]:
+        keys = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            raw = ",".join(str(v) for v in chunk).encode("ascii")
+            keys.append(hashlib.blake2b(raw, digest_size=8).hexdigest())
+        return keys
+
+
+class InMemoryLSHIndex:
+    """
+    Índice LSH en memoria para deduplicar colecciones pequeñas (p. ej. al armar un examen)
+    """
+
+    def __init__(self, lsh: LSHBands):
+        self.lsh = lsh
+        self._tables: List[Dict[str, List[int]]] = [{} for _ in range(lsh.bands)]
+        self._signatures: Dict[int, Sequence[int]] = {}
+
+    def add(self, key: int, signature: Sequence[int]) -> None:
+        self._signatures[key] = signature
+        for band, bucket in enumerate(self.lsh.buckets(signature)):
+            self._tables[band].setdefault(bucket, []).append(key)
+
+    def query(self, signature: Sequence[int], threshold: float) -> List[int]:
+        candidates = set()
+        for band, bucket in enumerate(self.lsh.buckets(signature)):
+            candidates.update(self._tables[band].get(bucket, []))
+        return [
+            key for key in candidates
+            if MinHasher.similarity(signature, self._signatures[key]) >= threshold
+        ]
+
+
+minhasher = MinHasher()
+lsh_bands = LSHBands()
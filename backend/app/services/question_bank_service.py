@@ -0,0 +1,375 @@
+import json
+import random
+import re
+import string
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+from sqlalchemy import Select, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from .minhash import minhasher, lsh_bands, shingles, InMemoryLSHIndex, MinHasher
+from ..config import settings
+from ..models.activity import Activity, ActivityType
+from ..models.question_bank import QuestionBankItem, QuestionLSHBucket
+from ..models.user import User, UserRole
+from ..utils.text import text_hash, strip_accents
+
+QUESTION_TYPE_ALIASES = {
+    "multiple_choice": "multiple_choice",
+    "opcion_multiple": "multiple_choice",
+    "seleccion_multiple": "multiple_choice",
+    "true_false": "true_false",
+    "verdadero_falso": "true_false",
+    "short_answer": "short_answer",
+    "respuesta_corta": "short_answer",
+}
+
+VARIANT_LABELS = string.ascii_uppercase
+
+# Textos de opción que corresponden a respuestas booleanas (normalizados)
+TRUE_OPTION_TEXTS = {"verdadero", "true", "cierto", "v", "si"}
+FALSE_OPTION_TEXTS = {"falso", "false", "f", "no"}
+
+
+def normalize_topic(topic: Optional[str]) -> str:
+    """
+    Clave de tema para búsquedas: minúsculas, sin tildes y con espacios simples
+    """
+    return re.sub(r"\s+", " ", strip_accents(topic or "").lower()).strip()
+
+
+def normalize_question_text(text: str) -> str:
+    """
+    Texto de la pregunta normalizado para detectar duplicados
+    """
+    return re.sub(r"[^\w\s]", "", normalize_topic(text))
+
+
+def normalize_question_type(value: Optional[str]) -> str:
+    key = normalize_topic(value).replace(" ", "_").replace("/", "_")
+    return QUESTION_TYPE_ALIASES.get(key, key or "short_answer")
+
+
+def question_signature(question_text: str) -> List[int]:
+    """
+    Firma MinHash del texto normalizado de una pregunta
+    """
+    return minhasher.signature(shingles(normalize_question_text(question_text)))
+
+
+def _resolve_correct_answer(options: List[str], correct_answer: Any) -> Any:
+    """
+    Convierte respuestas dadas como letra, índice o booleano ("B", "b)", 1, True)
+    en el texto de la opción correspondiente, para que siga siendo válida al
+    barajar las opciones.
+    """
+    if not options or correct_answer is None or correct_answer in options:
+        return correct_answer
+    if isinstance(correct_answer, bool):
+        # True/False es la respuesta de verdadero/falso, no un índice de opción
+        texts = TRUE_OPTION_TEXTS if correct_answer else FALSE_OPTION_TEXTS
+        return next((option for option in options if normalize_topic(str(option)) in texts), correct_answer)
+    if isinstance(correct_answer, int) and 0 <= correct_answer < len(options):
+        return options[correct_answer]
+    if isinstance(correct_answer, str):
+        letter = correct_answer.strip().rstrip(").").strip().upper()
+        if len(letter) == 1 and letter in VARIANT_LABELS[:len(options)]:
+            return options[VARIANT_LABELS.index(letter)]
+    return correct_answer
+
+
+def _answer_text(correct_answer: Any) -> Optional[str]:
+    """
+    Respuesta como texto para la columna `correct_answer` (el modelo puede
+    devolver booleanos, números o listas)
+    """
+    if correct_answer is None or isinstance(correct_answer, str):
+        return correct_answer
+    if isinstance(correct_answer, bool):
+        return "Verdadero" if correct_answer else "Falso"
+    return json.dumps(correct_answer, ensure_ascii=False)
+
+
+def _question_points(points: Any) -> int:
+    """
+    Puntaje entero positivo; 1 si el modelo devolvió algo no numérico
+    """
+    try:
+        value = int(float(points))
+    except (TypeError, ValueError, OverflowError):
+        return 1
+    return value if value > 0 else 1
+
+
+class QuestionBankService:
+    """
+    Banco de preguntas construido a partir de los exámenes generados.
+
+    Cada pregunta se guarda como una fila indexada por tema, tipo y nivel, lo que
+    permite armar exámenes nuevos y variantes barajadas sin volver a llamar al modelo.
+    """
+
+    async def index_activity(self, db: AsyncSession, activity: Activity) -> List[QuestionBankItem]:
+        """
+        Agrega al banco las preguntas de un examen. Omite las preguntas que el autor
+        ya tiene en el banco (mismo texto y tipo, o casi-duplicados según MinHash) y
+        los exámenes armados desde el propio banco. Los casi-duplicados de preguntas
+        de otros autores se guardan marcados con `duplicate_of_id`.
+        No hace commit.
+        """
+        content = activity.content
+        if activity.activity_type != ActivityType.EXAM or not isinstance(content, dict):
+            return []
+        if content.get("variant"):
+            return []
+
+        topic = activity.subject or content.get("title") or activity.title
+        items: List[QuestionBankItem] = []
+        seen_hashes = set()
+
+        for question in content.get("questions") or []:
+            if not isinstance(question, dict) or not str(question.get("question", "")).strip():
+                continue
+
+            question_text = str(question["question"]).strip()
+            question_type = normalize_question_type(question.get("type"))
+            hash_value = text_hash(f"{question_type}:{normalize_question_text(question_text)}")
+            if hash_value in seen_hashes:
+                continue
+            seen_hashes.add(hash_value)
+
+            options = question.get("options") if isinstance(question.get("options"), list) else None
+            items.append(QuestionBankItem(
+                topic=topic,
+                topic_key=normalize_topic(topic),
+                question_type=question_type,
+                grade_level=activity.grade_level,
+                question=question_text,
+                options=options,
+                correct_answer=_answer_text(_resolve_correct_answer(options, question.get("correct_answer"))),
+                points=_question_points(question.get("points")),
+                text_hash=hash_value,
+                activity_id=activity.id,
+                creator_id=activity.creator_id
+            ))
+
+        if not items:
+            return []
+
+        existing = set(await db.scalars(
+            select(QuestionBankItem.text_hash).where(
+                QuestionBankItem.creator_id == activity.creator_id,
+                QuestionBankItem.text_hash.in_([item.text_hash for item in items])
+            )
+        ))
+        threshold = settings.QUESTION_DUPLICATE_THRESHOLD
+        batch_index = InMemoryLSHIndex(lsh_bands)
+        kept: List[QuestionBankItem] = []
+        for position, item in enumerate(items):
+            if item.text_hash in existing:
+                continue
+            item.minhash = question_signature(item.question)
+            if batch_index.query(item.minhash, threshold):
+                continue
+
+            match = await self.best_match(db, item.minhash, threshold, question_type=item.question_type)
+            if match is not None:
+                duplicate, _ = match
+                if duplicate.creator_id == activity.creator_id:
+                    continue
+                item.duplicate_of_id = duplicate.duplicate_of_id or duplicate.id
+
+            batch_index.add(position, item.minhash)
+            kept.append(item)
+
+        db.add_all(kept)
+        await db.flush()
+        self.add_lsh_buckets(db, kept)
+        return kept
+
+    @staticmethod
+    def add_lsh_buckets(db, items: List[QuestionBankItem]) -> None:
+        """
+        Registra las cubetas LSH de preguntas ya insertadas (con id). No hace commit.
+        Acepta sesiones síncronas (scripts) o asíncronas: solo agrega objetos.
+        """
+        db.add_all([
+            QuestionLSHBucket(question_id=item.id, band=band, bucket=bucket)
+            for item in items if item.minhash
+            for band, bucket in enumerate(lsh_bands.buckets(item.minhash))
+        ])
+
+    @staticmethod
+    def candidate_ids(signature: Sequence[int]) -> Select:
+        """
+        Subconsulta con los ids de preguntas que comparten alguna cubeta LSH
+        """
+        keys = list(enumerate(lsh_bands.buckets(signature)))
+        return select(QuestionLSHBucket.question_id)\
+            .where(tuple_(QuestionLSHBucket.band, QuestionLSHBucket.bucket).in_(keys))\
+            .distinct()
+
+    async def best_match(
+        self,
+        db: AsyncSession,
+        signature: Sequence[int],
+        threshold: float,
+        question_type: Optional[str] = None
+    ) -> Optional[Tuple[QuestionBankItem, float]]:
+        """
+        Pregunta existente más parecida (similitud >= threshold), o None
+        """
+        stmt = select(QuestionBankItem).where(QuestionBankItem.id.in_(self.candidate_ids(signature)))
+        if question_type:
+            stmt = stmt.where(QuestionBankItem.question_type == question_type)
+
+        best = None
+        for candidate in await db.scalars(stmt):
+            similarity = MinHasher.similarity(signature, candidate.minhash or [])
+            if similarity >= threshold and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+        return best
+
+    async def find_near_duplicates(
+        self,
+        db: AsyncSession,
+        user: User,
+        text: str,
+        threshold: Optional[float] = None,
+        exclude_id: Optional[int] = None
+    ) -> List[Tuple[QuestionBankItem, float]]:
+        """
+        Preguntas visibles para el usuario cuyo texto es casi igual a `text`,
+        ordenadas de mayor a menor similitud.
+        """
+        threshold = settings.QUESTION_DUPLICATE_THRESHOLD if threshold is None else threshold
+        signature = question_signature(text)
+        stmt = self.visible_questions(user)\
+            .where(QuestionBankItem.id.in_(self.candidate_ids(signature)))
+        if exclude_id is not None:
+            stmt = stmt.where(QuestionBankItem.id != exclude_id)
+
+        matches = []
+        for candidate in await db.scalars(stmt):
+            similarity = MinHasher.similarity(signature, candidate.minhash or [])
+            if similarity >= threshold:
+                matches.append((candidate, similarity))
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches
+
+    @staticmethod
+    def dedupe_questions(
+        questions: List[QuestionBankItem],
+        threshold: Optional[float] = None
+    ) -> List[QuestionBankItem]:
+        """
+        Elimina casi-duplicados de una lista de preguntas, conservando la más antigua
+        """
+        threshold = settings.QUESTION_DUPLICATE_THRESHOLD if threshold is None else threshold
+        index = InMemoryLSHIndex(lsh_bands)
+        kept = []
+        for question in sorted(questions, key=lambda q: q.id):
+            signature = question.minhash or question_signature(question.question)
+            if index.query(signature, threshold):
+                continue
+            index.add(question.id, signature)
+            kept.append(question)
+        return kept
+
+    def visible_questions(
+        self,
+        user: User,
+        topic: Optional[str] = None,
+        question_types: Optional[List[str]] = None,
+        grade_level: Optional[str] = None
+    ) -> Select:
+        """
+        Consulta de preguntas visibles para el usuario: las propias y las de
+        exámenes públicos (los administradores ven todas).
+        """
+        stmt = select(QuestionBankItem).outerjoin(
+            Activity, QuestionBankItem.activity_id == Activity.id
+        )
+
+        if user.role != UserRole.ADMIN:
+            stmt = stmt.where(or_(
+                QuestionBankItem.creator_id == user.id,
+                Activity.is_public == True
+            ))
+        if topic:
+            stmt = stmt.where(QuestionBankItem.topic_key == normalize_topic(topic))
+        if question_types:
+            stmt = stmt.where(QuestionBankItem.question_type.in_(
+                [normalize_question_type(t) for t in question_types]
+            ))
+        if grade_level:
+            stmt = stmt.where(QuestionBankItem.grade_level == grade_level)
+
+        return stmt
+
+    @staticmethod
+    def select_questions(
+        questions: List[QuestionBankItem],
+        num_questions: int,
+        rng: random.Random
+    ) -> List[QuestionBankItem]:
+        """
+        Elige `num_questions` preguntas repartiéndolas entre los tipos disponibles
+        """
+        pools: Dict[str, List[QuestionBankItem]] = {}
+        for question in questions:
+            pools.setdefault(question.question_type, []).append(question)
+        for pool in pools.values():
+            rng.shuffle(pool)
+
+        selected: List[QuestionBankItem] = []
+        types = sorted(pools)
+        while len(selected) < num_questions and any(pools.values()):
+            for question_type in types:
+                if pools[question_type] and len(selected) < num_questions:
+                    selected.append(pools[question_type].pop())
+        return selected
+
+    @staticmethod
+    def build_variants(
+        questions: List[QuestionBankItem],
+        num_variants: int,
+        rng: random.Random,
+        title: str,
+        instructions: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Genera `num_variants` exámenes con las mismas preguntas en distinto orden y
+        con las opciones de selección múltiple barajadas.
+        """
+        variants = []
+        for index in range(num_variants):
+            label = VARIANT_LABELS[index % len(VARIANT_LABELS)]
+            order = list(questions)
+            rng.shuffle(order)
+
+            variant_questions = []
+            for number, item in enumerate(order, start=1):
+                question = {
+                    "id": number,
+                    "type": item.question_type,
+                    "question": item.question,
+                    "correct_answer": item.correct_answer,
+                    "points": item.points or 1
+                }
+                if item.options:
+                    options = list(item.options)
+                    rng.shuffle(options)
+                    question["options"] = options
+                variant_questions.append(question)
+
+            variants.append({
+                "title": f"{title} - Variante {label}" if num_variants > 1 else title,
+                "instructions": instructions or "Lee cuidadosamente cada pregunta y responde.",
+                "variant": label,
+                "question_bank_ids": [item.id for item in order],
+                "questions": variant_questions,
+                "total_points": sum(q["points"] for q in variant_questions)
+            })
+        return variants
+
+
+question_bank_service = QuestionBankService()
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import math
+import re
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+from sqlalchemy import Select, cast, event, func, inspect, literal_column, select
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.activity import Activity
+from ..utils.pagination import fetch_all
+from ..utils.text import strip_accents
+
+SEARCH_CONFIG = "spanish"
+
+# Claves del contenido que no aportan texto buscable (cuadrículas, posiciones, etc.)
+SKIP_CONTENT_KEYS = {
+    "grid", "solutions", "cells", "grid_size", "position", "direction",
+    "seed", "variant", "question_bank_ids", "unplaced",
+}
+
+SPANISH_STOPWORDS = frozenset("""
+a al algo algunas algunos ante antes como con contra cual cuando de del desde donde
+durante e el ella ellos en entre era es esa ese eso esta estas este esto estos fue ha
+hasta hay la las le les lo los mas me mi muy nada ni no nos o otra otras otro otros
+para pero poco por porque que quien se ser si sin sobre su sus tambien te todo todos
+tu un una uno unos y ya yo
+""".split())
+
+# Sufijos que se recortan (del más largo al más corto), solo si queda una raíz de 3+ letras
+SPANISH_SUFFIXES = (
+    "amientos", "imientos", "amiento", "imiento", "aciones", "uciones", "idades",
+    "mente", "acion", "ucion", "idad", "ismos", "istas", "ables", "ibles",
+    "ismo", "ista", "able", "ible", "osos", "osas", "oso", "osa", "es", "s",
+)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def extract_search_text(content: Any) -> str:
+    """
+    Texto buscable del contenido JSON de una actividad: preguntas, opciones,
+    diapositivas, cuentos, etc. Omite cuadrículas y datos de posición.
+    """
+    if isinstance(content, str):
+        try:
+            content = json.loads(content)
+        except (ValueError, TypeError):
+            return content
+
+    parts: List[str] = []
+
+    def walk(value: Any) -> None:
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key not in SKIP_CONTENT_KEYS:
+                    walk(item)
+        elif isinstance(value, list):
+            for item in value:
+                walk(item)
+        elif isinstance(value, str) and len(value.strip()) > 1:
+            parts.append(value.strip())
+
+    walk(content)
+    return "\n".join(parts)
+
+
+def stem(token: str) -> str:
+    """
+    Lematización ligera para español (plurales y sufijos derivativos comunes)
+    """
+    for suffix in SPANISH_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Términos normalizados de un texto: minúsculas, sin tildes, sin palabras vacías
+    """
+    return [
+        stem(token) for token in TOKEN_PATTERN.findall(strip_accents(text or "").lower())
+        if token not in SPANISH_STOPWORDS and not token.isdigit()
+    ]
+
+
+def search_vector_expression(title: Optional[str], subject: Optional[str], content_text: str):
+    """
+    Expresión SQL del tsvector de una actividad: título (A), materia (B) y contenido (C)
+    """
+    config = cast(SEARCH_CONFIG, REGCONFIG)
+
+    def weighted(text: Optional[str], weight: str):
+        # El peso va como literal: setweight espera "char" y no acepta un parámetro varchar
+        return func.setweight(func.to_tsvector(config, strip_accents(text or "")), literal_column(f"'{weight}'"))
+
+    return weighted(title, "A").op("||")(weighted(subject, "B")).op("||")(weighted(content_text, "C"))
+
+
+class InvertedIndex:
+    """
+    Índice invertido en memoria con ranking BM25 y pesos por campo.
+    Alternativa a tsvector para SQLite (desarrollo y pruebas).
+    """
+
+    FIELD_WEIGHTS = {"title": 3.0, "subject": 2.0, "content": 1.0}
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._terms: Dict[int, Set[str]] = {}
+        self._lengths: Dict[int, float] = {}
+        self._total_length = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def add(self, doc_id: int, fields: Dict[str, str]) -> None:
+        frequencies: Dict[str, float] = {}
+        length = 0.0
+        for field, text in fields.items():
+            weight = self.FIELD_WEIGHTS.get(field, 1.0)
+            for term in tokenize(text):
+                frequencies[term] = frequencies.get(term, 0.0) + weight
+                length += weight
+
+        with self._lock:
+            self._remove(doc_id)
+            for term, frequency in frequencies.items():
+                self._postings.setdefault(term, {})[doc_id] = frequency
+            self._terms[doc_id] = set(frequencies)
+            self._lengths[doc_id] = length
+            self._total_length += length
+
+    def remove(self, doc_id: int) -> None:
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: int) -> None:
+        for term in self._terms.pop(doc_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id, 0.0)
+
+    def search(self, text: str) -> List[Tuple[int, float]]:
+        """
+        Documentos que contienen todos los términos de la búsqueda, por relevancia
+        """
+        terms = set(tokenize(text))
+        if not terms:
+            return []
+
+        with self._lock:
+            postings = [self._postings.get(term, {}) for term in terms]
+            if not all(postings):
+                return []
+
+            postings.sort(key=len)
+            matches = set(postings[0])
+            for other in postings[1:]:
+                matches &= other.keys()
+
+            total_docs = len(self._terms)
+            average_length = self._total_length / max(1, total_docs)
+            scores: Dict[int, float] = {}
+            for term_postings in postings:
+                idf = math.log(1 + (total_docs - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+                for doc_id in matches:
+                    frequency = term_postings[doc_id]
+                    norm = self.K1 * (1 - self.B + self.B * self._lengths[doc_id] / max(average_length, 1.0))
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.K1 + 1) / (frequency + norm)
+
+        return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+
+
+class SearchService:
+    """
+    Búsqueda de texto completo sobre título, materia y contenido de las actividades.
+
+    En PostgreSQL usa la columna `search_vector` (tsvector con índice GIN, diccionario
+    español) y `ts_rank_cd`. En otros motores usa un índice invertido en memoria que
+    se construye al primer uso y se mantiene con los eventos del ORM de este proceso.
+    """
+
+    def __init__(self):
+        self.index = InvertedIndex()
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    @staticmethod
+    def uses_postgres(db) -> bool:
+        return db.get_bind().dialect.name == "postgresql"
+
+    async def search(self, db: AsyncSession, stmt: Select, text: str, skip: int = 0, limit: int = 20) -> list:
+        """
+        Aplica la búsqueda a un select de actividades ya filtrado por visibilidad
+        (de entidades o de columnas, con `id` incluido) y retorna la página pedida
+        ordenada por relevancia.
+        """
+        if self.uses_postgres(db):
+            ts_query = func.websearch_to_tsquery(cast(SEARCH_CONFIG, REGCONFIG), strip_accents(text))
+            return await fetch_all(db, stmt.where(Activity.search_vector.op("@@")(ts_query))
+                                   .order_by(func.ts_rank_cd(Activity.search_vector, ts_query).desc(),
+                                             Activity.id.desc())
+                                   .offset(skip)
+                                   .limit(limit))
+
+        await self._ensure_loaded(db)
+        ranked = [doc_id for doc_id, _ in self.index.search(text)]
+        if not ranked:
+            return []
+
+        visible = set(await db.scalars(stmt.with_only_columns(Activity.id).where(Activity.id.in_(ranked))))
+        page = [doc_id for doc_id in ranked if doc_id in visible][skip:skip + limit]
+        if not page:
+            return []
+
+        activities = {a.id: a for a in await fetch_all(db, stmt.where(Activity.id.in_(page)))}
+        return [activities[doc_id] for doc_id in page if doc_id in activities]
+
+    async def _ensure_loaded(self, db: AsyncSession) -> None:
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            rows = await db.stream(
+                select(Activity.id, Activity.title, Activity.subject, Activity.content)
+                .execution_options(yield_per=500)
+            )
+            async for row in rows:
+                self.index.add(row.id, self.document_fields(row))
+            self._loaded = True
+
+    @staticmethod
+    def document_fields(activity) -> Dict[str, str]:
+        return {
+            "title": activity.title or "",
+            "subject": activity.subject or "",
+            "content": extract_search_text(activity.content),
+        }
+
+
+search_service = SearchService()
+
+
+def _search_fields_changed(target: Activity) -> bool:
+    state = inspect(target)
+    return any(state.attrs[name].history.has_changes() for name in ("title", "subject", "content"))
+
+
+@event.listens_for(Activity, "before_insert")
+@event.listens_for(Activity, "before_update")
+def _update_search_vector(mapper, connection, target):
+    if connection.dialect.name != "postgresql":
+        return
+    if inspect(target).has_identity and not _search_fields_changed(target):
+        return
+    target.search_vector = search_vector_expression(
+        target.title, target.subject, extract_search_text(target.content)
+    )
+
+
+@event.listens_for(Activity, "after_insert")
+@event.listens_for(Activity, "after_update")
+def _update_memory_index(mapper, connection, target):
+    if connection.dialect.name == "postgresql" or not search_service._loaded:
+        return
+    if not _search_fields_changed(target):
+        return
+    search_service.index.add(target.id, SearchService.document_fields(target))
+
+
+@event.listens_for(Activity, "after_delete")
+def _remove_from_memory_index(mapper, connection, target):
+    if connection.dialect.name != "postgresql":
+        search_service.index.remove(target.id)
@@ -0,0 +1,243 @@
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import settings
+from ..database import AsyncSessionLocal, replica_router
+from ..models.user import User
+from ..models.usage import StatsSnapshot
+from .usage_service import usage_service
+
+DASHBOARD = "dashboard"
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite devuelve las fechas sin zona horaria: se guardan en UTC
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+async def compute_dashboard_stats(db: AsyncSession) -> Dict[str, Any]:
+    """
+    Estadísticas del panel de administración. Las cifras de actividades,
+    créditos y tokens salen de los agregados diarios (`usage_daily`).
+    """
+    total_users = await db.scalar(select(func.count(User.id)))
+    overall = await usage_service.totals(db)
+    today = await usage_service.totals(db, since=datetime.now(timezone.utc).date())
+    return {
+        "total_users": total_users,
+        "total_activities": overall["activities"],
+        "total_credits_used": overall["credits_used"],
+        "active_users_today": today["active_users"],
+        "activities_created_today": today["activities"],
+        "total_tokens_used": overall["tokens_used"],
+    }
+
+
+class Snapshot:
+    def __init__(self, data: Dict[str, Any], generated_at: datetime, etag: str = None):
+        self.data = data
+        self.generated_at = as_utc(generated_at)
+        # ETag débil: cambia solo si cambian las cifras, no con cada recálculo
+        self.etag = etag or 'W/"%s"' % hashlib.sha256(
+            json.dumps(data, sort_keys=True, default=str).encode()
+        ).hexdigest()[:32]
+
+    def age(self) -> float:
+        return (datetime.now(timezone.utc) - self.generated_at).total_seconds()
+
+
+class StatsSnapshotService:
+    """
+    Sirve estadísticas costosas desde memoria y las recalcula cada
+    STATS_SNAPSHOT_INTERVAL_SECONDS en una tarea de fondo. Con varios workers de
+    uvicorn la instantánea se comparte en `stats_snapshots`: el worker que toma
+    el lease de la fila la calcula y los demás la leen de ahí (una lectura por
+    clave primaria) en lugar de repetir las agregaciones.
+    """
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._builders: Dict[str, Callable[[AsyncSession], Awaitable[Dict[str, Any]]]] = {
+            DASHBOARD: compute_dashboard_stats,
+        }
+        self._snapshots: Dict[str, Snapshot] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _is_fresh(snapshot: Optional[Snapshot]) -> bool:
+        return snapshot is not None and snapshot.age() < settings.STATS_SNAPSHOT_INTERVAL_SECONDS
+
+    async def get(self, name: str = DASHBOARD, force: bool = False) -> Snapshot:
+        """
+        Instantánea vigente; se recalcula si está vencida (o si `force`)
+        """
+        snapshot = self._snapshots.get(name)
+        if not force and self._is_fresh(snapshot):
+            return snapshot
+        return await self.refresh(name, force=force)
+
+    async def refresh(self, name: str = DASHBOARD, force: bool = False) -> Snapshot:
+        """
+        Recalcula la instantánea coordinándose con los demás workers. Dentro del
+        proceso, las solicitudes simultáneas esperan a un único cálculo.
+        """
+        requested_at = datetime.now(timezone.utc)
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            snapshot = self._snapshots.get(name)
+            # Otra solicitud de este worker terminó de calcularla mientras se esperaba
+            if snapshot is not None and (snapshot.generated_at >= requested_at or (not force and self._is_fresh(snapshot))):
+                return snapshot
+
+            async with AsyncSessionLocal() as db:
+                stored = await self._load(db, name)
+                if not force and self._is_fresh(stored):
+                    return self._keep(name, stored)
+
+                if await self._acquire_lease(db, name):
+                    return self._keep(name, await self._compute_and_store(db, name))
+
+                # Otro worker la está calculando: mientras tanto se sirve la anterior,
+                # salvo que se haya pedido el recálculo o no haya ninguna
+                if stored is not None and not force:
+                    return self._keep(name, stored)
+                newer = await self._wait_for(db, name, after=stored.generated_at if stored else None)
+                if newer is not None:
+                    return self._keep(name, newer)
+                # Sin resultado a tiempo: se calcula aquí sin publicarla
+                return self._keep(name, Snapshot(await self._build(name, db), datetime.now(timezone.utc)))
+
+    def _keep(self, name: str, snapshot: Snapshot) -> Snapshot:
+        self._snapshots[name] = snapshot
+        return snapshot
+
+    @staticmethod
+    async def _load(db: AsyncSession, name: str) -> Optional[Snapshot]:
+        row = (await db.execute(
+            select(StatsSnapshot.payload, StatsSnapshot.etag, StatsSnapshot.generated_at)
+            .where(StatsSnapshot.name == name)
+        )).first()
+        await db.commit()
+        if row is None or row.generated_at is None:
+            return None
+        return Snapshot(row.payload, row.generated_at, row.etag)
+
+    async def _acquire_lease(self, db: AsyncSession, name: str) -> bool:
+        """
+        Toma el lease de la fila con un UPDATE condicional (o la crea): solo un
+        worker lo obtiene mientras no venza
+        """
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=settings.STATS_SNAPSHOT_LEASE_SECONDS)
+        taken = await db.scalar(
+            update(StatsSnapshot)
+            .where(
+                StatsSnapshot.name == name,
+                or_(StatsSnapshot.lease_expires_at.is_(None), StatsSnapshot.lease_expires_at < now)
+            )
+            .values(lease_owner=self.worker_id, lease_expires_at=expires_at)
+            .returning(StatsSnapshot.name)
+            .execution_options(synchronize_session=False)
+        )
+        if taken is None:
+            exists = await db.scalar(select(StatsSnapshot.name).where(StatsSnapshot.name == name))
+            if exists is not None:
+                await db.commit()
+                return False
+            db.add(StatsSnapshot(name=name, lease_owner=self.worker_id, lease_expires_at=expires_at))
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Otro worker creó la fila al mismo tiempo
+            await db.rollback()
+            return False
+        return True
+
+    async def _build(self, name: str, db: AsyncSession) -> Dict[str, Any]:
+        # Las agregaciones van a una réplica de lectura si hay alguna sana
+        replica = await replica_router.choose()
+        if replica is None:
+            return await self._builders[name](db)
+        async with AsyncSessionLocal(bind=replica.engine) as replica_db:
+            return await self._builders[name](replica_db)
+
+    async def _compute_and_store(self, db: AsyncSession, name: str) -> Snapshot:
+        try:
+            snapshot = Snapshot(await self._build(name, db), datetime.now(timezone.utc))
+        except Exception:
+            await db.rollback()
+            await self._release_lease(db, name)
+            raise
+        await db.execute(
+            update(StatsSnapshot)
+            .where(StatsSnapshot.name == name)
+            .values(
+                payload=snapshot.data, etag=snapshot.etag, generated_at=snapshot.generated_at,
+                lease_owner=None, lease_expires_at=None
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return snapshot
+
+    async def _release_lease(self, db: AsyncSession, name: str) -> None:
+        await db.execute(
+            update(StatsSnapshot)
+            .where(StatsSnapshot.name == name, StatsSnapshot.lease_owner == self.worker_id)
+            .values(lease_owner=None, lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+    async def _wait_for(self, db: AsyncSession, name: str, after: Optional[datetime]) -> Optional[Snapshot]:
+        """
+        Espera (hasta la duración del lease) a que otro worker publique una
+        instantánea posterior a `after`
+        """
+        deadline = asyncio.get_running_loop().time() + settings.STATS_SNAPSHOT_LEASE_SECONDS
+        while asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.2)
+            stored = await self._load(db, name)
+            if stored is not None and (after is None or stored.generated_at > as_utc(after)):
+                return stored
+        return None
+
+    async def run(self) -> None:
+        """
+        Bucle de fondo: mantiene las instantáneas vigentes. Revisa dos veces por
+        intervalo para que las solicitudes casi nunca encuentren una vencida.
+        """
+        while True:
+            for name in self._builders:
+                try:
+                    await self.refresh(name)
+                except Exception as e:
+                    print(f"Error al recalcular las estadísticas '{name}': {e}")
+            await asyncio.sleep(settings.STATS_SNAPSHOT_INTERVAL_SECONDS / 2)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+stats_snapshot_service = StatsSnapshotService()
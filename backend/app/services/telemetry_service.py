@@ -0,0 +1,229 @@
+import asyncio
+import json
+import time
+import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import delete, insert, update
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models.usage import GenerationEvent
+from .analytics_service import current_generation, activity_type_key
+
+# Campos de tiempo de Ollama (nanosegundos) y su columna en milisegundos
+OLLAMA_DURATIONS = {
+    "total_duration": "total_duration_ms",
+    "load_duration": "load_duration_ms",
+    "prompt_eval_duration": "prompt_eval_duration_ms",
+    "eval_duration": "eval_duration_ms",
+}
+
+# Espera por un turno de concurrencia de la llamada en curso (ver `queued`)
+current_queue_wait: ContextVar[Optional[float]] = ContextVar("current_queue_wait", default=None)
+
+
+@asynccontextmanager
+async def queued(semaphore: asyncio.Semaphore):
+    """
+    `async with semaphore` que registra cuánto se esperó el turno, para la
+    telemetría de la llamada que se hace dentro
+    """
+    started = time.perf_counter()
+    async with semaphore:
+        token = current_queue_wait.set(time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            current_queue_wait.reset(token)
+
+
+def parses_as_json(content: Any) -> bool:
+    if not isinstance(content, str):
+        return isinstance(content, (dict, list))
+    try:
+        json.loads(content)
+        return True
+    except ValueError:
+        return False
+
+
+class GenerationTelemetry:
+    """
+    Eventos de telemetría de las llamadas al modelo. Se acumulan en memoria y se
+    insertan en lote (un INSERT multi-fila cada ANALYTICS_FLUSH_SECONDS o al
+    llegar a TELEMETRY_BATCH_SIZE), así no añaden commits a las solicitudes. Los
+    eventos de una generación se enlazan con su actividad o mensaje con `link`;
+    si ya se habían volcado, el enlace se aplica en el siguiente volcado.
+    """
+
+    def __init__(self):
+        self._events: List[Dict[str, Any]] = []
+        self._links: Dict[str, Dict[str, int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Task] = None
+        self._pruned_at = 0.0
+
+    def record(
+        self,
+        provider,
+        model: str,
+        latency_seconds: float = 0.0,
+        error: Optional[BaseException] = None,
+        result: Optional[Dict[str, Any]] = None,
+        cache_hit: bool = False,
+        json_ok: Optional[bool] = None
+    ) -> None:
+        """
+        Registra una llamada (solo en memoria, sin E/S)
+        """
+        if not settings.TELEMETRY_ENABLED:
+            return
+        context = current_generation.get()
+        result = result or {}
+        queue_wait = current_queue_wait.get()
+        event = {
+            "event_id": uuid.uuid4().hex,
+            "created_at": datetime.now(timezone.utc) - timedelta(seconds=latency_seconds),
+            "user_id": context.user_id if context else None,
+            "activity_type": activity_type_key(context),
+            "activity_id": None,
+            "chat_message_id": None,
+            "ai_provider": getattr(provider, "value", provider) or "",
+            "model": model or "",
+            "success": error is None,
+            "error": f"{type(error).__name__}: {error}"[:500] if error is not None else None,
+            "cache_hit": cache_hit,
+            "json_ok": json_ok,
+            "latency_ms": None if cache_hit else int(latency_seconds * 1000),
+            "queue_wait_ms": int(queue_wait * 1000) if queue_wait is not None else None,
+            "tokens_in": result.get("tokens_in"),
+            "tokens_out": result.get("tokens_out"),
+            "credits_used": result.get("credits_used"),
+            "usage": result.get("usage"),
+        }
+        usage = result.get("usage") or {}
+        for field, column in OLLAMA_DURATIONS.items():
+            value = usage.get(field)
+            event[column] = value / 1e6 if isinstance(value, (int, float)) else None
+
+        self._events.append(event)
+        self._trim()
+        if context is not None:
+            context.events.append(event)
+        if len(self._events) >= settings.TELEMETRY_BATCH_SIZE and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.get_running_loop().create_task(self._flush_logged())
+
+    def _trim(self) -> None:
+        """
+        Descarta los eventos más antiguos por encima de TELEMETRY_MAX_BUFFERED
+        (p. ej. si la base de datos no responde durante mucho tiempo)
+        """
+        excess = len(self._events) - settings.TELEMETRY_MAX_BUFFERED
+        if excess > 0:
+            del self._events[:excess]
+            print(f"Telemetría de generación: se descartaron {excess} eventos sin guardar (búfer lleno)")
+
+    def link(self, activity_id: Optional[int] = None, chat_message_id: Optional[int] = None) -> None:
+        """
+        Enlaza los eventos de la generación en curso con la actividad o el
+        mensaje que produjo
+        """
+        context = current_generation.get()
+        if context is None:
+            return
+        values = {
+            name: value for name, value in
+            (("activity_id", activity_id), ("chat_message_id", chat_message_id)) if value is not None
+        }
+        if not values:
+            return
+        for event in context.events:
+            if event.get("flushed"):
+                self._links.setdefault(event["event_id"], {}).update(values)
+            else:
+                event.update(values)
+        context.events = []
+
+    async def flush(self) -> int:
+        """
+        Inserta los eventos pendientes en un solo INSERT multi-fila y aplica los
+        enlaces pendientes. Retorna los eventos insertados.
+        """
+        events, self._events = self._events, []
+        links, self._links = self._links, {}
+        # Se construyen las filas antes de cualquier await: los enlaces posteriores van a `links`
+        rows = []
+        for event in events:
+            event["flushed"] = True
+            rows.append({key: value for key, value in event.items() if key != "flushed"})
+
+        if rows or links:
+            try:
+                async with AsyncSessionLocal() as db:
+                    if rows:
+                        await db.execute(insert(GenerationEvent), rows)
+                    for event_id, values in links.items():
+                        await db.execute(
+                            update(GenerationEvent)
+                            .where(GenerationEvent.event_id == event_id)
+                            .values(**values)
+                            .execution_options(synchronize_session=False)
+                        )
+                    await db.commit()
+            except Exception:
+                # Se conservan para el siguiente intento
+                for event in events:
+                    event.pop("flushed", None)
+                self._events[:0] = events
+                self._trim()
+                for event_id, values in links.items():
+                    self._links.setdefault(event_id, {}).update(values)
+                raise
+
+        if time.monotonic() - self._pruned_at > 600:
+            self._pruned_at = time.monotonic()
+            await self.prune()
+        return len(rows)
+
+    @staticmethod
+    async def prune() -> None:
+        """
+        Elimina los eventos más antiguos que TELEMETRY_RETENTION_DAYS
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(days=settings.TELEMETRY_RETENTION_DAYS)
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(GenerationEvent).where(GenerationEvent.created_at < cutoff))
+            await db.commit()
+
+    async def _flush_logged(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Error al guardar la telemetría de generación: {e}")
+
+    async def run(self) -> None:
+        """
+        Bucle de fondo: vuelca los eventos cada ANALYTICS_FLUSH_SECONDS
+        """
+        while True:
+            await asyncio.sleep(settings.ANALYTICS_FLUSH_SECONDS)
+            await self._flush_logged()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+generation_telemetry = GenerationTelemetry()
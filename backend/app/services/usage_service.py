@@ -0,0 +1,185 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.activity import Activity, ActivityType, AIProvider
+from ..models.credit import CreditTransaction, TransactionType
+from ..models.usage import UsageDaily, NO_PROVIDER
+from ..utils.upsert import add_counters
+
+BUCKET_COLUMNS = ("day", "user_id", "ai_provider", "activity_type")
+
+# Columnas por las que se puede desglosar la serie diaria
+GROUP_COLUMNS = {
+    "provider": UsageDaily.ai_provider,
+    "activity_type": UsageDaily.activity_type,
+    "user": UsageDaily.user_id,
+}
+
+
+def provider_key(provider) -> str:
+    """
+    Valor de `ai_provider` en los agregados: el del enum, o NO_PROVIDER si la
+    actividad no llamó al modelo
+    """
+    if provider is None:
+        return NO_PROVIDER
+    return provider.value if isinstance(provider, AIProvider) else str(provider).lower()
+
+
+def as_date(value) -> date:
+    # SQLite devuelve func.date() como texto ISO
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+class UsageService:
+    """
+    Agregados diarios de consumo (`usage_daily`). Cada generación suma sus
+    contadores a la fila de su día, usuario, proveedor y tipo con un upsert, así
+    el costo de las estadísticas depende del número de días y no del historial.
+    """
+
+    async def record(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        activity_type: ActivityType,
+        provider=None,
+        activities: int = 1,
+        credits_used: int = 0,
+        tokens_used: int = 0,
+        day: Optional[date] = None
+    ) -> None:
+        """
+        Suma una generación (o varias actividades) al agregado del día. No hace
+        commit: se confirma en la misma transacción que guarda la actividad.
+        """
+        bucket = {
+            "day": day or datetime.now(timezone.utc).date(),
+            "user_id": user_id,
+            "ai_provider": provider_key(provider),
+            "activity_type": activity_type,
+        }
+        counters = {"activities": activities, "credits_used": credits_used or 0, "tokens_used": tokens_used or 0}
+        await add_counters(db, UsageDaily, bucket, counters)
+
+    async def totals(self, db: AsyncSession, since: Optional[date] = None) -> Dict[str, int]:
+        """
+        Actividades, créditos, tokens y usuarios activos acumulados (desde `since`)
+        """
+        stmt = select(
+            func.coalesce(func.sum(UsageDaily.activities), 0),
+            func.coalesce(func.sum(UsageDaily.credits_used), 0),
+            func.coalesce(func.sum(UsageDaily.tokens_used), 0),
+            func.count(func.distinct(UsageDaily.user_id)),
+        )
+        if since is not None:
+            stmt = stmt.where(UsageDaily.day >= since)
+        activities, credits_used, tokens_used, active_users = (await db.execute(stmt)).one()
+        return {
+            "activities": activities,
+            "credits_used": credits_used,
+            "tokens_used": tokens_used,
+            "active_users": active_users,
+        }
+
+    async def daily_series(
+        self,
+        db: AsyncSession,
+        start: date,
+        end: date,
+        group_by: Optional[str] = None,
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Serie diaria entre `start` y `end` (inclusive), total o desglosada por
+        proveedor, tipo de actividad o usuario. La serie total incluye los días sin
+        consumo con contadores en cero.
+        """
+        columns = [UsageDaily.day]
+        if group_by:
+            columns.append(GROUP_COLUMNS[group_by].label("key"))
+        stmt = select(
+            *columns,
+            func.sum(UsageDaily.activities).label("activities"),
+            func.sum(UsageDaily.credits_used).label("credits_used"),
+            func.sum(UsageDaily.tokens_used).label("tokens_used"),
+            func.count(func.distinct(UsageDaily.user_id)).label("active_users"),
+        ).where(UsageDaily.day >= start, UsageDaily.day <= end)
+        if user_id is not None:
+            stmt = stmt.where(UsageDaily.user_id == user_id)
+        stmt = stmt.group_by(*columns).order_by(*columns)
+
+        points = [dict(row._mapping) for row in await db.execute(stmt)]
+        for point in points:
+            point["day"] = as_date(point["day"])
+            if isinstance(point.get("key"), ActivityType):
+                point["key"] = point["key"].value
+        if group_by:
+            return points
+
+        by_day = {point["day"]: point for point in points}
+        empty = {"activities": 0, "credits_used": 0, "tokens_used": 0, "active_users": 0}
+        return [
+            by_day.get(start + timedelta(days=offset), {"day": start + timedelta(days=offset), **empty})
+            for offset in range((end - start).days + 1)
+        ]
+
+    async def rebuild(self, db: AsyncSession, since: Optional[date] = None) -> int:
+        """
+        Recalcula los agregados (desde `since`, o todos) a partir de las actividades
+        y sus movimientos de créditos: sirve para poblar la tabla con el historial
+        existente o repararla. Los tokens no se guardan por actividad, así que se
+        conservan los ya agregados. Hace commit. Retorna el número de filas.
+        """
+        kept_tokens = select(
+            *(getattr(UsageDaily, column) for column in BUCKET_COLUMNS), UsageDaily.tokens_used
+        )
+        if since is not None:
+            kept_tokens = kept_tokens.where(UsageDaily.day >= since)
+        tokens = {tuple(row[:4]): row.tokens_used for row in await db.execute(kept_tokens)}
+
+        charged = select(
+            CreditTransaction.activity_id,
+            func.sum(-CreditTransaction.amount).label("credits")
+        ).where(
+            CreditTransaction.transaction_type == TransactionType.USAGE,
+            CreditTransaction.activity_id.isnot(None)
+        ).group_by(CreditTransaction.activity_id).subquery()
+
+        day = func.date(Activity.created_at)
+        stmt = select(
+            day.label("day"),
+            Activity.creator_id,
+            Activity.ai_provider,
+            Activity.activity_type,
+            func.count(Activity.id).label("activities"),
+            func.coalesce(func.sum(charged.c.credits), 0).label("credits_used"),
+        ).outerjoin(charged, charged.c.activity_id == Activity.id)\
+            .where(Activity.creator_id.isnot(None))\
+            .group_by(day, Activity.creator_id, Activity.ai_provider, Activity.activity_type)
+        if since is not None:
+            stmt = stmt.where(Activity.created_at >= datetime.combine(since, time.min))
+
+        rows = {
+            (as_date(row.day), row.creator_id, provider_key(row.ai_provider), row.activity_type):
+                {"activities": row.activities, "credits_used": row.credits_used}
+            for row in await db.execute(stmt)
+        }
+
+        delete_stmt = delete(UsageDaily)
+        if since is not None:
+            delete_stmt = delete_stmt.where(UsageDaily.day >= since)
+        await db.execute(delete_stmt)
+
+        values = [
+            {**dict(zip(BUCKET_COLUMNS, key)), **counters, "tokens_used": tokens.get(key, 0)}
+            for key, counters in rows.items()
+        ]
+        if values:
+            await db.execute(insert(UsageDaily), values)
+        await db.commit()
+        return len(values)
+
+
+usage_service = UsageService()
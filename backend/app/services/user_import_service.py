@@ -0,0 +1,240 @@
+import asyncio
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from pydantic import ValidationError
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import settings
+from ..models.credit import CreditTransaction, TransactionType
+from ..models.user import User, UserRole
+from ..schemas.user import UserImportRow
+from ..utils.auth import get_password_hash
+from .user_search_service import user_search_service, user_search_text
+
+REQUIRED_COLUMNS = ("email", "username", "password")
+
+# Roles que se pueden crear por importación (los administradores se crean uno a uno)
+IMPORTABLE_ROLES = (UserRole.ESTUDIANTE, UserRole.DOCENTE)
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """
+    Hashes bcrypt de un lote de contraseñas (se ejecuta en un proceso del pool)
+    """
+    return [get_password_hash(password) for password in passwords]
+
+
+class ImportReport:
+    def __init__(self, dry_run: bool = False):
+        self.dry_run = dry_run
+        self.total_rows = 0
+        self.created = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def error(self, row: int, message: str, email: Optional[str] = None) -> None:
+        self.errors.append({"row": row, "email": email, "error": message})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total_rows": self.total_rows,
+            "created": self.created,
+            "failed": len(self.errors),
+            "dry_run": self.dry_run,
+            "errors": sorted(self.errors, key=lambda error: error["row"]),
+        }
+
+
+class UserImportService:
+    """
+    Alta masiva de usuarios desde un CSV (email, username, password y, opcionales,
+    full_name y role). El archivo se procesa por lotes de USER_IMPORT_BATCH_SIZE
+    filas: se validan, se descartan los duplicados (en el archivo o ya
+    registrados), los hashes bcrypt se calculan en paralelo en un pool de
+    procesos y los usuarios y sus transacciones de créditos iniciales se
+    insertan con un INSERT multi-fila por tabla y un commit por lote. Las filas
+    con errores se reportan sin detener la importación.
+    """
+
+    async def import_csv(self, db: AsyncSession, lines: Iterable[str], dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Importa los usuarios de un CSV (iterable de líneas, p. ej. un archivo
+        abierto en modo texto). Con `dry_run` solo valida.
+        """
+        report = ImportReport(dry_run)
+        reader = csv.DictReader(lines)
+        columns = {(name or "").strip().lower() for name in reader.fieldnames or []}
+        missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+        if missing:
+            report.error(1, f"Faltan columnas obligatorias: {', '.join(missing)}")
+            return report.as_dict()
+
+        seen_emails, seen_usernames = set(), set()
+        workers = settings.USER_IMPORT_HASH_WORKERS or os.cpu_count() or 1
+        pool = None if dry_run else ProcessPoolExecutor(max_workers=workers)
+        try:
+            for batch in self._batches(reader, report):
+                valid = self._validate(batch, report, seen_emails, seen_usernames)
+                valid = await self._drop_existing(db, valid, report)
+                if valid and pool is not None:
+                    await self._insert(db, valid, pool, workers, report)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return report.as_dict()
+
+    @staticmethod
+    def _batches(reader: csv.DictReader, report: ImportReport) -> Iterator[List[Dict[str, Any]]]:
+        batch = []
+        for record in reader:
+            report.total_rows += 1
+            if report.total_rows > settings.USER_IMPORT_MAX_ROWS:
+                report.total_rows -= 1
+                report.error(
+                    reader.line_num,
+                    f"El archivo supera el máximo de {settings.USER_IMPORT_MAX_ROWS} filas: no se procesó el resto"
+                )
+                break
+            row = {(key or "").strip().lower(): (value or "").strip() for key, value in record.items() if key}
+            row["_line"] = reader.line_num
+            batch.append(row)
+            if len(batch) >= settings.USER_IMPORT_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _validate(
+        batch: List[Dict[str, Any]],
+        report: ImportReport,
+        seen_emails: set,
+        seen_usernames: set
+    ) -> List[Dict[str, Any]]:
+        valid = []
+        for row in batch:
+            line = row["_line"]
+            try:
+                user = UserImportRow(
+                    email=row.get("email"),
+                    username=row.get("username"),
+                    password=row.get("password"),
+                    full_name=row.get("full_name") or None,
+                    role=row.get("role") or UserRole.ESTUDIANTE,
+                )
+            except ValidationError as e:
+                first = e.errors()[0]
+                field = ".".join(str(part) for part in first["loc"])
+                report.error(line, f"{field}: {first['msg']}", row.get("email") or None)
+                continue
+
+            if user.role not in IMPORTABLE_ROLES:
+                report.error(line, f"Rol no permitido en la importación: {user.role.value}", user.email)
+            elif user.email.lower() in seen_emails:
+                report.error(line, "Email repetido en el archivo", user.email)
+            elif user.username.lower() in seen_usernames:
+                report.error(line, "Nombre de usuario repetido en el archivo", user.email)
+            else:
+                seen_emails.add(user.email.lower())
+                seen_usernames.add(user.username.lower())
+                valid.append({**user.model_dump(), "_line": line})
+        return valid
+
+    @staticmethod
+    async def _drop_existing(db: AsyncSession, rows: List[Dict[str, Any]], report: ImportReport) -> List[Dict[str, Any]]:
+        """
+        Descarta las filas cuyo email o nombre de usuario ya está registrado
+        (una consulta por lote)
+        """
+        if not rows:
+            return rows
+        existing = (await db.execute(
+            select(User.email, User.username).where(or_(
+                User.email.in_([row["email"] for row in rows]),
+                User.username.in_([row["username"] for row in rows])
+            ))
+        )).all()
+        await db.commit()
+        emails = {email for email, _ in existing}
+        usernames = {username for _, username in existing}
+
+        remaining = []
+        for row in rows:
+            if row["email"] in emails:
+                report.error(row["_line"], "El email ya está registrado", row["email"])
+            elif row["username"] in usernames:
+                report.error(row["_line"], "El nombre de usuario ya está en uso", row["email"])
+            else:
+                remaining.append(row)
+        return remaining
+
+    async def _insert(
+        self,
+        db: AsyncSession,
+        rows: List[Dict[str, Any]],
+        pool: ProcessPoolExecutor,
+        workers: int,
+        report: ImportReport
+    ) -> None:
+        # Hashes en paralelo: un trozo del lote por proceso (en un reintento ya están calculados)
+        pending = [row for row in rows if "_hash" not in row]
+        if pending:
+            loop = asyncio.get_running_loop()
+            size = max(1, -(-len(pending) // workers))
+            chunks = [pending[i:i + size] for i in range(0, len(pending), size)]
+            hashed = await asyncio.gather(*(
+                loop.run_in_executor(pool, hash_passwords, [row["password"] for row in chunk]) for chunk in chunks
+            ))
+            for chunk, hashes in zip(chunks, hashed):
+                for row, password_hash in zip(chunk, hashes):
+                    row["_hash"] = password_hash
+
+        users = [
+            {
+                "email": row["email"],
+                "username": row["username"],
+                "full_name": row["full_name"],
+                "hashed_password": row["_hash"],
+                "role": row["role"],
+                "is_active": True,
+                "credits": settings.INITIAL_CREDITS,
+                "held_credits": 0,
+                # La inserción masiva no dispara los eventos del ORM que la calculan
+                "search_text": user_search_text(row["email"], row["username"], row["full_name"]),
+            }
+            for row in rows
+        ]
+        try:
+            created = (await db.execute(
+                insert(User).returning(User.id, User.email, sort_by_parameter_order=True), users
+            )).all()
+            if settings.INITIAL_CREDITS:
+                await db.execute(insert(CreditTransaction), [
+                    {
+                        "user_id": user_id,
+                        "amount": settings.INITIAL_CREDITS,
+                        "transaction_type": TransactionType.INITIAL,
+                        "description": "Créditos iniciales",
+                        "balance_after": settings.INITIAL_CREDITS,
+                    }
+                    for user_id, _ in created
+                ])
+            await db.commit()
+        except IntegrityError as e:
+            await db.rollback()
+            # Otra solicitud registró alguno de estos usuarios mientras se calculaban los hashes
+            remaining = await self._drop_existing(db, rows, report)
+            if len(remaining) == len(rows):
+                for row in rows:
+                    report.error(row["_line"], f"Error al guardar el lote: {e.orig}", row["email"])
+            elif remaining:
+                await self._insert(db, remaining, pool, workers, report)
+            return
+
+        report.created += len(created)
+        user_search_service.index_users(db, [{**user, "id": user_id} for user, (user_id, _) in zip(users, created)])
+
+
+user_import_service = UserImportService()
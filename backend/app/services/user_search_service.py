@@ -0,0 +1,250 @@
+import asyncio
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import Select, event, func, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.user import User
+from ..utils.pagination import fetch_all
+from ..utils.text import strip_accents
+
+# Umbral de word_similarity para coincidencias aproximadas (el de pg_trgm por defecto)
+WORD_SIMILARITY_THRESHOLD = 0.6
+
+# Campos de la cuenta que se buscan
+SEARCH_FIELDS = ("email", "username", "full_name")
+
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+
+def normalize(text: Optional[str]) -> str:
+    """
+    Minúsculas y sin tildes, para búsquedas que no distinguen acentos
+    """
+    return strip_accents(text or "").lower().strip()
+
+
+def user_search_text(email: Optional[str], username: Optional[str], full_name: Optional[str]) -> str:
+    """
+    Texto de búsqueda de un usuario (columna `search_text`)
+    """
+    return " ".join(normalize(value) for value in (email, username, full_name) if value)
+
+
+def word_trigrams(text: str) -> List[Set[str]]:
+    """
+    Trigramas de cada palabra de un texto normalizado, como los calcula pg_trgm:
+    cada palabra alfanumérica se rellena con dos espacios delante y uno detrás
+    """
+    grams = []
+    for word in WORD_PATTERN.findall(text):
+        padded = f"  {word} "
+        grams.append({padded[i:i + 3] for i in range(len(padded) - 2)})
+    return grams
+
+
+def trigrams(text: str) -> Set[str]:
+    return set().union(*word_trigrams(text))
+
+
+def word_similarity(query_grams: Set[str], words: List[Set[str]]) -> float:
+    """
+    word_similarity de pg_trgm: la mayor proporción de los trigramas de la
+    búsqueda presentes en un tramo de palabras consecutivas del texto
+    """
+    if not query_grams:
+        return 0.0
+    best = 0
+    for start in range(len(words)):
+        extent: Set[str] = set()
+        for grams in words[start:]:
+            extent |= grams
+            best = max(best, len(query_grams & extent))
+            if best == len(query_grams):
+                return 1.0
+    return best / len(query_grams)
+
+
+def like_pattern(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class TrigramIndex:
+    """
+    Índice de trigramas en memoria. Alternativa a pg_trgm para SQLite
+    (desarrollo y pruebas).
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = {}
+        self._texts: Dict[int, str] = {}
+        self._grams: Dict[int, List[Set[str]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def add(self, doc_id: int, text: str) -> None:
+        grams = word_trigrams(text)
+        with self._lock:
+            self._remove(doc_id)
+            for gram in set().union(*grams):
+                self._postings.setdefault(gram, set()).add(doc_id)
+            self._texts[doc_id] = text
+            self._grams[doc_id] = grams
+
+    def remove(self, doc_id: int) -> None:
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: int) -> None:
+        for gram in set().union(*self._grams.pop(doc_id, ())):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self._postings[gram]
+        self._texts.pop(doc_id, None)
+
+    def search(self, query: str) -> List[Tuple[int, float]]:
+        """
+        Documentos que contienen la búsqueda o se le parecen (word_similarity),
+        por similitud
+        """
+        query_grams = trigrams(query)
+        with self._lock:
+            if any(len(word) >= 3 for word in WORD_PATTERN.findall(query)):
+                # Toda coincidencia de subcadena comparte al menos un trigrama interior
+                candidates: Dict[int, int] = {}
+                for gram in query_grams:
+                    for doc_id in self._postings.get(gram, ()):
+                        candidates[doc_id] = candidates.get(doc_id, 0) + 1
+                # Cota superior de la similitud: se descartan sin calcularla
+                candidate_ids = [
+                    doc_id for doc_id, count in candidates.items()
+                    if count >= WORD_SIMILARITY_THRESHOLD * len(query_grams) or query in self._texts[doc_id]
+                ]
+            else:
+                # Búsquedas muy cortas: sin trigramas útiles, se recorre todo (como en PostgreSQL)
+                candidate_ids = list(self._texts)
+
+            scores: Dict[int, float] = {}
+            for doc_id in candidate_ids:
+                score = word_similarity(query_grams, self._grams[doc_id])
+                if score >= WORD_SIMILARITY_THRESHOLD or query in self._texts[doc_id]:
+                    scores[doc_id] = score
+
+        return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+
+
+class UserSearchService:
+    """
+    Búsqueda de usuarios por correo, nombre de usuario y nombre completo, sin
+    distinguir mayúsculas ni acentos y tolerante a errores de tipeo.
+
+    En PostgreSQL usa la columna `search_text` con un índice GIN de pg_trgm:
+    coincidencias de subcadena (LIKE) o aproximadas (`%>`, word_similarity),
+    ordenadas por similitud. En otros motores usa un índice de trigramas en
+    memoria que se construye al primer uso y se mantiene con los eventos del ORM
+    de este proceso.
+    """
+
+    def __init__(self):
+        self.index = TrigramIndex()
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    @staticmethod
+    def uses_postgres(db) -> bool:
+        return db.get_bind().dialect.name == "postgresql"
+
+    async def search(self, db: AsyncSession, stmt: Select, text: str, skip: int = 0, limit: int = 20) -> List[User]:
+        """
+        Aplica la búsqueda a un select de usuarios y retorna la página pedida
+        ordenada por relevancia
+        """
+        query = normalize(text)
+        if not query:
+            return []
+
+        if self.uses_postgres(db):
+            return await fetch_all(db, self.postgres_statement(stmt, query).offset(skip).limit(limit))
+
+        await self._ensure_loaded(db)
+        ranked = [doc_id for doc_id, _ in self.index.search(query)]
+        if not ranked:
+            return []
+
+        visible = set(await db.scalars(stmt.with_only_columns(User.id).where(User.id.in_(ranked))))
+        page = [doc_id for doc_id in ranked if doc_id in visible][skip:skip + limit]
+        if not page:
+            return []
+
+        users = {user.id: user for user in await fetch_all(db, stmt.where(User.id.in_(page)))}
+        return [users[doc_id] for doc_id in page if doc_id in users]
+
+    @staticmethod
+    def postgres_statement(stmt: Select, query: str) -> Select:
+        """
+        Filtro y orden de la búsqueda en PostgreSQL; ambas condiciones usan el
+        índice GIN de trigramas de `search_text`
+        """
+        return stmt.where(
+            User.search_text.like(like_pattern(query), escape="\\") | User.search_text.op("%>")(query)
+        ).order_by(func.word_similarity(query, User.search_text).desc(), User.id.desc())
+
+    def index_users(self, db, users) -> None:
+        """
+        Agrega al índice en memoria usuarios insertados sin pasar por el ORM
+        (inserciones masivas), que no disparan los eventos
+        """
+        if self.uses_postgres(db) or not self._loaded:
+            return
+        for user in users:
+            self.index.add(user["id"], user_search_text(user["email"], user["username"], user.get("full_name")))
+
+    async def _ensure_loaded(self, db: AsyncSession) -> None:
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            rows = await db.stream(
+                select(User.id, User.email, User.username, User.full_name).execution_options(yield_per=1000)
+            )
+            async for row in rows:
+                self.index.add(row.id, user_search_text(row.email, row.username, row.full_name))
+            self._loaded = True
+
+
+user_search_service = UserSearchService()
+
+
+def _search_fields_changed(target: User) -> bool:
+    state = inspect(target)
+    return any(state.attrs[name].history.has_changes() for name in SEARCH_FIELDS)
+
+
+@event.listens_for(User, "before_insert")
+@event.listens_for(User, "before_update")
+def _update_search_text(mapper, connection, target):
+    if inspect(target).has_identity and not _search_fields_changed(target):
+        return
+    target.search_text = user_search_text(target.email, target.username, target.full_name)
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+def _update_memory_index(mapper, connection, target):
+    if connection.dialect.name == "postgresql" or not user_search_service._loaded:
+        return
+    if not _search_fields_changed(target):
+        return
+    user_search_service.index.add(target.id, user_search_text(target.email, target.username, target.full_name))
+
+
+@event.listens_for(User, "after_delete")
+def _remove_from_memory_index(mapper, connection, target):
+    if connection.dialect.name != "postgresql":
+        user_search_service.index.remove(target.id)
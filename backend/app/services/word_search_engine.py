@@ -0,0 +1,163 @@
+import unicodedata
+from typing import Dict, Any, List, Optional
+import numpy as np
+
+# Letras usadas para rellenar la cuadrícula (alfabeto español)
+ALPHABET = "ABCDEFGHIJKLMNÑOPQRSTUVWXYZ"
+
+# Direcciones disponibles: (delta fila, delta columna)
+DIRECTIONS = {
+    "horizontal": (0, 1),
+    "vertical": (1, 0),
+    "diagonal": (1, 1),
+    "diagonal_up": (-1, 1),
+    "horizontal_reverse": (0, -1),
+    "vertical_reverse": (-1, 0),
+    "diagonal_reverse": (-1, -1),
+    "diagonal_up_reverse": (1, -1),
+}
+
+DEFAULT_DIRECTIONS = ["horizontal", "vertical", "diagonal", "diagonal_up"]
+
+
+def normalize_word(word: str) -> str:
+    """
+    Convierte una palabra al formato de la cuadrícula: mayúsculas, sin tildes
+    (conservando la Ñ) y sin espacios ni signos.
+    """
+    letters = []
+    for char in word.upper():
+        if char == "Ñ":
+            letters.append(char)
+            continue
+        base = unicodedata.normalize("NFD", char)[0]
+        if base in ALPHABET:
+            letters.append(base)
+    return "".join(letters)
+
+
+class WordSearchEngine:
+    """
+    Construye sopas de letras de forma local y determinista (dada una semilla).
+
+    La cuadrícula se representa como una matriz NumPy de códigos de carácter
+    (0 = celda vacía). Para cada palabra se evalúan de forma vectorizada todas las
+    posiciones de inicio en cada dirección permitida y se elige una al azar entre
+    las válidas, priorizando opcionalmente las que comparten más letras con
+    palabras ya colocadas.
+    """
+
+    def build(
+        self,
+        words: List[str],
+        size: int,
+        directions: Optional[List[str]] = None,
+        prefer_overlap: bool = True,
+        seed: Optional[int] = None,
+        max_words: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Coloca las palabras en una cuadrícula de `size` x `size` y rellena el resto.
+
+        Retorna la cuadrícula, la posición de cada palabra colocada (`solutions`) y
+        las palabras que no cupieron (`unplaced`).
+        """
+        directions = [d for d in (directions or DEFAULT_DIRECTIONS) if d in DIRECTIONS]
+        if not directions:
+            raise ValueError(f"Direcciones no válidas. Opciones: {', '.join(DIRECTIONS)}")
+
+        rng = np.random.default_rng(seed)
+        grid = np.zeros((size, size), dtype=np.int32)
+        solutions: List[Dict[str, Any]] = []
+        unplaced: List[str] = []
+        seen = set()
+
+        # Colocar primero las palabras más largas: son las más difíciles de ubicar
+        candidates = []
+        for word in words:
+            normalized = normalize_word(word)
+            if normalized and normalized not in seen:
+                seen.add(normalized)
+                candidates.append((word, normalized))
+        candidates.sort(key=lambda item: len(item[1]), reverse=True)
+
+        for original, word in candidates:
+            if max_words is not None and len(solutions) >= max_words:
+                break
+            placement = self._place(grid, word, directions, prefer_overlap, rng)
+            if placement is None:
+                unplaced.append(original)
+            else:
+                solutions.append(placement)
+
+        # Rellenar las celdas vacías con letras aleatorias
+        alphabet_codes = np.array([ord(c) for c in ALPHABET], dtype=np.int32)
+        empty = grid == 0
+        grid[empty] = rng.choice(alphabet_codes, size=int(empty.sum()))
+
+        return {
+            "grid": [[chr(code) for code in row] for row in grid.tolist()],
+            "solutions": solutions,
+            "unplaced": unplaced,
+        }
+
+    def _place(
+        self,
+        grid: np.ndarray,
+        word: str,
+        directions: List[str],
+        prefer_overlap: bool,
+        rng: np.random.Generator
+    ) -> Optional[Dict[str, Any]]:
+        size = grid.shape[0]
+        length = len(word)
+        if length > size:
+            return None
+
+        letters = np.array([ord(c) for c in word], dtype=np.int32)
+        steps = np.arange(length)
+        options = []  # (direction, filas, columnas, coincidencias)
+
+        for direction in directions:
+            dr, dc = DIRECTIONS[direction]
+            # Rango de inicios que mantiene la palabra dentro de la cuadrícula
+            row_starts = np.arange(max(0, -dr * (length - 1)), size - max(0, dr * (length - 1)))
+            col_starts = np.arange(max(0, -dc * (length - 1)), size - max(0, dc * (length - 1)))
+            if row_starts.size == 0 or col_starts.size == 0:
+                continue
+
+            start_rows, start_cols = np.meshgrid(row_starts, col_starts, indexing="ij")
+            start_rows, start_cols = start_rows.ravel(), start_cols.ravel()
+            rows = start_rows[:, None] + dr * steps
+            cols = start_cols[:, None] + dc * steps
+
+            window = grid[rows, cols]
+            matches = window == letters
+            valid = ((window == 0) | matches).all(axis=1)
+            overlap = matches.sum(axis=1)
+            # Evitar que una palabra quede completamente contenida en otra
+            valid &= overlap < length
+
+            for idx in np.flatnonzero(valid):
+                options.append((direction, rows[idx], cols[idx], int(overlap[idx])))
+
+        if not options:
+            return None
+
+        if prefer_overlap:
+            best = max(option[3] for option in options)
+            options = [option for option in options if option[3] == best]
+
+        direction, rows, cols, _ = options[int(rng.integers(len(options)))]
+        grid[rows, cols] = letters
+
+        return {
+            "word": word,
+            "row": int(rows[0]),
+            "col": int(cols[0]),
+            "direction": direction,
+            "cells": [[int(r), int(c)] for r, c in zip(rows, cols)],
+        }
+
+
+word_search_engine = WordSearchEngine()
@@ -1,17 +1,25 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..config import settings
 from ..database import get_db
-from ..models.user import User
-from ..schemas.user import TokenData
+from ..models.user import User, UserRole
+from .cache import LRUCache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
+# Pool de hilos para bcrypt (se crea al primer uso). bcrypt libera el GIL, así
+# que los hashes corren en paralelo en varios núcleos sin bloquear el event loop
+_password_pool: Optional[ThreadPoolExecutor] = None
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -49,14 +57,79 @@ def get_password_hash(password: str) -> str:
     if len(password_bytes) > 72:
         password_bytes = password_bytes[:72]
 
-    # Generar salt y hash
-    salt = bcrypt.gensalt()
+    # Generar salt y hash con el costo configurado
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password_bytes, salt)
 
     # Retornar como string
     return hashed.decode('utf-8')
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Indica si un hash bcrypt ($2b$<costo>$...) se generó con un costo distinto
+    de BCRYPT_ROUNDS
+    """
+    try:
+        return int(hashed_password.split("$")[2]) != settings.BCRYPT_ROUNDS
+    except (AttributeError, IndexError, ValueError):
+        return False
+
+
+def _get_password_pool() -> ThreadPoolExecutor:
+    global _password_pool
+    if _password_pool is None:
+        _password_pool = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1,
+            thread_name_prefix="bcrypt"
+        )
+    return _password_pool
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    verify_password en el pool de hilos de bcrypt, sin bloquear el event loop
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_password_pool(), verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    get_password_hash en el pool de hilos de bcrypt, sin bloquear el event loop
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_password_pool(), get_password_hash, password)
+
+
+def shutdown_password_pool() -> None:
+    global _password_pool
+    if _password_pool is not None:
+        _password_pool.shutdown(wait=True)
+        _password_pool = None
+
+
+def access_token_claims(user: User) -> dict:
+    """
+    Datos del access token: además del email, el id, el rol y la versión de
+    tokens del usuario, para autenticar sin buscarlo por email
+    """
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "role": user.role.value if isinstance(user.role, UserRole) else user.role,
+        "ver": user.token_version or 0,
+    }
+
+
+def refresh_token_claims(user: User) -> dict:
+    """
+    Datos del refresh token: el id y la versión de tokens del usuario, para
+    que un cambio de contraseña o una desactivación revoque también la sesión
+    """
+    return {"sub": user.email, "uid": user.id, "ver": user.token_version or 0}
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -82,44 +155,120 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def verify_refresh_token(token: str) -> Optional[str]:
+def verify_refresh_token(token: str) -> Optional[dict]:
     """
-    Verifica un refresh token y retorna el email del usuario si es válido
+    Verifica un refresh token y retorna sus datos (uid y ver) si es válido.
+    Los emitidos sin id ni versión no se aceptan: hay que iniciar sesión
     """
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        token_type: str = payload.get("type")
-
-        if email is None or token_type != "refresh":
-            return None
-
-        return email
     except JWTError:
         return None
 
+    if payload.get("type") != "refresh" or payload.get("uid") is None or payload.get("ver") is None:
+        return None
+    return payload
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+
+class Principal:
+    """
+    Usuario autenticado: los datos de la cuenta que deciden los permisos, sin
+    la fila completa de `users`. Es lo que reciben los endpoints que solo
+    necesitan el id o el rol.
+    """
+    __slots__ = ("id", "email", "role", "is_active", "token_version")
+
+    def __init__(self, id: int, email: str, role: UserRole, is_active: bool, token_version: int):
+        self.id = id
+        self.email = email
+        self.role = role
+        self.is_active = is_active
+        self.token_version = token_version or 0
+
+
+# Columnas de `users` que forman un Principal (en el orden de su constructor)
+PRINCIPAL_COLUMNS = (User.id, User.email, User.role, User.is_active, User.token_version)
+
+# Principales por id de usuario, válidos para los tokens de su misma versión.
+# Cada proceso tiene la suya: los cambios hechos en otro worker se ven al expirar la entrada
+principal_cache = LRUCache(maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+def invalidate_principal(user_id: int) -> None:
+    """
+    Descarta el principal en caché de un usuario. Llamar después del commit
+    que cambia su email, rol, estado o versión de tokens.
+    """
+    principal_cache.pop(user_id)
+
+
+async def _authenticate(token: Optional[str], db: AsyncSession) -> Optional[Principal]:
+    """
+    Principal de un access token, o None si el token no es válido, fue
+    revocado (versión anterior a la del usuario) o el usuario no existe. Con la
+    entrada en caché no consulta la base de datos.
+    """
+    if token is None:
+        return None
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = TokenData(email=email)
     except JWTError:
-        raise credentials_exception
+        return None
+
+    # Solo access tokens con id (no refresh tokens ni tokens sin versión)
+    user_id = payload.get("uid")
+    if payload.get("type") != "access" or user_id is None:
+        return None
+
+    version = payload.get("ver", 0)
+    principal = principal_cache.get(user_id)
+    if principal is None or principal.token_version < version:
+        row = (await db.execute(select(*PRINCIPAL_COLUMNS).where(User.id == user_id))).first()
+        if row is None:
+            return None
+        principal = Principal(*row)
+        principal_cache.set(user_id, principal)
+
+    if principal.token_version != version:
+        return None
+    return principal
 
-    user = db.query(User).filter(User.email == token_data.email).first()
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
+    principal = await _authenticate(token, db)
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return principal
+
+
+async def get_current_active_principal(principal: Principal = Depends(get_current_principal)) -> Principal:
+    if not principal.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return principal
+
+
+async def get_current_user(
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """
+    Fila completa del usuario autenticado, para los endpoints que la leen o
+    modifican (p. ej. créditos)
+    """
+    user = await db.get(User, principal.id)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 
@@ -133,28 +282,16 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
 oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
 
 
-async def get_current_user_optional(
+async def get_current_principal_optional(
     token: Optional[str] = Depends(oauth2_scheme_optional),
-    db: Session = Depends(get_db)
-) -> Optional[User]:
+    db: AsyncSession = Depends(get_db)
+) -> Optional[Principal]:
     """
     Obtiene el usuario actual si hay un token válido, de lo contrario retorna None.
     NO lanza error si no hay autenticación.
     """
-    if token is None:
+    principal = await _authenticate(token, db)
+    if principal is None or not principal.is_active:
         return None
 
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        token_data = TokenData(email=email)
-    except JWTError:
-        return None
-
-    user = db.query(User).filter(User.email == token_data.email).first()
-    if user is None or not user.is_active:
-        return None
-
-    return user
+    return principal
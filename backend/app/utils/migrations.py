@@ -0,0 +1,31 @@
+from alembic import op
+import sqlalchemy as sa
+
+# Ayudantes para migraciones idempotentes: las bases de datos creadas con
+# `create_all` pueden tener ya parte del esquema que agrega una migración.
+
+
+def has_table(table: str) -> bool:
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def has_column(table: str, column: str) -> bool:
+    return column in {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def has_index(table: str, index: str) -> bool:
+    return index in {i["name"] for i in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def is_postgres() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def create_index_if_missing(name: str, table: str, columns: list, **kw) -> None:
+    if not has_index(table, name):
+        op.create_index(name, table, columns, **kw)
+
+
+def drop_index_if_exists(name: str, table: str) -> None:
+    if has_table(table) and has_index(table, name):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,87 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import String, literal, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Cabecera con el cursor de la página siguiente (ausente en la última página)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    """
+    Cursor opaco con la clave de ordenamiento (fecha, id) de la última fila
+    """
+    raw = json.dumps([sort_value.isoformat() if sort_value else None, row_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+
+def keyset_query(stmt, sort_column, id_column, dialect_name: str, cursor: Optional[str] = None, skip: int = 0):
+    """
+    Ordena la consulta por (sort_column, id) descendente y aplica el cursor o el `skip`
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        if dialect_name == "sqlite":
+            # SQLite guarda las fechas como texto: server_default sin microsegundos y los
+            # valores asignados desde Python con ellos. Se compara con el mismo formato
+            # que tendría la fila guardada para respetar el orden textual del índice.
+            fmt = "%Y-%m-%d %H:%M:%S.%f" if sort_value.microsecond else "%Y-%m-%d %H:%M:%S"
+            sort_value = literal(sort_value.strftime(fmt), String)
+        stmt = stmt.where(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+
+    stmt = stmt.order_by(sort_column.desc(), id_column.desc())
+    if skip and not cursor:
+        stmt = stmt.offset(skip)
+    return stmt
+
+
+async def fetch_all(db: AsyncSession, stmt) -> list:
+    """
+    Ejecuta un select y retorna entidades (select(Modelo)) o filas (select de columnas)
+    """
+    descriptions = stmt.column_descriptions
+    if len(descriptions) == 1 and descriptions[0]["expr"] is descriptions[0]["entity"]:
+        return list((await db.scalars(stmt)).all())
+    return list((await db.execute(stmt)).all())
+
+
+async def paginate(
+    db: AsyncSession,
+    stmt,
+    sort_column,
+    id_column,
+    response: Response,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0
+) -> list:
+    """
+    Página de resultados ordenada por (sort_column, id) descendente.
+
+    Con `cursor` usa paginación por clave (keyset): filtra las filas posteriores a la
+    última de la página anterior, sin recorrer las ya vistas. Sin cursor mantiene la
+    paginación por desplazamiento (`skip`) por compatibilidad. En ambos casos, si hay
+    más resultados, el cursor siguiente se envía en la cabecera X-Next-Cursor.
+    """
+    stmt = keyset_query(stmt, sort_column, id_column, db.get_bind().dialect.name, cursor=cursor, skip=skip)
+    rows = await fetch_all(db, stmt.limit(limit + 1))
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            getattr(last, sort_column.key), getattr(last, id_column.key)
+        )
+    return rows
@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+
+def percentile(samples, fraction: float) -> float:
+    """
+    Percentil (0-1) de una lista de muestras por el método del rango más cercano
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(samples, total: float, count: int, maximum: float, scale: float = 1000.0) -> Dict[str, float]:
+    """
+    Promedio, p50, p95 y máximo de una serie de duraciones (en ms por defecto)
+    """
+    return {
+        "avg": round(scale * total / max(1, count), 3),
+        "p50": round(scale * percentile(samples, 0.5), 3),
+        "p95": round(scale * percentile(samples, 0.95), 3),
+        "max": round(scale * maximum, 3),
+    }
+
+
+class PoolMetrics:
+    """
+    Métricas del pool de conexiones de este proceso: cuánto se espera para obtener
+    una conexión, cuántas están en uso, cuánto se usa el overflow y cuánto vive
+    cada conexión. Cada worker de uvicorn tiene su propio pool, así que los valores
+    son por proceso.
+    """
+
+    def __init__(self, max_samples: int = 1000):
+        self._checkout_times: "deque[float]" = deque(maxlen=max_samples)
+        self._lifetimes: "deque[float]" = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self.pool: Optional[Pool] = None
+        self.config: Dict[str, Any] = {}
+        self.checkouts = 0
+        self.total_checkout_seconds = 0.0
+        self.max_checkout_seconds = 0.0
+        self.peak_checked_out = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.overflow_checkouts = 0
+        self.peak_overflow = 0
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+        self.total_lifetime_seconds = 0.0
+        self.max_lifetime_seconds = 0.0
+
+    def record_checkout_time(self, seconds: float, waited: bool = False, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.waits += waited
+            self.total_checkout_seconds += seconds
+            self.max_checkout_seconds = max(self.max_checkout_seconds, seconds)
+            self._checkout_times.append(seconds)
+
+    def record_checked_out(self, checked_out: int, overflow: int) -> None:
+        with self._lock:
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+            if overflow > 0:
+                self.overflow_checkouts += 1
+                self.peak_overflow = max(self.peak_overflow, overflow)
+
+    def record_connect(self) -> None:
+        with self._lock:
+            self.connects += 1
+
+    def record_close(self, lifetime: Optional[float], invalidated: bool = False) -> None:
+        with self._lock:
+            if invalidated:
+                self.invalidations += 1
+            else:
+                self.closes += 1
+            if lifetime is not None:
+                self.total_lifetime_seconds += lifetime
+                self.max_lifetime_seconds = max(self.max_lifetime_seconds, lifetime)
+                self._lifetimes.append(lifetime)
+
+    def snapshot(self) -> Dict[str, Any]:
+        pool = self.pool
+        instrumented = isinstance(pool, InstrumentedQueuePool)
+        checked_out = pool.checkedout() if instrumented else None
+        capacity = pool.capacity if instrumented else None
+        with self._lock:
+            ended = self.closes + self.invalidations
+            return {
+                "pid": os.getpid(),
+                "pool_class": type(pool).__name__ if pool is not None else None,
+                "config": self.config,
+                "checked_out": checked_out,
+                "checked_in": pool.checkedin() if instrumented else None,
+                "overflow": max(pool.overflow(), 0) if instrumented else None,
+                "capacity": capacity,
+                "utilization": round(checked_out / capacity, 4) if capacity else None,
+                "peak_checked_out": self.peak_checked_out,
+                "peak_overflow": self.peak_overflow,
+                "checkouts": self.checkouts,
+                "overflow_checkouts": self.overflow_checkouts,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "checkout_ms": summarize(
+                    list(self._checkout_times), self.total_checkout_seconds,
+                    self.checkouts, self.max_checkout_seconds
+                ),
+                "connections": {
+                    "opened": self.connects,
+                    "closed": self.closes,
+                    "invalidated": self.invalidations,
+                    "lifetime_s": summarize(
+                        list(self._lifetimes), self.total_lifetime_seconds,
+                        ended, self.max_lifetime_seconds, scale=1.0
+                    ),
+                },
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Pool asíncrono que mide el tiempo de cada checkout (espera en la cola incluida)
+    y cuenta los checkouts que tuvieron que esperar una conexión libre
+    """
+
+    @property
+    def capacity(self) -> int:
+        return self.size() + max(self._max_overflow, 0)
+
+    def connect(self):
+        # Sin conexiones libres y sin margen de overflow: el checkout va a esperar
+        waited = self.checkedin() == 0 and self.checkedout() >= self.capacity
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except Exception:
+            pool_metrics.record_checkout_time(time.perf_counter() - start, waited, timed_out=True)
+            raise
+        pool_metrics.record_checkout_time(time.perf_counter() - start, waited)
+        return connection
+
+
+def instrument_pool(pool: Pool, config: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Registra los eventos del pool que alimentan `pool_metrics`
+    """
+    pool_metrics.pool = pool
+    pool_metrics.config = dict(config or {})
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        connection_record.info["connected_at"] = time.monotonic()
+        pool_metrics.record_connect()
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        if isinstance(pool, InstrumentedQueuePool):
+            pool_metrics.record_checked_out(pool.checkedout(), pool.overflow())
+
+    def lifetime(connection_record) -> Optional[float]:
+        connected_at = connection_record.info.pop("connected_at", None)
+        return None if connected_at is None else time.monotonic() - connected_at
+
+    @event.listens_for(pool, "close")
+    def _on_close(dbapi_connection, connection_record):
+        # Cierre normal: reciclaje por antigüedad o pool lleno al devolverla. Una
+        # conexión invalidada también se cierra, pero ya se contó en "invalidate"
+        if "connected_at" in connection_record.info:
+            pool_metrics.record_close(lifetime(connection_record))
+
+    @event.listens_for(pool, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        pool_metrics.record_close(lifetime(connection_record), invalidated=True)
@@ -0,0 +1,119 @@
+import hashlib
+import re
+import unicodedata
+from typing import List, Tuple
+
+# Separador de párrafos: una o más líneas en blanco
+PARAGRAPH_SEPARATOR = re.compile(r"\n\s*\n")
+SENTENCE_SEPARATOR = re.compile(r"(?<=[.!?…])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimación rápida del número de tokens (≈ 4 caracteres por token).
+    Suficiente para dimensionar prompts sin depender de un tokenizer concreto.
+    """
+    return max(1, len(text) // 4)
+
+
+def text_hash(text: str) -> str:
+    """
+    Hash estable de un fragmento de texto, usado como clave de caché
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def strip_accents(text: str) -> str:
+    """
+    Elimina tildes y diéresis (la "ñ" pasa a "n")
+    """
+    return "".join(
+        c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn"
+    )
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """
+    Divide un texto en párrafos no vacíos
+    """
+    return [p.strip() for p in PARAGRAPH_SEPARATOR.split(text) if p.strip()]
+
+
+def paragraph_spans(text: str) -> List[Tuple[int, int]]:
+    """
+    Devuelve las posiciones (inicio, fin) de cada párrafo no vacío dentro del
+    texto original, sin espacios en blanco al principio ni al final.
+    """
+    spans: List[Tuple[int, int]] = []
+    position = 0
+    for separator in list(PARAGRAPH_SEPARATOR.finditer(text)) + [None]:
+        end = separator.start() if separator else len(text)
+        segment = text[position:end]
+        if segment.strip():
+            start = position + len(segment) - len(segment.lstrip())
+            spans.append((start, position + len(segment.rstrip())))
+        if separator:
+            position = separator.end()
+    return spans
+
+
+def _split_oversized(paragraph: str, max_tokens: int) -> List[str]:
+    """
+    Divide un párrafo demasiado largo por oraciones y, si una oración
+    sigue excediendo el límite, por palabras.
+    """
+    pieces: List[str] = []
+    current = ""
+    for sentence in SENTENCE_SEPARATOR.split(paragraph):
+        if estimate_tokens(sentence) > max_tokens:
+            words = sentence.split()
+            for word in words:
+                candidate = f"{current} {word}".strip()
+                if current and estimate_tokens(candidate) > max_tokens:
+                    pieces.append(current)
+                    current = word
+                else:
+                    current = candidate
+            continue
+
+        candidate = f"{current} {sentence}".strip()
+        if current and estimate_tokens(candidate) > max_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = candidate
+
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """
+    Agrupa los párrafos de un texto en fragmentos de a lo sumo `max_tokens`
+    tokens estimados, respetando los límites de párrafo siempre que sea posible.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    for paragraph in split_paragraphs(text):
+        paragraph_tokens = estimate_tokens(paragraph)
+
+        if paragraph_tokens > max_tokens:
+            if current:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_oversized(paragraph, max_tokens))
+            continue
+
+        if current and current_tokens + paragraph_tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+
+        current.append(paragraph)
+        current_tokens += paragraph_tokens
+
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
@@ -0,0 +1,42 @@
+from typing import Any, Dict
+from sqlalchemy import func, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def dialect_insert(dialect_name: str):
+    """
+    `insert` con ON CONFLICT del dialecto, o None si el motor no lo soporta
+    """
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert_insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as upsert_insert
+    else:
+        return None
+    return upsert_insert
+
+
+async def add_counters(db: AsyncSession, model, key: Dict[str, Any], counters: Dict[str, int]) -> None:
+    """
+    Suma `counters` a la fila de `model` identificada por `key` (columnas de una
+    restricción UNIQUE), creándola si no existe. Es atómico frente a otros
+    procesos que sumen a la misma fila. No hace commit.
+    """
+    upsert_insert = dialect_insert(db.get_bind().dialect.name)
+    if upsert_insert is not None:
+        stmt = upsert_insert(model).values(**key, **counters)
+        set_ = {column: getattr(model, column) + getattr(stmt.excluded, column) for column in counters}
+        if hasattr(model, "updated_at"):
+            set_["updated_at"] = func.now()
+        await db.execute(stmt.on_conflict_do_update(index_elements=list(key), set_=set_))
+        return
+
+    # Otros motores: UPDATE y, si la fila no existía, INSERT
+    result = await db.execute(
+        update(model)
+        .where(*(getattr(model, column) == value for column, value in key.items()))
+        .values(**{column: getattr(model, column) + value for column, value in counters.items()})
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        await db.execute(insert(model).values(**key, **counters))
@@ -0,0 +1,56 @@
+"""Fill `activities.item_count` for rows created before list summaries existed.
+
+Usage (PowerShell):
+    python scripts\backfill_item_count.py --batch-size 500
+
+New activities get the count automatically when their content is assigned.
+Rows are processed in id-ordered batches with a commit per batch.
+"""
+import sys
+import os
+import argparse
+
+# Ensure project root on sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from app.database import SessionLocal
+from app.models.activity import Activity, count_content_items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill activity item counts")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        last_id = 0
+        total = 0
+        while True:
+            rows = db.query(Activity.id, Activity.content)\
+                .filter(Activity.item_count.is_(None), Activity.id > last_id)\
+                .order_by(Activity.id)\
+                .limit(args.batch_size)\
+                .all()
+            if not rows:
+                break
+
+            updates = [
+                {"id": row.id, "item_count": count}
+                for row in rows
+                if (count := count_content_items(row.content)) is not None
+            ]
+            if updates:
+                db.bulk_update_mappings(Activity, updates)
+            db.commit()
+            total += len(updates)
+            last_id = rows[-1].id
+            print(f"Processed activities up to id={last_id} ({total} updated so far)")
+
+        print(f"Done. {total} activities updated.")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
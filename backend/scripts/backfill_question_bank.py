@@ -0,0 +1,99 @@
+"""Backfill the question bank and its MinHash/LSH near-duplicate index.
+
+Usage (PowerShell):
+    python scripts\backfill_question_bank.py --batch-size 200
+
+This script will:
+ - index into the question bank every exam activity that has no questions there yet
+ - compute the MinHash signature and LSH buckets of bank questions created before
+   near-duplicate detection existed (rows with `minhash` NULL)
+ - process rows in id-ordered batches, committing after each batch, so it can be
+   interrupted and re-run safely
+
+IMPORTANT: Make a backup of your DB before running (dump or copy).
+"""
+import sys
+import os
+import argparse
+import asyncio
+
+# Ensure project root on sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal
+from app.models.activity import Activity, ActivityType
+from app.models.question_bank import QuestionBankItem
+from app.services.question_bank_service import question_bank_service, question_signature
+
+
+async def backfill_activities(db, batch_size):
+    indexed_ids = select(QuestionBankItem.activity_id).where(QuestionBankItem.activity_id.isnot(None))
+    last_id = 0
+    total = 0
+    while True:
+        batch = (await db.scalars(
+            select(Activity)
+            .where(
+                Activity.activity_type == ActivityType.EXAM,
+                Activity.id > last_id,
+                ~Activity.id.in_(indexed_ids)
+            )
+            .order_by(Activity.id)
+            .limit(batch_size)
+        )).all()
+        if not batch:
+            break
+
+        for activity in batch:
+            total += len(await question_bank_service.index_activity(db, activity))
+        last_id = batch[-1].id
+        await db.commit()
+        db.expunge_all()
+        print(f"Indexed exams up to id={last_id} ({total} questions added so far)")
+    return total
+
+
+async def backfill_signatures(db, batch_size):
+    last_id = 0
+    total = 0
+    while True:
+        batch = (await db.scalars(
+            select(QuestionBankItem)
+            .where(QuestionBankItem.minhash.is_(None), QuestionBankItem.id > last_id)
+            .order_by(QuestionBankItem.id)
+            .limit(batch_size)
+        )).all()
+        if not batch:
+            break
+
+        for item in batch:
+            item.minhash = question_signature(item.question)
+        question_bank_service.add_lsh_buckets(db, batch)
+        total += len(batch)
+        last_id = batch[-1].id
+        await db.commit()
+        db.expunge_all()
+        print(f"Signed questions up to id={last_id} ({total} so far)")
+    return total
+
+
+async def run(batch_size):
+    async with AsyncSessionLocal() as db:
+        # Primero las firmas, para que los exámenes indexados después detecten duplicados
+        signed = await backfill_signatures(db, batch_size)
+        added = await backfill_activities(db, batch_size)
+        print(f"Done. {signed} questions signed, {added} questions added from exams.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill question bank and MinHash/LSH index")
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
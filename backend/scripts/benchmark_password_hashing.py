@@ -0,0 +1,115 @@
+"""Benchmark for password hashing during a login storm.
+
+Usage:
+    python scripts/benchmark_password_hashing.py                      # 32 logins, 1..CPUs threads
+    python scripts/benchmark_password_hashing.py --logins 100 --rounds 10 --workers 1,2,4,8
+
+This script will:
+ - hash one password with --rounds (default: BCRYPT_ROUNDS)
+ - verify it --logins times concurrently, first calling bcrypt directly inside the
+   coroutines (the old behaviour: each check blocks the event loop) and then through
+   the bcrypt thread pool with each --workers size
+ - report wall time, logins per second and the longest event loop stall seen by a
+   10 ms heartbeat task (what chat and generation requests would have waited)
+
+Throughput should grow with the pool size up to the number of cores, while the loop
+stall stays near the heartbeat interval.
+"""
+import sys
+import os
+import argparse
+import asyncio
+import tempfile
+import time
+
+# Ensure project root on sys.path
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "hash_bench.db"))
+os.environ.setdefault("SECRET_KEY", "hash-bench")
+
+from app.config import settings  # noqa: E402
+from app.utils import auth  # noqa: E402
+
+HEARTBEAT_SECONDS = 0.01
+PASSWORD = "contraseña-de-prueba"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Concurrent bcrypt verifications: inline vs thread pool")
+    parser.add_argument("--logins", type=int, default=32, help="Concurrent logins per run")
+    parser.add_argument("--rounds", type=int, default=settings.BCRYPT_ROUNDS, help="bcrypt cost")
+    parser.add_argument("--workers", help="Comma-separated pool sizes (default: 1, 2, 4 ... up to the CPUs)")
+    return parser.parse_args()
+
+
+def default_workers():
+    cpus = os.cpu_count() or 1
+    sizes, size = [], 1
+    while size < cpus:
+        sizes.append(size)
+        size *= 2
+    sizes.append(cpus)
+    return sizes
+
+
+async def heartbeat(stop: asyncio.Event, stalls: list):
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        now = time.perf_counter()
+        stalls.append(now - last - HEARTBEAT_SECONDS)
+        last = now
+
+
+async def inline_login(hashed: str) -> bool:
+    return auth.verify_password(PASSWORD, hashed)
+
+
+async def pooled_login(hashed: str) -> bool:
+    return await auth.verify_password_async(PASSWORD, hashed)
+
+
+async def run(login, hashed: str, logins: int):
+    stop, stalls = asyncio.Event(), [0.0]
+    ticker = asyncio.create_task(heartbeat(stop, stalls))
+    await asyncio.sleep(HEARTBEAT_SECONDS)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(login(hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker
+    if not all(results):
+        raise SystemExit("A verification failed")
+    return elapsed, max(stalls)
+
+
+def report(label: str, logins: int, elapsed: float, stall: float):
+    print(f"{label:<12} {elapsed:>8.2f} s {logins / elapsed:>10.1f} logins/s {stall * 1000:>12.0f} ms")
+
+
+async def main():
+    args = parse_args()
+    workers = [int(size) for size in args.workers.split(",")] if args.workers else default_workers()
+
+    settings.BCRYPT_ROUNDS = args.rounds
+    hashed = auth.get_password_hash(PASSWORD)
+    print(f"bcrypt cost {args.rounds}, {args.logins} concurrent logins, {os.cpu_count()} CPUs\n")
+    print(f"{'mode':<12} {'wall':>10} {'throughput':>19} {'max loop stall':>15}")
+
+    elapsed, stall = await run(inline_login, hashed, args.logins)
+    report("inline", args.logins, elapsed, stall)
+
+    for size in workers:
+        auth.shutdown_password_pool()
+        settings.PASSWORD_HASH_WORKERS = size
+        elapsed, stall = await run(pooled_login, hashed, args.logins)
+        report(f"pool x{size}", args.logins, elapsed, stall)
+    auth.shutdown_password_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""Concurrency check for activity saves with credit deduction.
+
+Usage:
+    python scripts/check_credit_concurrency.py                 # temporary SQLite database
+    python scripts/check_credit_concurrency.py --tasks 200 --database-url postgresql://.../credit_check
+
+This script will:
+ - create the schema and one user with --initial credits
+ - run --tasks concurrent paid generations (each in its own session) for that same
+   user, the way the generation endpoints do: reserve the estimated cost, "call the
+   model" (a short sleep), then save the activity settling the reservation at --cost
+ - check that the credits held at any moment never exceed the balance, that failed
+   attempts leave no activity behind, that no credits stay held, that the final balance
+   is never negative and that it matches the credit ledger
+ - with --no-reserve, skip the reservation and check the single-transaction save alone:
+   exactly floor(initial / cost) saves must succeed
+
+IMPORTANT: with --database-url, point it to an EMPTY scratch database: it is seeded
+with test data.
+"""
+import sys
+import os
+import argparse
+import asyncio
+import tempfile
+
+# Ensure project root on sys.path
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Hammer one user with parallel paid generations")
+    parser.add_argument("--database-url", help="Scratch database (default: temporary SQLite file)")
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--initial", type=int, default=100)
+    parser.add_argument("--cost", type=int, default=3)
+    parser.add_argument("--no-reserve", action="store_true", help="Save without reserving credits first")
+    return parser.parse_args()
+
+
+args = parse_args()
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "credit_check.db")
+os.environ.setdefault("SECRET_KEY", "credit-check")
+
+from fastapi import HTTPException  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from app.database import AsyncSessionLocal, Base, engine  # noqa: E402
+from app.models import Activity, ActivityType, CreditTransaction, User, UserRole  # noqa: E402
+from app.routers.content import save_activity_with_credits, start_generation  # noqa: E402
+from app.schemas.activity import SummaryRequest  # noqa: E402
+from app.services.credit_service import credit_service  # noqa: E402
+
+in_flight = {"held": 0, "peak": 0}
+
+
+async def generate(user_id: int, number: int) -> bool:
+    async with AsyncSessionLocal() as db:
+        user = await db.get(User, user_id)
+        reservation = None
+        try:
+            if not args.no_reserve:
+                request = SummaryRequest(text=f"Texto {number}", ai_provider="openai")
+                reservation = await start_generation(db, user, request, ActivityType.SUMMARY)
+                in_flight["held"] += reservation.amount
+                in_flight["peak"] = max(in_flight["peak"], in_flight["held"])
+                await asyncio.sleep(0.01)  # llamada al modelo
+                in_flight["held"] -= reservation.amount
+            await save_activity_with_credits(
+                db=db,
+                user=user,
+                activity_type=ActivityType.SUMMARY,
+                request_data={"title": f"Resumen {number}", "ai_provider": "openai"},
+                generated_content={"content": {"summary": "..."}, "model": "check", "credits_used": args.cost},
+                reservation=reservation
+            )
+            return True
+        except HTTPException as e:
+            if e.status_code != 400:
+                raise
+            return False
+        finally:
+            await credit_service.release_reservation(db, reservation)
+
+
+async def run() -> int:
+    Base.metadata.create_all(bind=engine)
+    async with AsyncSessionLocal() as db:
+        user = User(
+            email="concurrency@example.com", username="concurrency", hashed_password="x",
+            role=UserRole.DOCENTE, credits=args.initial
+        )
+        db.add(user)
+        await db.commit()
+        user_id = user.id
+
+    results = await asyncio.gather(*(generate(user_id, number) for number in range(args.tasks)))
+    succeeded = sum(results)
+
+    async with AsyncSessionLocal() as db:
+        balance, held = (await db.execute(
+            select(User.credits, User.held_credits).where(User.id == user_id)
+        )).one()
+        activities = await db.scalar(select(func.count(Activity.id)).where(Activity.creator_id == user_id))
+        ledger = await db.scalar(
+            select(func.coalesce(func.sum(CreditTransaction.amount), 0))
+            .where(CreditTransaction.user_id == user_id)
+        )
+
+    checks = [
+        ("balance is never negative", balance >= 0, balance),
+        ("no credits left on hold", held == 0, held),
+        ("balance = initial - cost x successes", balance == args.initial - args.cost * succeeded, balance),
+        ("one activity per successful save", activities == succeeded, activities),
+        ("ledger matches the balance", args.initial + ledger == balance, ledger),
+    ]
+    if args.no_reserve:
+        expected = min(args.tasks, args.initial // args.cost)
+        checks.append((f"{expected} saves succeed", succeeded == expected, succeeded))
+    else:
+        checks.append(("held credits never exceed the balance", in_flight["peak"] <= args.initial, in_flight["peak"]))
+        checks.append(("some generations succeed", succeeded > 0, succeeded))
+    failures = 0
+    for name, ok, value in checks:
+        failures += not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {name} (got {value})")
+    print(f"\n{args.tasks} tasks, {succeeded} succeeded, final balance {balance}; {failures} failure(s)")
+    return failures
+
+
+def main():
+    sys.exit(1 if asyncio.run(run()) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""Query-plan regression check for the hot router queries.
+
+Usage:
+    python scripts/check_query_plans.py                 # temporary SQLite database
+    python scripts/check_query_plans.py --database-url postgresql://.../plan_check
+
+This script will:
+ - build the schema with the Alembic migrations (alembic upgrade head)
+ - seed a synthetic dataset (users, activities, transactions, conversations, messages)
+ - run EXPLAIN for each list query as the routers build it
+ - check that the plan uses the expected composite index and exit with status 1 otherwise
+
+On PostgreSQL sequential scans are disabled for the session, so the check asserts
+that the index is usable rather than depending on the planner's cost estimates.
+
+IMPORTANT: with --database-url, point it to an EMPTY scratch database: it is seeded
+with test data.
+"""
+import sys
+import os
+import argparse
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+# Ensure project root on sys.path
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check that hot queries use their indexes")
+    parser.add_argument("--database-url", help="Scratch database (default: temporary SQLite file)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--activities", type=int, default=5000)
+    return parser.parse_args()
+
+
+args = parse_args()
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "plan_check.db")
+os.environ.setdefault("SECRET_KEY", "plan-check")
+
+from alembic import command  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from sqlalchemy import select, text  # noqa: E402
+from sqlalchemy.ext.compiler import compiles  # noqa: E402
+from sqlalchemy.sql.expression import ClauseElement, Executable  # noqa: E402
+
+from app.database import SessionLocal, engine  # noqa: E402
+from app.models import (  # noqa: E402
+    User, UserRole, Activity, ActivityType, CreditTransaction, Chatbot, ChatbotType,
+    ChatConversation, ChatMessage, QuestionBankItem
+)
+from app.models.credit import TransactionType  # noqa: E402
+from app.routers.activities import visible_activities  # noqa: E402
+from app.schemas.activity import ActivitySummary  # noqa: E402
+from app.services.user_search_service import user_search_service  # noqa: E402
+from app.utils.pagination import encode_cursor, keyset_query  # noqa: E402
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "sqlite")
+def _explain_sqlite(element, compiler, **kw):
+    return "EXPLAIN QUERY PLAN " + compiler.process(element.statement, **kw)
+
+
+@compiles(Explain, "postgresql")
+def _explain_postgresql(element, compiler, **kw):
+    return "EXPLAIN " + compiler.process(element.statement, **kw)
+
+
+def page_statement(stmt, sort_column, id_column, cursor=None):
+    """
+    Sentencia de una página de 20 filas, igual a la que ejecuta `paginate`
+    """
+    return keyset_query(stmt, sort_column, id_column, engine.dialect.name, cursor=cursor).limit(21)
+
+
+def seed(db, num_users, num_activities):
+    rng = random.Random(7)
+    start = datetime(2025, 1, 1)
+    users = [
+        User(
+            email=f"user{i}@example.com", username=f"user{i}", hashed_password="x",
+            role=UserRole.ADMIN if i == 0 else UserRole.DOCENTE, credits=500,
+            created_at=start + timedelta(minutes=i)
+        )
+        for i in range(num_users)
+    ]
+    db.add_all(users)
+    db.flush()
+
+    chatbot = Chatbot(name="Tutor", chatbot_type=ChatbotType.MATH, creator_id=users[0].id, is_public=True)
+    db.add(chatbot)
+    db.flush()
+
+    activities, transactions, conversations = [], [], []
+    for i in range(num_activities):
+        user = users[rng.randrange(num_users)]
+        created = start + timedelta(minutes=rng.randrange(500000))
+        activities.append(Activity(
+            title=f"Actividad {i}", activity_type=rng.choice(list(ActivityType)), content={},
+            subject="Ciencias", is_public=rng.random() < 0.3, credits_used=3,
+            creator_id=user.id, created_at=created
+        ))
+        transactions.append(CreditTransaction(
+            user_id=user.id, amount=-3, transaction_type=TransactionType.USAGE,
+            balance_after=497, created_at=created
+        ))
+        if i % 10 == 0:
+            conversations.append(ChatConversation(
+                chatbot_id=chatbot.id, user_id=user.id, title="Chat",
+                created_at=created, updated_at=created
+            ))
+    db.add_all(activities + transactions + conversations)
+    db.flush()
+    db.add_all([
+        ChatMessage(conversation_id=c.id, content="Hola", role=role, created_at=c.created_at)
+        for c in conversations for role in ("user", "assistant")
+    ])
+    db.add_all([
+        QuestionBankItem(
+            topic="Ciencias", topic_key=f"tema {i % 50}", question_type="multiple_choice",
+            question=f"Pregunta {i}", text_hash=f"{i:064d}", creator_id=users[i % num_users].id
+        )
+        for i in range(num_activities // 5)
+    ])
+    db.commit()
+    return users, chatbot, conversations
+
+
+def cases(db, users, chatbot, conversations):
+    user = users[1]
+    last = db.scalar(select(Activity).order_by(Activity.created_at.desc(), Activity.id.desc()).offset(40))
+    activity_cursor = encode_cursor(last.created_at, last.id)
+    summary = select(*ActivitySummary.columns())
+
+    checks = [
+        ("GET /api/activities (anónimo)", "ix_activities_public_created",
+         page_statement(visible_activities(summary, None), Activity.created_at, Activity.id)),
+        ("GET /api/activities (públicas, página 3 por cursor)", "ix_activities_public_created",
+         page_statement(visible_activities(summary, user, True), Activity.created_at, Activity.id, activity_cursor)),
+        ("GET /api/activities/my/activities", "ix_activities_creator_created",
+         page_statement(summary.where(Activity.creator_id == user.id), Activity.created_at, Activity.id)),
+        ("GET /api/activities/my/activities (cursor)", "ix_activities_creator_created",
+         page_statement(summary.where(Activity.creator_id == user.id), Activity.created_at, Activity.id,
+                        activity_cursor)),
+        ("GET /api/admin/activities", "ix_activities_created",
+         page_statement(summary, Activity.created_at, Activity.id)),
+        ("GET /api/admin/activities?creator_id=", "ix_activities_creator_created",
+         page_statement(summary.where(Activity.creator_id == user.id), Activity.created_at, Activity.id)),
+        ("GET /api/admin/users", "ix_users_created",
+         page_statement(select(User), User.created_at, User.id)),
+        ("GET /api/auth/credits/transactions", "ix_credit_transactions_user_created",
+         page_statement(select(CreditTransaction).where(CreditTransaction.user_id == user.id),
+                        CreditTransaction.created_at, CreditTransaction.id)),
+        ("GET /api/chatbots/{id}/conversations", "ix_chat_conversations_user_chatbot_updated",
+         page_statement(select(ChatConversation).where(
+             ChatConversation.chatbot_id == chatbot.id, ChatConversation.user_id == user.id
+         ), ChatConversation.updated_at, ChatConversation.id)),
+        ("POST /api/chatbots/{id}/chat (historial)", "ix_chat_messages_conversation_created",
+         select(ChatMessage).where(ChatMessage.conversation_id == conversations[0].id)
+         .order_by(ChatMessage.created_at)),
+        ("POST /api/question-bank/assemble", "ix_question_bank_topic_type_grade",
+         select(QuestionBankItem).where(QuestionBankItem.topic_key == "tema 3")),
+    ]
+    if engine.dialect.name == "postgresql":
+        # En SQLite la búsqueda de usuarios usa el índice de trigramas en memoria
+        checks.append(("GET /api/admin/users?search=", "ix_users_search_text_trgm",
+                       user_search_service.postgres_statement(select(User), "user12").limit(20)))
+    return checks
+
+
+def explain(db, statement) -> str:
+    rows = db.execute(Explain(statement)).fetchall()
+    return "\n".join(" ".join(str(value) for value in row) for row in rows)
+
+
+def main():
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    command.upgrade(config, "head")
+
+    db = SessionLocal()
+    try:
+        users, chatbot, conversations = seed(db, args.users, args.activities)
+        db.execute(text("ANALYZE"))
+        if engine.dialect.name == "postgresql":
+            db.execute(text("SET enable_seqscan = off"))
+
+        failures = 0
+        for name, index, statement in cases(db, users, chatbot, conversations):
+            plan = explain(db, statement)
+            ok = index in plan
+            failures += not ok
+            print(f"{'OK  ' if ok else 'FAIL'} {name}: {index}")
+            if not ok:
+                print("     " + plan.replace("\n", "\n     "))
+
+        print(f"\n{failures} failure(s)")
+        sys.exit(1 if failures else 0)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
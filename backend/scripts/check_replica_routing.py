@@ -0,0 +1,114 @@
+"""Read-replica routing check with local SQLite databases.
+
+Usage:
+    python scripts/check_replica_routing.py
+
+This script will:
+ - create a primary and two replica SQLite databases in a temporary directory, plus
+   an unreachable replica URL, and seed each database with a different public activity
+ - start the API against them (DATABASE_URL + DATABASE_REPLICA_URLS)
+ - check that anonymous reads alternate between the healthy replicas and skip the
+   unreachable one
+ - check read-your-writes: right after a user's write their reads go to the primary,
+   and go back to the replicas once DB_READ_YOUR_WRITES_SECONDS has passed
+
+The databases do not replicate to each other on purpose: the content of each
+response shows which database served it.
+"""
+import sys
+import os
+import tempfile
+import time
+
+# Ensure project root on sys.path
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+WORK_DIR = tempfile.mkdtemp()
+PRIMARY_URL = "sqlite:///" + os.path.join(WORK_DIR, "primary.db")
+REPLICA_URLS = [
+    "sqlite:///" + os.path.join(WORK_DIR, "replica1.db"),
+    "sqlite:///" + os.path.join(WORK_DIR, "replica2.db"),
+]
+UNREACHABLE_URL = "sqlite:///" + os.path.join(WORK_DIR, "missing", "replica3.db")
+
+os.environ["DATABASE_URL"] = PRIMARY_URL
+os.environ["DATABASE_REPLICA_URLS"] = ",".join(REPLICA_URLS + [UNREACHABLE_URL])
+os.environ["DB_READ_YOUR_WRITES_SECONDS"] = "1"
+os.environ.setdefault("SECRET_KEY", "replica-check")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.database import Base  # noqa: E402
+from app.models import Activity, ActivityType  # noqa: E402
+from app.main import app  # noqa: E402
+
+failures = 0
+
+
+def check(name, ok, detail=""):
+    global failures
+    failures += not ok
+    print(f"{'OK  ' if ok else 'FAIL'} {name}" + (f" ({detail})" if detail and not ok else ""))
+
+
+def seed(url, title, creator_id=1):
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        activity = Activity(
+            title=title, activity_type=ActivityType.SUMMARY, content={}, is_public=True,
+            creator_id=creator_id
+        )
+        db.add(activity)
+        db.commit()
+        activity_id = activity.id
+    engine.dispose()
+    return activity_id
+
+
+def titles(response):
+    return [activity["title"] for activity in response.json()]
+
+
+def main():
+    seed(PRIMARY_URL, "primary")
+    for number, url in enumerate(REPLICA_URLS, start=1):
+        seed(url, f"replica{number}")
+
+    client = TestClient(app)
+
+    served = [titles(client.get("/api/activities/")) for _ in range(4)]
+    check("anonymous reads use the replicas", all(t and t[0].startswith("replica") for t in served), served)
+    check("round-robin across healthy replicas",
+          {t[0] for t in served} == {"replica1", "replica2"}, served)
+
+    register = client.post("/api/auth/register", json={
+        "email": "docente@example.com", "username": "docente", "password": "secret123"
+    })
+    headers = {"Authorization": f"Bearer {register.json()['access_token']}"}
+    user_id = client.get("/api/auth/me", headers=headers).json()["id"]
+    own_id = seed(PRIMARY_URL, "own activity", creator_id=user_id)
+
+    update = client.patch(f"/api/activities/{own_id}", headers=headers, json={"title": "edited"})
+    check("write goes to the primary", update.status_code == 200, update.text)
+
+    after_write = client.get(f"/api/activities/{own_id}", headers=headers)
+    check("read-your-writes: next read served by the primary",
+          after_write.status_code == 200 and after_write.json()["title"] == "edited", after_write.text)
+
+    other = titles(client.get("/api/activities/"))
+    check("other clients keep reading from replicas", other and other[0].startswith("replica"), other)
+
+    time.sleep(1.2)
+    later = client.get(f"/api/activities/{own_id}", headers=headers)
+    check("after the window the user's reads go back to the replicas", later.status_code == 404, later.text)
+
+    print(f"\n{failures} failure(s)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Create user accounts in bulk from a CSV file (e.g. the students of a new semester).
+
+Usage (PowerShell):
+    python scripts\import_users.py students.csv --dry-run
+    python scripts\import_users.py students.csv --errors-csv rejected.csv
+
+The CSV must be UTF-8 with a header row. Required columns: email, username,
+password. Optional: full_name, role (estudiante or docente; default estudiante).
+
+This script will:
+ - stream the file in batches of USER_IMPORT_BATCH_SIZE rows
+ - validate each row and skip duplicates (within the file or already registered)
+ - hash passwords in a process pool and insert users and their initial credit
+   transactions with one multi-row INSERT per table and one commit per batch
+ - print a summary and the rejected rows (or write them with --errors-csv)
+
+It is the same import as POST /api/admin/users/import, without the upload size
+limits of the HTTP request.
+"""
+import sys
+import os
+import argparse
+import asyncio
+import csv
+import time
+
+# Ensure project root on sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from app.database import AsyncSessionLocal
+from app.services.user_import_service import user_import_service
+
+
+async def run(path, dry_run):
+    with open(path, encoding="utf-8-sig", newline="") as lines:
+        async with AsyncSessionLocal() as db:
+            return await user_import_service.import_csv(db, lines, dry_run=dry_run)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import users from a CSV file")
+    parser.add_argument("path", help="CSV file with email, username, password[, full_name, role]")
+    parser.add_argument("--dry-run", action="store_true", help="Validate only, create nothing")
+    parser.add_argument("--errors-csv", help="Write rejected rows (row, email, error) to this file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    report = asyncio.run(run(args.path, args.dry_run))
+    elapsed = time.perf_counter() - started
+
+    if args.errors_csv:
+        with open(args.errors_csv, "w", encoding="utf-8", newline="") as out:
+            writer = csv.DictWriter(out, fieldnames=["row", "email", "error"])
+            writer.writeheader()
+            writer.writerows(report["errors"])
+    else:
+        for error in report["errors"]:
+            print(f"  line {error['row']}: {error['email'] or '-'}: {error['error']}")
+
+    action = "validated" if args.dry_run else "created"
+    count = report["total_rows"] - report["failed"] if args.dry_run else report["created"]
+    print(f"Done in {elapsed:.1f}s. {report['total_rows']} rows, {count} {action}, {report['failed']} rejected.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Rebuild the daily usage rollups (usage_daily) from activities and the credit ledger.
+
+Usage (PowerShell):
+    python scripts\rebuild_usage_rollups.py                    # whole history
+    python scripts\rebuild_usage_rollups.py --since 2026-10-01
+
+This script will:
+ - recompute, per day x user x provider x activity type, the number of activities and
+   the credits charged for them (USAGE movements of the ledger)
+ - replace the rollup rows from --since on (all rows without it) in one transaction,
+   keeping the token totals already recorded: tokens are not stored per activity
+ - print the totals of the rebuilt range
+
+The migration that creates the table already loads the existing history; run this
+whenever the rollups need repairing. New generations update the rollups on write.
+
+IMPORTANT: Make a backup of your DB before running (dump or copy).
+"""
+import sys
+import os
+import argparse
+import asyncio
+from datetime import date
+
+# Ensure project root on sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from app.database import AsyncSessionLocal
+from app.services.usage_service import usage_service
+
+
+async def run(since):
+    async with AsyncSessionLocal() as db:
+        rows = await usage_service.rebuild(db, since=since)
+        totals = await usage_service.totals(db, since=since)
+    print(
+        f"Done. {rows} rollup rows: {totals['activities']} activities, "
+        f"{totals['credits_used']} credits, {totals['tokens_used']} tokens, "
+        f"{totals['active_users']} users."
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild daily usage rollups")
+    parser.add_argument("--since", type=date.fromisoformat, help="First day to rebuild (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.since))
+
+
+if __name__ == '__main__':
+    main()
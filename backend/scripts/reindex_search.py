@@ -0,0 +1,63 @@
+"""Fill `activities.search_vector` for rows created before full-text search existed.
+
+Usage (PowerShell):
+    python scripts\reindex_search.py --batch-size 500
+
+Only needed on PostgreSQL: new and edited activities keep their tsvector up to
+date automatically, and the SQLite fallback index is built in memory on first use.
+Rows are processed in id-ordered batches with a commit per batch, so the script
+can be interrupted and re-run.
+"""
+import sys
+import os
+import argparse
+
+# Ensure project root on sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from app.database import SessionLocal
+from app.models.activity import Activity
+from app.services.search_service import search_service, search_vector_expression, extract_search_text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill activity full-text search vectors")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if not search_service.uses_postgres(db):
+            print("Not a PostgreSQL database: nothing to do (the in-memory index is built on demand).")
+            return
+
+        last_id = 0
+        total = 0
+        while True:
+            rows = db.query(Activity.id, Activity.title, Activity.subject, Activity.content)\
+                .filter(Activity.search_vector.is_(None), Activity.id > last_id)\
+                .order_by(Activity.id)\
+                .limit(args.batch_size)\
+                .all()
+            if not rows:
+                break
+
+            for row in rows:
+                db.query(Activity).filter(Activity.id == row.id).update(
+                    {Activity.search_vector: search_vector_expression(
+                        row.title, row.subject, extract_search_text(row.content)
+                    )},
+                    synchronize_session=False
+                )
+            db.commit()
+            total += len(rows)
+            last_id = rows[-1].id
+            print(f"Indexed activities up to id={last_id} ({total} so far)")
+
+        print(f"Done. {total} activities indexed.")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Recompute `users.search_text` with the application's normalization.
+
+Usage (PowerShell):
+    python scripts\reindex_user_search.py --batch-size 1000
+    python scripts\reindex_user_search.py --all        # recompute every row
+
+Migration 0010 fills the column for existing accounts (folding Latin accented
+letters in SQL) and new and edited users keep it up to date automatically, so this
+is only needed to repair rows written outside the application or to recompute every
+row (--all) after changing the normalization. Rows are processed in id-ordered
+batches with a commit per batch (one bulk UPDATE by primary key each), so the script
+can be interrupted and re-run.
+"""
+import sys
+import os
+import argparse
+
+# Ensure project root on sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from sqlalchemy import select, update
+
+from app.database import SessionLocal
+from app.models.user import User
+from app.services.user_search_service import user_search_text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill user search text")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--all", action="store_true", help="Recompute rows that already have search text")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        last_id = 0
+        total = 0
+        while True:
+            stmt = select(User.id, User.email, User.username, User.full_name).where(User.id > last_id)
+            if not args.all:
+                stmt = stmt.where(User.search_text.is_(None))
+            rows = db.execute(stmt.order_by(User.id).limit(args.batch_size)).all()
+            if not rows:
+                break
+
+            db.execute(update(User), [
+                {"id": row.id, "search_text": user_search_text(row.email, row.username, row.full_name)}
+                for row in rows
+            ])
+            db.commit()
+            total += len(rows)
+            last_id = rows[-1].id
+            print(f"Indexed users up to id={last_id} ({total} so far)")
+
+        print(f"Done. {total} users indexed.")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
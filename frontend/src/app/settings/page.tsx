@@ -12,6 +12,7 @@ import { authAPI } from '@/lib/api';
 
 export default function SettingsPage() {
   const user = useAuthStore(state => state.user);
+  const setAuth = useAuthStore(state => state.setAuth);
   const { theme, setTheme } = useTheme();
   const [mounted, setMounted] = useState(false);
 
@@ -53,11 +54,16 @@ export default function SettingsPage() {
     const toastId = toast.loading('Cambiando contraseña...');
 
     try {
-      await authAPI.changePassword({
+      const response = await authAPI.changePassword({
         current_password: currentPassword,
         new_password: newPassword,
       });
 
+      // El cambio revoca los tokens anteriores: guardar el nuevo para seguir en sesión
+      if (user && response?.access_token) {
+        setAuth(user, response.access_token);
+      }
+
       toast.success('Contraseña cambiada exitosamente', { id: toastId });
 
       // Limpiar formulario
@@ -82,6 +82,11 @@ export interface Activity {
   updated_at?: string;
 }
 
+// Vista ligera de los listados (sin content)
+export type ActivitySummary = Omit<Activity, 'content'> & {
+  item_count?: number | null;
+};
+
 export interface ExamRequest {
   topic: string;
   num_questions: number;
@@ -208,6 +213,7 @@ export interface ActivityListItem {
   creator_id: number;
   is_public: boolean;
   credits_used: number;
+  item_count?: number | null;
   created_at: string;
 }
 